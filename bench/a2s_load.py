@@ -0,0 +1,97 @@
+"""A2S client check and load test against local fake query servers.
+
+Starts --servers fake A2S servers (a mix of plain, split and bzip2-split
+player replies), checks that every A2S_INFO / A2S_PLAYER answer parses to
+what the server sent, then queries all of them concurrently for --rounds
+rounds and reports queries/s and latency percentiles. A dead port is
+included to check that timeouts come back as "down" without holding up the
+rest.
+
+    python bench/a2s_load.py --servers 200 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bot"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot_load import percentile  # noqa: E402
+
+
+def _free_udp_port() -> int:
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+async def check(fakes) -> list[str]:
+    import a2s
+
+    failures = []
+    for fake in fakes:
+        info = await a2s.info(fake.host, fake.port)
+        if (info.map, info.players, info.max_players, info.port) != (fake.map_name, fake.players, fake.max_players, fake.port):
+            failures.append(f"{fake.port}: info mismatch {info}")
+        players = await a2s.players(fake.host, fake.port)
+        if len(players) != fake.players or any(p.index != i for i, p in enumerate(players)):
+            failures.append(f"{fake.port}: {len(players)} players, expected {fake.players}")
+    return failures
+
+
+async def run(args) -> int:
+    import a2s
+    from fakes import FakeA2SServer
+
+    fakes = []
+    for i in range(args.servers):
+        # every third server splits its player list, every sixth compresses it too
+        split = i % 3 == 0
+        fakes.append(FakeA2SServer(players=40 if split else 3 + i % 7, max_players=64,
+                                   map_name=f"de_map{i % 5}", challenge_info=i % 2 == 0,
+                                   max_packet=400 if split else 1248, compress=split and i % 2 == 0).start())
+    dead = ("127.0.0.1", _free_udp_port())
+
+    failures = await check(fakes[:min(len(fakes), 12)])
+    for f in failures:
+        print("FAIL:", f)
+
+    addrs = [(f.host, f.port) for f in fakes] + [dead]
+    latencies, down, started = [], 0, time.perf_counter()
+    for _ in range(args.rounds):
+        results = await a2s.info_many(addrs, timeout=args.timeout, max_age=0)
+        latencies += [r.latency for r in results.values() if r]
+        down += sum(1 for addr, r in results.items() if r is None and addr != dead)
+        if results[dead] is not None:
+            failures.append("dead port answered")
+    elapsed = time.perf_counter() - started
+    for f in fakes:
+        f.stop()
+
+    n = len(addrs) * args.rounds
+    print(f"{n} A2S_INFO queries to {len(addrs)} servers in {elapsed:.2f} s -> {n / elapsed:.0f} queries/s "
+          f"(one dead port per round)")
+    print("latency ms: " + "  ".join(f"p{p} {percentile(latencies, p) * 1000:.2f}" for p in (50, 95, 99)))
+    if down:
+        failures.append(f"{down} live answers missing")
+        print(f"FAIL: {down} live answers missing")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--servers", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""End-to-end load benchmark: synthetic updates through the real Dispatcher.
+
+Builds the bot's Dispatcher and router from handlers.py against a temp
+SQLite database, a fake Bot API session and local fake RCON and A2S
+servers, then replays a mixed workload (/start, panel opens, status, map paging, mode
+changes) for many simulated users and reports updates/s and latency
+percentiles. Each user's updates run in order, users run concurrently.
+
+    python bench/bot_load.py --users 2000 --actions 6
+    python bench/bot_load.py --json result.json --max-p95-ms 50   # CI gate
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bot"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Workload mix: action -> weight
+MIX = {"panel": 3, "status": 2, "maps": 2, "page": 2, "modes": 1, "mode": 1}
+BASE_USER_ID = 100000
+
+
+def _setup_env(tmpdir: str, throttle: bool):
+    os.environ["DB_PATH"] = os.path.join(tmpdir, "bench.db")
+    os.environ["TELEGRAM_BOT_TOKEN"] = "123456:" + "A" * 35
+    os.environ.setdefault("SLOW_UPDATE_MS", "1000000")
+    os.environ["PROFILE_PATH"] = os.path.join(tmpdir, "profile.pstats")
+    os.environ["METRICS_PORT"] = "0"
+    if not throttle:
+        os.environ["THROTTLE_USER_PER_MIN"] = os.environ["THROTTLE_SERVER_PER_MIN"] = "0"
+
+
+# ── Synthetic updates ───────────────────────────────────────────────
+
+class Updates:
+    def __init__(self):
+        self.next_id = 1
+
+    def _user(self, uid: int) -> dict:
+        return {"id": uid, "is_bot": False, "first_name": f"u{uid}", "username": f"u{uid}"}
+
+    def _chat(self, uid: int) -> dict:
+        return {"id": uid, "type": "private"}
+
+    def _id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def command(self, uid: int, text: str) -> dict:
+        uid_ = self._id()
+        return {"update_id": uid_, "message": {
+            "message_id": uid_, "date": int(time.time()), "chat": self._chat(uid), "from": self._user(uid),
+            "text": text, "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        }}
+
+    def callback(self, uid: int, data: str) -> dict:
+        uid_ = self._id()
+        return {"update_id": uid_, "callback_query": {
+            "id": str(uid_), "from": self._user(uid), "chat_instance": str(uid), "data": data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": self._chat(uid),
+                        "from": {"id": 1, "is_bot": True, "first_name": "bot"}, "text": "panel"},
+        }}
+
+
+def user_script(updates: Updates, uid: int, server_id: int, actions: int, modes: list[str],
+                rng: random.Random) -> list[tuple[str, dict]]:
+    import callbacks as cbk
+
+    script = [("start", updates.command(uid, "/start"))]
+    kinds, weights = zip(*MIX.items())
+    for kind in rng.choices(kinds, weights, k=actions):
+        if kind == "panel":
+            data = cbk.panel(server_id)
+        elif kind == "page":
+            data = cbk.map_page(server_id, rng.randint(0, 3), None)
+        elif kind == "mode":
+            data = cbk.change_mode(server_id, rng.choice(modes))
+        else:
+            data = cbk.action(server_id, kind)
+        script.append((kind, updates.callback(uid, data)))
+    return script
+
+
+# ── Runner ──────────────────────────────────────────────────────────
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def run(args) -> dict:
+    import catalog
+    import database as db
+    import main
+    import prefetch
+    import rcon_client
+    import rtt
+    import throttle
+    from aiogram import Bot
+    from fakes import FakeA2SServer, FakeRconServer, FakeSession
+
+    if args.rcon_idle is not None:
+        rtt.ADAPTIVE = False
+        rcon_client.RESPONSE_IDLE = args.rcon_idle
+        rcon_client.AUTH_EXTRA_WAIT = args.rcon_idle
+    rcon = FakeRconServer(plugin=not args.no_plugin, delay=args.rcon_delay).start()
+    query = FakeA2SServer(port=rcon.port).start()  # A2S answers on the game port, like srcds
+
+    db.init_db()
+    rng = random.Random(args.seed)
+    modes = [m for m, ids in catalog.get().mode_ids.items() if ids] or list(catalog.get().game_modes)
+    updates = Updates()
+    scripts = []
+    for i in range(args.users):
+        uid = BASE_USER_ID + i
+        db.ensure_user(uid, f"u{uid}")
+        server_id = db.add_server(uid, f"bench-{i}", rcon.host, rcon.port, rcon.password)
+        scripts.append(user_script(updates, uid, server_id, args.actions, modes, rng))
+
+    session = FakeSession(latency=args.api_latency)
+    bot = Bot(token=os.environ["TELEGRAM_BOT_TOKEN"], session=session)
+    bot.session.middleware(main.middlewares.ApiTimer())
+    dp = main._dispatcher()
+
+    latencies: dict[str, list[float]] = {}
+    errors = 0
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def play(script):
+        nonlocal errors
+        async with sem:
+            for kind, update in script:
+                started = time.perf_counter()
+                try:
+                    await dp.feed_raw_update(bot, update)
+                except Exception:
+                    errors += 1
+                latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(play(s) for s in scripts))
+    elapsed = time.perf_counter() - started
+    rcon.stop()
+    query.stop()
+
+    everything = [x for xs in latencies.values() for x in xs]
+    result = {
+        "users": args.users,
+        "updates": len(everything),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "updates_per_s": round(len(everything) / elapsed, 1),
+        "rcon_commands": rcon.commands,
+        "api_calls": sum(session.calls.values()),
+        "prefetch": {k[0]: v for k, v in sorted(prefetch.outcomes.series.items())},
+        "throttle": {k[0]: v for k, v in sorted(throttle.decisions.series.items())},
+        "latency_ms": _summary(everything),
+        "by_action": {k: _summary(v) | {"n": len(v)} for k, v in sorted(latencies.items())},
+    }
+    return result
+
+
+def _summary(values: list[float]) -> dict:
+    return {f"p{p}": round(percentile(values, p) * 1000, 2) for p in (50, 90, 95, 99)} | {
+        "max": round(max(values, default=0) * 1000, 2)}
+
+
+def report(result: dict):
+    print(f"{result['updates']} updates from {result['users']} users in {result['seconds']} s "
+          f"-> {result['updates_per_s']} updates/s "
+          f"({result['rcon_commands']} RCON commands, {result['api_calls']} API calls, {result['errors']} errors)")
+    print("prefetch: " + ", ".join(f"{k} {v}" for k, v in result["prefetch"].items()))
+    if result["throttle"]:
+        print("throttle: " + ", ".join(f"{k} {v}" for k, v in result["throttle"].items()))
+    lat = result["latency_ms"]
+    print(f"latency ms: p50 {lat['p50']}  p90 {lat['p90']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"{'action':<8} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for kind, s in result["by_action"].items():
+        print(f"{kind:<8} {s['n']:>7} {s['p50']:>8} {s['p95']:>8} {s['p99']:>8} {s['max']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--actions", type=int, default=6, help="callback actions per user after /start")
+    parser.add_argument("--concurrency", type=int, default=100, help="users in flight at once")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="simulated Bot API round trip, s")
+    parser.add_argument("--rcon-delay", type=float, default=0.0, help="fake RCON processing time, s")
+    parser.add_argument("--rcon-idle", type=float, default=0.002,
+                        help="fixed RCON end-of-response wait instead of RTT-derived timeouts")
+    parser.add_argument("--adaptive-rcon", dest="rcon_idle", action="store_const", const=None,
+                        help="use the bot's RTT-derived RCON timeouts (floors of 0.5-1 s apply)")
+    parser.add_argument("--no-plugin", action="store_true", help="fake server without css_status_json")
+    parser.add_argument("--throttle", action="store_true",
+                        help="keep the bot's rate limits (THROTTLE_* from the environment); off by default")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the result here")
+    parser.add_argument("--max-p95-ms", type=float, help="exit 1 if overall p95 latency is above this")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="botbench_") as tmpdir:
+        _setup_env(tmpdir, args.throttle)
+        result = asyncio.run(run(args))
+
+    report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.max_p95_ms is not None and result["latency_ms"]["p95"] > args.max_p95_ms:
+        print(f"FAIL: p95 {result['latency_ms']['p95']} ms > {args.max_p95_ms} ms")
+        return 1
+    if result["errors"]:
+        print("FAIL: handlers raised")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""Local stand-ins for the bot's external services, for benchmarks.
+
+- FakeSession: aiogram session that answers Bot API calls without network
+- FakeRconServer: threaded Source RCON server with canned CS2 replies
+- FakeA2SServer: threaded Source query (A2S) UDP server with challenges
+  and split responses
+"""
+import asyncio
+import bz2
+import json
+import os
+import socketserver
+import struct
+import threading
+import time
+import zlib
+from typing import Any
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message
+
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+
+# ── Telegram ────────────────────────────────────────────────────────
+
+class FakeSession(BaseSession):
+    """Answers every Bot API method locally; `latency` simulates the round trip."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: dict[str, int] = {}
+        self._message_id = 0
+
+    async def make_request(self, bot, method: TelegramMethod, timeout: int | None = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        if returning is Message or Message in getattr(returning, "__args__", ()):
+            return self._message(bot, method)
+        return True
+
+    def _message(self, bot, method) -> Message:
+        self._message_id += 1
+        chat_id = getattr(method, "chat_id", None) or 0
+        return Message.model_validate({
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id if isinstance(chat_id, int) else 0, "type": "private"},
+            "text": getattr(method, "text", None) or "",
+        }, context={"bot": bot})
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+# ── RCON ────────────────────────────────────────────────────────────
+
+STATUS_TEXT = """hostname: Bench CS2
+version : 1.40.6.8/14068 secure
+udp/ip  : 0.0.0.0:27015
+os      :  Linux
+type    :  community dedicated
+map     : de_dust2
+players : 3 humans, 2 bots (10/0 max) (not hibernating)
+
+---------players--------
+  id     time ping loss      state   rate adr name
+    2    12:01   24    0     active 786432 10.0.0.2:27005 'alpha'
+    3    08:44   31    0     active 786432 10.0.0.3:27005 'bravo'
+    4    00:52   57    0     active 786432 10.0.0.4:27005 'charlie'
+    5      BOT    0    0     active      0 'Bot Dan'
+    6      BOT    0    0     active      0 'Bot Eve'
+#end
+"""
+
+STATUS_JSON = json.dumps({
+    "v": 1, "hostname": "Bench CS2", "map": "de_dust2", "game_type": 0, "game_mode": 1,
+    "max_players": 10, "scores": {"T": 4, "CT": 7},
+    "players": [
+        {"slot": i, "userid": i + 2, "name": name, "steamid": str(76561197960265728 + 1000 + i),
+         "team": "CT" if i % 2 else "T", "ping": 20 + i, "score": 10 - i, "bot": False}
+        for i, name in enumerate(("alpha", "bravo", "charlie"))
+    ],
+}, separators=(",", ":"))
+
+
+def _pack(request_id: int, pkt_type: int, body: str) -> bytes:
+    data = body.encode("utf-8") + b"\x00\x00"
+    return struct.pack("<iii", 8 + len(data), request_id, pkt_type) + data
+
+
+class _RconHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server: FakeRconServer = self.server.owner
+        sock = self.request
+        authed = False
+        while True:
+            head = self._recv(4)
+            if head is None:
+                return
+            size = struct.unpack("<i", head)[0]
+            data = self._recv(size)
+            if data is None:
+                return
+            request_id, pkt_type = struct.unpack("<ii", data[:8])
+            body = data[8:-2].decode("utf-8", errors="replace")
+            if pkt_type == SERVERDATA_AUTH:
+                authed = body == server.password
+                sock.sendall(_pack(request_id if authed else -1, SERVERDATA_AUTH_RESPONSE, ""))
+                continue
+            if not authed:
+                return
+            server.commands += 1
+            if server.delay:
+                time.sleep(server.delay)
+            sock.sendall(_pack(request_id, SERVERDATA_RESPONSE_VALUE, server.reply(body)))
+
+    def _recv(self, n: int) -> bytes | None:
+        buf = b""
+        while len(buf) < n:
+            try:
+                chunk = self.request.recv(n - len(buf))
+            except ConnectionResetError:  # client closed with our reply unread
+                return None
+            if not chunk:
+                return None
+            buf += chunk
+        return buf
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeRconServer:
+    """Source RCON on 127.0.0.1 in a background thread.
+
+    Replies to status and css_status_json (unless plugin=False) with canned
+    output, to anything else with an empty body. `delay` adds server-side
+    processing time per command.
+    """
+
+    def __init__(self, password: str = "bench", port: int = 0, plugin: bool = True, delay: float = 0.0):
+        self.password = password
+        self.plugin = plugin
+        self.delay = delay
+        self.commands = 0
+        self._server = _TCPServer(("127.0.0.1", port), _RconHandler)
+        self._server.owner = self
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def reply(self, command: str) -> str:
+        word = command.split(None, 1)[0].lower() if command.strip() else ""
+        if word == "status":
+            return STATUS_TEXT
+        if word == "css_status_json":
+            return STATUS_JSON if self.plugin else 'Unknown command "css_status_json"!'
+        return ""
+
+    def start(self) -> "FakeRconServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ── A2S (UDP query) ─────────────────────────────────────────────────
+
+A2S_SIMPLE = b"\xff\xff\xff\xff"
+A2S_SPLIT = b"\xfe\xff\xff\xff"
+
+
+def _cstr(text: str) -> bytes:
+    return text.encode("utf-8") + b"\x00"
+
+
+class _A2SHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server: FakeA2SServer = self.server.owner
+        data, sock = self.request
+        if not data.startswith(A2S_SIMPLE) or len(data) < 5:
+            return
+        server.queries += 1
+        kind, body = data[4:5], data[5:]
+        if kind == b"T":
+            challenge = body[len(b"Source Engine Query\x00"):]
+            if server.challenge_info and challenge != server.challenge:
+                return self._send(sock, b"A" + server.challenge)
+            reply = server.info_reply()
+        elif kind == b"U":
+            if body[:4] != server.challenge:
+                return self._send(sock, b"A" + server.challenge)
+            reply = server.player_reply()
+        else:
+            return
+        if server.delay:
+            time.sleep(server.delay)
+        for packet in server.packets(A2S_SIMPLE + reply):
+            sock.sendto(packet, self.client_address)
+
+    def _send(self, sock, payload: bytes):
+        sock.sendto(A2S_SIMPLE + payload, self.client_address)
+
+
+class _UDPServer(socketserver.ThreadingUDPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeA2SServer:
+    """Source query server on 127.0.0.1 in a background thread.
+
+    Answers A2S_INFO and A2S_PLAYER for `players` synthetic players. A2S_PLAYER
+    always goes through a challenge; A2S_INFO too if challenge_info=True (as
+    on current CS2 builds). Replies larger than `max_packet` are split, and
+    bzip2-compressed when compress=True. Split packets are sent in reverse
+    order to exercise reassembly.
+    """
+
+    def __init__(self, port: int = 0, players: int = 3, max_players: int = 10, map_name: str = "de_dust2",
+                 challenge_info: bool = True, max_packet: int = 1248, compress: bool = False, delay: float = 0.0):
+        self.players = players
+        self.max_players = max_players
+        self.map_name = map_name
+        self.challenge_info = challenge_info
+        self.max_packet = max_packet
+        self.compress = compress
+        self.delay = delay
+        self.queries = 0
+        self.challenge = os.urandom(4)
+        self._split_id = 0
+        self._server = _UDPServer(("127.0.0.1", port), _A2SHandler)
+        self._server.owner = self
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def info_reply(self) -> bytes:
+        return (b"I\x11" + _cstr("Bench CS2") + _cstr(self.map_name) + _cstr("csgo")
+                + _cstr("Counter-Strike 2") + struct.pack("<H", 730)
+                + bytes([min(self.players, 255), self.max_players, 0]) + b"dl\x00\x01"
+                + _cstr("1.40.6.8") + b"\x80" + struct.pack("<H", self.port))
+
+    def player_reply(self) -> bytes:
+        out = [b"D", bytes([min(self.players, 255)])]
+        for i in range(min(self.players, 255)):
+            out.append(bytes([i]) + _cstr(f"player-{i:03d} " + "x" * 20) + struct.pack("<lf", 10 - i, 60.0 * i))
+        return b"".join(out)
+
+    def packets(self, payload: bytes) -> list[bytes]:
+        if len(payload) <= self.max_packet:
+            return [payload]
+        self._split_id = (self._split_id + 1) & 0x7FFFFFFF
+        msg_id = self._split_id | (0x80000000 if self.compress else 0)
+        data = bz2.compress(payload) if self.compress else payload
+        size = self.max_packet - 12
+        chunks = [data[i:i + size] for i in range(0, len(data), size)]
+        if self.compress:
+            chunks[0] = struct.pack("<lL", len(payload), zlib.crc32(payload)) + chunks[0]
+        return [A2S_SPLIT + struct.pack("<LBBH", msg_id, len(chunks), n, self.max_packet) + chunk
+                for n, chunk in reversed(list(enumerate(chunks)))]
+
+    def start(self) -> "FakeA2SServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
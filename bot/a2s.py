@@ -0,0 +1,274 @@
+import asyncio
+import bz2
+import struct
+import sys
+import time
+import zlib
+from typing import NamedTuple
+
+import metrics
+import profiling
+
+# Source query protocol (A2S) over UDP: server info and player list without
+# RCON credentials. https://developer.valvesoftware.com/wiki/Server_queries
+# Handles the S2C_CHALLENGE handshake and split (multi-packet) responses,
+# including the bzip2-compressed variant.
+
+SIMPLE = b"\xff\xff\xff\xff"
+SPLIT = b"\xfe\xff\xff\xff"
+A2S_INFO = b"T" + b"Source Engine Query\x00"
+A2S_PLAYER = b"U"
+S2C_CHALLENGE = ord("A")
+INFO_REPLY = ord("I")
+PLAYER_REPLY = ord("D")
+
+TIMEOUT = 1.5
+CONCURRENCY = 64
+CACHE_TTL = 10.0
+
+
+class Info(NamedTuple):
+    name: str
+    map: str
+    folder: str
+    game: str
+    app_id: int
+    players: int
+    max_players: int
+    bots: int
+    server_type: str
+    environment: str
+    password: bool
+    vac: bool
+    version: str
+    port: int | None
+    latency: float
+
+
+class Player(NamedTuple):
+    index: int
+    name: str
+    score: int
+    duration: float
+
+
+class _Reader:
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def byte(self) -> int:
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def unpack(self, fmt: str):
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def string(self) -> str:
+        end = self.data.index(b"\x00", self.pos)
+        value = self.data[self.pos:end].decode("utf-8", errors="replace")
+        self.pos = end + 1
+        return value
+
+    def more(self) -> bool:
+        return self.pos < len(self.data)
+
+
+def parse_info(payload: bytes, latency: float = 0.0) -> Info:
+    r = _Reader(payload, 1)  # after the 'I' header byte
+    r.byte()  # protocol
+    name, map_name, folder, game = r.string(), r.string(), r.string(), r.string()
+    app_id = r.unpack("<H")
+    players, max_players, bots = r.byte(), r.byte(), r.byte()
+    server_type, environment = chr(r.byte()), chr(r.byte())
+    password, vac = bool(r.byte()), bool(r.byte())
+    version = r.string() if r.more() else ""
+    port = None
+    if r.more():
+        edf = r.byte()
+        if edf & 0x80:
+            port = r.unpack("<H")
+    return Info(name, map_name, folder, game, app_id, players, max_players, bots,
+                server_type, environment, password, vac, version, port, latency)
+
+
+def parse_players(payload: bytes) -> list[Player]:
+    r = _Reader(payload, 1)  # after the 'D' header byte
+    count = r.byte()
+    players = []
+    for _ in range(count):
+        if not r.more():
+            break
+        players.append(Player(r.byte(), r.string(), r.unpack("<l"), r.unpack("<f")))
+    return players
+
+
+class _Split:
+    """Collects the packets of one split response."""
+
+    def __init__(self, total: int, compressed: bool):
+        self.total = total
+        self.compressed = compressed
+        self.parts: dict[int, bytes] = {}
+        self.size = self.crc = None
+
+    def add(self, number: int, body: bytes) -> bytes | None:
+        if number == 0 and self.compressed:
+            self.size, self.crc = struct.unpack_from("<lL", body)
+            body = body[8:]
+        self.parts[number] = body
+        if len(self.parts) < self.total:
+            return None
+        data = b"".join(self.parts[i] for i in range(self.total))
+        if self.compressed:
+            data = bz2.decompress(data)
+            if len(data) != self.size or zlib.crc32(data) != self.crc:
+                raise ValueError("corrupt compressed A2S response")
+        return data
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.replies: asyncio.Queue[bytes] = asyncio.Queue()
+        self.splits: dict[int, _Split] = {}
+        self.error: Exception | None = None
+
+    def datagram_received(self, data: bytes, addr):
+        if data.startswith(SIMPLE):
+            self.replies.put_nowait(data[4:])
+        elif data.startswith(SPLIT) and len(data) >= 12:
+            msg_id, total, number = struct.unpack_from("<LBB", data, 4)
+            # Source engine split header: id, total, number, max packet size (short)
+            split = self.splits.get(msg_id)
+            if split is None:
+                split = self.splits[msg_id] = _Split(total, bool(msg_id & 0x80000000))
+            try:
+                whole = split.add(number, data[12:])
+            except (OSError, ValueError, struct.error) as e:
+                self.error = ValueError(f"bad split A2S response: {e}")
+                self.replies.put_nowait(b"")
+                return
+            if whole is not None:
+                del self.splits[msg_id]
+                self.replies.put_nowait(whole[4:] if whole.startswith(SIMPLE) else whole)
+
+    def error_received(self, exc):
+        self.error = exc
+        self.replies.put_nowait(b"")
+
+
+async def _request(host: str, port: int, request: bytes, expect: int, timeout: float,
+                   challenge_suffix: bool) -> tuple[bytes, float]:
+    """Send one query, answering a challenge if the server asks for one."""
+    loop = asyncio.get_running_loop()
+    transport, proto = await loop.create_datagram_endpoint(_Protocol, remote_addr=(host, port))
+    try:
+        deadline = loop.time() + timeout
+        started = time.perf_counter()
+        transport.sendto(SIMPLE + request + (b"\xff\xff\xff\xff" if challenge_suffix else b""))
+        for _ in range(3):
+            reply = await asyncio.wait_for(proto.replies.get(), max(0.0, deadline - loop.time()))
+            if proto.error:
+                raise proto.error
+            if reply[:1] and reply[0] == S2C_CHALLENGE:
+                transport.sendto(SIMPLE + request + reply[1:5])
+                continue
+            if reply[:1] and reply[0] == expect:
+                return reply, time.perf_counter() - started
+            raise ValueError(f"unexpected A2S reply {reply[:1]!r}")
+        raise ValueError("A2S challenge loop")
+    finally:
+        transport.close()
+
+
+async def _timed_request(query: str, host: str, port: int, request: bytes, expect: int,
+                         timeout: float, challenge_suffix: bool) -> tuple[bytes, float]:
+    started = time.perf_counter()
+    try:
+        return await _request(host, port, request, expect, timeout, challenge_suffix)
+    except asyncio.TimeoutError:
+        metrics.a2s_errors.inc(query, "timeout")
+        raise
+    except OSError:
+        metrics.a2s_errors.inc(query, "connection")
+        raise
+    except ValueError:
+        metrics.a2s_errors.inc(query, "protocol")
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.a2s_seconds.observe(elapsed, query)
+        profiling.add("a2s", elapsed)
+
+
+async def info(host: str, port: int, timeout: float = TIMEOUT) -> Info:
+    reply, latency = await _timed_request("info", host, port, A2S_INFO, INFO_REPLY, timeout, challenge_suffix=False)
+    try:
+        return parse_info(reply, latency)
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"malformed A2S_INFO reply: {e}") from None
+
+
+async def players(host: str, port: int, timeout: float = TIMEOUT) -> list[Player]:
+    reply, _ = await _timed_request("player", host, port, A2S_PLAYER, PLAYER_REPLY, timeout, challenge_suffix=True)
+    try:
+        return parse_players(reply)
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"malformed A2S_PLAYER reply: {e}") from None
+
+
+# ── Many servers ────────────────────────────────────────────────────
+
+_cache: dict[tuple[str, int], tuple[float, Info | None]] = {}
+
+
+async def info_many(addresses: list[tuple[str, int]], timeout: float = TIMEOUT,
+                    concurrency: int = CONCURRENCY, max_age: float = CACHE_TTL) -> dict[tuple[str, int], Info | None]:
+    """A2S_INFO for many servers at once; None for servers that did not answer.
+
+    Results (including failures) are cached for max_age seconds.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    now = time.monotonic()
+    # Drop what this call would not use, so deleted servers do not stay cached
+    for addr in [a for a, (at, _) in _cache.items() if now - at >= max_age]:
+        del _cache[addr]
+    results: dict[tuple[str, int], Info | None] = {}
+
+    async def one(addr):
+        cached = _cache.get(addr)
+        if cached and now - cached[0] < max_age:
+            results[addr] = cached[1]
+            return
+        async with sem:
+            try:
+                results[addr] = await info(*addr, timeout=timeout)
+            except (OSError, asyncio.TimeoutError, ValueError):
+                results[addr] = None
+        _cache[addr] = (time.monotonic(), results[addr])
+
+    await asyncio.gather(*(one(a) for a in set(addresses)))
+    return results
+
+
+async def _main(targets: list[str]):
+    addrs = []
+    for t in targets:
+        host, _, port = t.partition(":")
+        addrs.append((host, int(port or 27015)))
+    for addr, result in (await info_many(addrs)).items():
+        if result is None:
+            print(f"{addr[0]}:{addr[1]}  down")
+            continue
+        print(f"{addr[0]}:{addr[1]}  {result.name!r} {result.map} "
+              f"{result.players}/{result.max_players} ({result.bots} bots) {result.latency * 1000:.0f} ms")
+        for p in await players(*addr):
+            print(f"    {p.name!r} score {p.score} {p.duration / 60:.0f} min")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python a2s.py host[:port] ...")
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,329 @@
+import asyncio
+import heapq
+import logging
+import operator
+import re
+import time
+from typing import Awaitable, Callable
+
+import a2s
+import database as db
+import metrics
+import sharding
+
+# Alert rules over server state. A poller takes an A2S snapshot of every
+# server that has rules ({"up", "players", "map"}); the engine diffs it with
+# the previous snapshot and evaluates only the rules indexed on the fields
+# that changed, so a quiet server costs nothing however many rules watch it.
+# State rules (down, players > N, empty) fire once when their condition has
+# held for `hold` seconds and re-arm when it stops holding, which debounces
+# flapping; a cooldown additionally spaces out repeats. Event rules (map)
+# fire on every change. Notifications are batched into one message per chat
+# per tick. With several workers each one watches the servers it owns.
+
+POLL_INTERVAL = 30.0
+TICK = 5.0               # hold timers and notification batches
+RELOAD_INTERVAL = 60.0   # picks up rules added by other worker processes
+COOLDOWN = 300.0         # a rule notifies at most this often
+MSG_LIMIT = 4000
+
+FIELDS = ("up", "players", "map")
+KINDS = ("down", "up", "players", "empty", "map")
+DEFAULT_HOLD = {"down": 60, "up": 0, "players": 60, "empty": 30 * 60, "map": 0}
+_OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "=": operator.eq}
+_PLAYERS_RE = re.compile(r"players\s*(>=|<=|>|<|=)\s*(\d+)$")
+
+fired_total = metrics.counter("bot_alerts_fired_total", "Alert notifications by rule kind", ("kind",))
+checks_total = metrics.counter("bot_alert_rule_checks_total", "Alert rule evaluations", ())
+
+
+# ── Rules ───────────────────────────────────────────────────────────
+
+def parse_rule(text: str) -> tuple[str, str, int, int]:
+    """'down', 'players > 8', 'empty 30', 'map', each optionally '... for <minutes>'.
+
+    Returns (kind, op, value, hold_seconds); raises ValueError.
+    """
+    text = text.strip().lower()
+    hold = None
+    m = re.search(r"\s+for\s+(\d+)$", text)
+    if m:
+        hold = int(m.group(1)) * 60
+        text = text[:m.start()]
+    op, value = "", 0
+    if text in ("down", "up", "map"):
+        kind = text
+    elif text.startswith("empty"):
+        kind, minutes = "empty", text[5:].strip()
+        if minutes:
+            if not minutes.isdigit():
+                raise ValueError("empty takes minutes, e.g. 'empty 30'")
+            hold = int(minutes) * 60
+    elif (pm := _PLAYERS_RE.match(text)):
+        kind, op, value = "players", pm.group(1), int(pm.group(2))
+    else:
+        raise ValueError(f"unknown rule {text!r}")
+    return kind, op, value, DEFAULT_HOLD[kind] if hold is None else hold
+
+
+def describe(rule: dict) -> str:
+    kind = rule["kind"]
+    if kind == "players":
+        text = f"players {rule['op']} {rule['value']}"
+    elif kind == "empty":
+        return f"empty for {rule['hold'] // 60} min"
+    else:
+        text = {"down": "went down", "up": "came back up", "map": "map changed"}[kind]
+    if rule["hold"]:
+        text += f" (for {rule['hold'] // 60 or 1} min)" if rule["hold"] >= 60 else f" (for {rule['hold']} s)"
+    return text
+
+
+class Rule:
+    __slots__ = ("id", "telegram_id", "server_id", "server_name", "kind", "op", "value", "hold",
+                 "last_fired", "active", "fired", "gen")
+
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        self.telegram_id = row["telegram_id"]
+        self.server_id = row["server_id"]
+        self.server_name = row.get("server_name") or f"#{row['server_id']}"
+        self.kind = row["kind"]
+        self.op = row.get("op") or ""
+        self.value = row.get("value") or 0
+        self.hold = row.get("hold") or 0
+        self.last_fired = row.get("last_fired") or float("-inf")
+        self.active = False   # condition currently true
+        self.fired = False    # notified for the current activation
+        self.gen = 0          # bumps on every transition; stale hold timers are skipped
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        return {"down": ("up",), "up": ("up",), "map": ("map",)}.get(self.kind, ("players",))
+
+    def check(self, snap: dict) -> bool:
+        kind = self.kind
+        if kind == "down":
+            return not snap["up"]
+        if kind == "up":
+            return bool(snap["up"])
+        players = snap["players"]
+        if players is None:
+            return False
+        if kind == "empty":
+            return players == 0
+        return _OPS[self.op](players, self.value)
+
+    def message(self, snap: dict) -> str:
+        kind = self.kind
+        if kind == "down":
+            return f"{self.server_name}: not answering"
+        if kind == "up":
+            return f"{self.server_name}: back up, {snap['players']} player(s) on {snap['map']}"
+        if kind == "map":
+            return f"{self.server_name}: map changed to {snap['map']}"
+        if kind == "empty":
+            return f"{self.server_name}: empty for {self.hold // 60} min"
+        return f"{self.server_name}: {snap['players']} player(s) (rule: players {self.op} {self.value})"
+
+
+# ── Engine ──────────────────────────────────────────────────────────
+
+class Engine:
+    """Incremental rule evaluation; no I/O, so it can be driven by a benchmark."""
+
+    def __init__(self):
+        self.rules: dict[int, Rule] = {}
+        self._index: dict[tuple[int, str], list[Rule]] = {}
+        self._snapshots: dict[int, dict] = {}
+        self._timers: list[tuple[float, int, int]] = []
+        self.outbox: dict[int, list[str]] = {}
+        self.fired: list[int] = []   # rule ids fired since the last drain
+        self.checks = 0
+
+    def load(self, rows: list[dict]):
+        """Replace the rule set, keeping the state of rules that stay."""
+        old = self.rules
+        self.rules, self._index = {}, {}
+        watched = {row["server_id"] for row in rows}
+        # A server that comes back later starts from a fresh baseline
+        self._snapshots = {sid: snap for sid, snap in self._snapshots.items() if sid in watched}
+        for row in rows:
+            rule = old.get(row["id"])
+            if rule is None:
+                rule = Rule(row)
+                snap = self._snapshots.get(rule.server_id)
+                if snap is not None:
+                    self._baseline(rule, snap)
+            self.rules[rule.id] = rule
+            for field in rule.fields:
+                self._index.setdefault((rule.server_id, field), []).append(rule)
+
+    def add(self, rows: list[dict]):
+        self.load([*self._rows(), *rows])
+
+    def remove(self, rule_id: int):
+        self.load([r for r in self._rows() if r["id"] != rule_id])
+
+    def _rows(self) -> list[dict]:
+        return [{"id": r.id, "telegram_id": r.telegram_id, "server_id": r.server_id, "server_name": r.server_name,
+                 "kind": r.kind, "op": r.op, "value": r.value, "hold": r.hold, "last_fired": r.last_fired}
+                for r in self.rules.values()]
+
+    def _baseline(self, rule: Rule, snap: dict):
+        # A condition already true when first seen is not news
+        rule.active = rule.kind != "map" and rule.check(snap)
+        rule.fired = rule.active
+
+    def observe(self, server_id: int, snap: dict, now: float, full: bool = False):
+        """Feed a snapshot. full=True evaluates every rule of the server (the naive baseline)."""
+        prev = self._snapshots.get(server_id)
+        self._snapshots[server_id] = snap
+        if prev is None:
+            for field in FIELDS:
+                for rule in self._index.get((server_id, field), ()):
+                    self._baseline(rule, snap)
+            return
+        fields = FIELDS if full else [f for f in FIELDS if snap[f] != prev[f]]
+        for field in fields:
+            for rule in self._index.get((server_id, field), ()):
+                self.checks += 1
+                self._apply(rule, prev, snap, now)
+
+    def _apply(self, rule: Rule, prev: dict, snap: dict, now: float):
+        if rule.kind == "map":
+            if snap["map"] and prev["map"] and snap["map"] != prev["map"]:
+                self._fire(rule, snap, now)
+            return
+        active = rule.check(snap)
+        if active == rule.active:
+            return
+        rule.active = active
+        rule.gen += 1
+        if not active:
+            rule.fired = False
+        elif rule.hold:
+            heapq.heappush(self._timers, (now + rule.hold, rule.id, rule.gen))
+        else:
+            self._fire(rule, snap, now)
+
+    def tick(self, now: float):
+        """Fire rules whose condition has now held for their hold time."""
+        while self._timers and self._timers[0][0] <= now:
+            _, rule_id, gen = heapq.heappop(self._timers)
+            rule = self.rules.get(rule_id)
+            if rule and rule.gen == gen and rule.active:
+                self._fire(rule, self._snapshots[rule.server_id], now)
+
+    def _fire(self, rule: Rule, snap: dict, now: float):
+        if rule.fired and rule.kind != "map":
+            return
+        rule.fired = True
+        if rule.kind != "map" and now - rule.last_fired < COOLDOWN:
+            return
+        rule.last_fired = now
+        self.outbox.setdefault(rule.telegram_id, []).append(rule.message(snap))
+        self.fired.append(rule.id)
+        fired_total.inc(rule.kind)
+
+    def drain(self) -> tuple[dict[int, list[str]], list[int]]:
+        outbox, fired = self.outbox, self.fired
+        self.outbox, self.fired = {}, []
+        return outbox, fired
+
+
+# ── Poller ──────────────────────────────────────────────────────────
+
+def snapshot(info: a2s.Info | None) -> dict:
+    if info is None:
+        return {"up": False, "players": None, "map": None}
+    return {"up": True, "players": max(0, info.players - info.bots), "map": info.map}
+
+
+class Monitor:
+    def __init__(self, notify: Callable[[int, str], Awaitable]):
+        self.notify = notify
+        self.engine = Engine()
+        self._servers: dict[int, tuple[str, int]] = {}
+        self._changes = 0  # bumped by add/remove, so a reload can tell its rows are already old
+
+    async def reload(self):
+        """Re-read all rules; the query runs in a thread, the engine is only touched on the loop."""
+        while True:
+            changes = self._changes
+            rows = await asyncio.to_thread(db.get_alert_rules)
+            if changes == self._changes:
+                break
+        rows = [r for r in rows if sharding.owns_server(r["server_id"])]
+        self._servers = {r["server_id"]: (r["host"], r["port"]) for r in rows}
+        self.engine.load(rows)
+
+    def add(self, rows: list[dict]):
+        """Rows as returned by db.add_alert_rule (with host and port)."""
+        self._changes += 1
+        rows = [r for r in rows if sharding.owns_server(r["server_id"])]
+        for row in rows:
+            self._servers[row["server_id"]] = (row["host"], row["port"])
+        self.engine.add(rows)
+
+    def remove(self, rule_id: int):
+        self._changes += 1
+        self.engine.remove(rule_id)
+        watched = {rule.server_id for rule in self.engine.rules.values()}
+        self._servers = {sid: addr for sid, addr in self._servers.items() if sid in watched}
+
+    async def poll(self, now: float):
+        servers = dict(self._servers)
+        found = await a2s.info_many(list(set(servers.values())), max_age=POLL_INTERVAL / 2)
+        for server_id, addr in servers.items():
+            self.engine.observe(server_id, snapshot(found.get(addr)), now)
+
+    async def run(self):
+        reloaded = float("-inf")
+        polled = 0.0
+        while True:
+            now = time.monotonic()
+            if now - reloaded >= RELOAD_INTERVAL:
+                reloaded = now
+                try:
+                    await self.reload()
+                except Exception as e:
+                    # Keep the current rules; the next reload tries again
+                    logging.warning("Could not load alert rules: %s", e)
+            if now - polled >= POLL_INTERVAL:
+                polled = now
+                try:
+                    await self.poll(time.time())
+                except Exception as e:
+                    logging.warning("Alert poll failed: %s", e)
+            self.engine.tick(time.time())
+            checks_total.inc(amount=self.engine.checks)
+            self.engine.checks = 0
+            await self._flush()
+            await asyncio.sleep(TICK)
+
+    async def _flush(self):
+        outbox, fired = self.engine.drain()
+        if fired:
+            try:
+                await asyncio.to_thread(db.mark_alerts_fired, fired, time.time())
+            except Exception as e:
+                # Only the cooldown across restarts is lost; notify anyway
+                logging.warning("Could not record fired alerts: %s", e)
+        for chat_id, lines in outbox.items():
+            piece = "Alerts:"
+            for line in lines:
+                if len(piece) + len(line) > MSG_LIMIT:
+                    await self._send(chat_id, piece)
+                    piece = "Alerts:"
+                piece += "\n- " + line
+            await self._send(chat_id, piece)
+
+    async def _send(self, chat_id: int, text: str):
+        try:
+            await self.notify(chat_id, text)
+        except Exception as e:
+            logging.warning("Could not send alerts to %s: %s", chat_id, e)
+
+
+current: Monitor | None = None
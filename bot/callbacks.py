@@ -0,0 +1,237 @@
+import sys
+from typing import NamedTuple
+
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+import catalog
+
+# Compact callback_data for server buttons. Telegram caps callback_data at
+# 64 bytes, which a full workshop map code after "map:{id}:" can exceed.
+# Version 1 layout: "1" + one-letter opcode + base-36 integer fields joined
+# by ".", e.g. "1m2s.4f.9x1c" = change map #159 on server 100, catalog tag
+# 9x1c. Maps and modes are catalog indexes; the catalog tag makes buttons
+# from before a catalog change decode as stale instead of picking the wrong
+# map. Version 0 is the old "prefix:id:..." text, still decoded so buttons
+# in existing chats keep working. Decoding happens once per update, in
+# middlewares.CallbackDecoder, which puts the result in data["cbd"].
+#
+# `python callbacks.py check` encodes every button the keyboards can produce
+# and fails if one is over the limit or does not round-trip.
+
+VERSION = "1"
+MAX_BYTES = 64
+SEP = "."
+
+PANEL = "p"        # server panel
+ACTION = "a"       # panel button: arg = index into ACTIONS
+MAP = "m"          # change map: arg = catalog map index
+MAP_PAGE = "g"     # map list page: arg = mode index + 1 (0 = all maps), page, catalog tag
+MODE = "o"         # change mode: arg = catalog mode index
+KICK = "k"         # kick player: arg = userid
+DELETE = "d"       # confirm server deletion
+
+ACTIONS = ("status", "rcon", "maps", "modes", "restart", "warmup_on", "warmup_off", "addt", "addct",
+           "kickbots", "broadcast", "kick", "delete", "msearch", "kickname")
+_ACTION_INDEX = {a: i for i, a in enumerate(ACTIONS)}
+_TAGGED = (MAP, MODE)  # ops whose arg indexes the catalog (MAP_PAGE too, after its page)
+
+
+class Callback(NamedTuple):
+    op: str
+    server_id: int
+    arg: int = 0
+    page: int = 0
+    stale: bool = False  # built from an older catalog; arg may point elsewhere now
+
+    @property
+    def action(self) -> str:
+        return ACTIONS[self.arg] if self.op == ACTION and self.arg < len(ACTIONS) else ""
+
+    @property
+    def mode(self) -> str | None:
+        """Mode name for MODE and MAP_PAGE callbacks."""
+        index = self.arg - 1 if self.op == MAP_PAGE else self.arg
+        modes = list(catalog.get().game_modes)
+        return modes[index] if 0 <= index < len(modes) and self.op in (MODE, MAP_PAGE) else None
+
+    @property
+    def map_entry(self) -> catalog.MapEntry | None:
+        entries = catalog.get().entries
+        return entries[self.arg] if self.op == MAP and self.arg < len(entries) else None
+
+
+# ── Encoding ────────────────────────────────────────────────────────
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _b36(n: int) -> str:
+    if n < 0:
+        return "-" + _b36(-n)
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = _DIGITS[r] + out
+        if not n:
+            return out
+
+
+def _pack(op: str, *fields: int) -> str:
+    return VERSION + op + SEP.join(_b36(f) for f in fields)
+
+
+def panel(server_id: int) -> str:
+    return _pack(PANEL, server_id)
+
+
+def action(server_id: int, name: str) -> str:
+    return _pack(ACTION, server_id, _ACTION_INDEX[name])
+
+
+def change_map(server_id: int, entry: catalog.MapEntry) -> str:
+    return _pack(MAP, server_id, entry.index, catalog.get().tag)
+
+
+def map_page(server_id: int, page: int, mode: str | None) -> str:
+    mode_arg = list(catalog.get().game_modes).index(mode) + 1 if mode else 0
+    return _pack(MAP_PAGE, server_id, mode_arg, page, catalog.get().tag)
+
+
+def change_mode(server_id: int, mode: str) -> str:
+    return _pack(MODE, server_id, list(catalog.get().game_modes).index(mode), catalog.get().tag)
+
+
+def kick(server_id: int, userid: int) -> str:
+    return _pack(KICK, server_id, userid)
+
+
+def delete(server_id: int) -> str:
+    return _pack(DELETE, server_id)
+
+
+# ── Decoding ────────────────────────────────────────────────────────
+
+def decode(data: str | None) -> Callback | None:
+    """Parse callback_data of either version; None if it is not a server button."""
+    if not data:
+        return None
+    try:
+        if data[0] == VERSION:
+            return _decode_v1(data)
+        return _decode_v0(data)
+    except (ValueError, IndexError):
+        return None
+
+
+def _decode_v1(data: str) -> Callback | None:
+    op = data[1]
+    fields = [int(f, 36) for f in data[2:].split(SEP)]
+    if op in _TAGGED:
+        server_id, arg, tag = fields
+        return Callback(op, server_id, arg, stale=tag != catalog.get().tag)
+    if op == MAP_PAGE:
+        if len(fields) == 3:
+            # Untagged (older buttons): a mode index cannot be trusted, all maps can
+            server_id, arg, page = fields
+            return Callback(op, server_id, arg, page, stale=arg != 0)
+        server_id, arg, page, tag = fields
+        return Callback(op, server_id, arg, page, stale=tag != catalog.get().tag)
+    if op in (ACTION, KICK):
+        server_id, arg = fields
+        return Callback(op, server_id, arg)
+    if op in (PANEL, DELETE):
+        (server_id,) = fields
+        return Callback(op, server_id)
+    return None
+
+
+def _decode_v0(data: str) -> Callback | None:
+    prefix, _, rest = data.partition(":")
+    cat = catalog.get()
+    modes = list(cat.game_modes)
+    if prefix == "srv":
+        return Callback(PANEL, int(rest))
+    if prefix == "del_yes":
+        return Callback(DELETE, int(rest))
+    server, _, tail = rest.partition(":")
+    server_id = int(server)
+    if prefix == "s":
+        return Callback(ACTION, server_id, _ACTION_INDEX[tail]) if tail in _ACTION_INDEX else None
+    if prefix == "kick":
+        return Callback(KICK, server_id, int(tail))
+    if prefix == "map":
+        entry = cat.by_code.get(tail)
+        return Callback(MAP, server_id, entry.index) if entry else None
+    if prefix == "mode":
+        return Callback(MODE, server_id, modes.index(tail)) if tail in cat.game_modes else None
+    if prefix == "mpage":
+        page, _, mode = tail.partition(":")
+        return Callback(MAP_PAGE, server_id, modes.index(mode) + 1 if mode in cat.game_modes else 0, int(page))
+    return None
+
+
+class Op(Filter):
+    """Matches callbacks decoded (by middlewares.CallbackDecoder) to one of the given opcodes."""
+
+    def __init__(self, *ops: str):
+        self.ops = ops
+
+    async def __call__(self, cb: CallbackQuery, cbd: Callback | None = None) -> bool:
+        return cbd is not None and cbd.op in self.ops
+
+
+# ── Self-check ──────────────────────────────────────────────────────
+
+# Largest values a button can carry: SQLite rowids and Source userids are
+# 64-bit signed at most; pages are bounded by the catalog size.
+_EXTREME_SERVER_IDS = (1, 35, 36, 10 ** 6, 2 ** 31 - 1, 2 ** 63 - 1)
+_EXTREME_USERIDS = (0, 1, 65535, 2 ** 31 - 1)
+
+
+def check() -> list[str]:
+    """Encode every producible button; return problems (empty = all fit and round-trip)."""
+    cat = catalog.get()
+    modes = list(cat.game_modes)
+    problems = []
+
+    def expect(data: str, want: Callback):
+        if len(data.encode("utf-8")) > MAX_BYTES:
+            problems.append(f"{data!r} is {len(data.encode('utf-8'))} bytes")
+        got = decode(data)
+        if got != want:
+            problems.append(f"{data!r} decodes to {got}, expected {want}")
+
+    for sid in _EXTREME_SERVER_IDS:
+        expect(panel(sid), Callback(PANEL, sid))
+        expect(delete(sid), Callback(DELETE, sid))
+        for i, name in enumerate(ACTIONS):
+            expect(action(sid, name), Callback(ACTION, sid, i))
+        for entry in cat.entries:
+            expect(change_map(sid, entry), Callback(MAP, sid, entry.index))
+        for i, mode in enumerate(modes):
+            expect(change_mode(sid, mode), Callback(MODE, sid, i))
+        max_page = len(cat.entries) // 18 + 1
+        for mode in [None] + modes:
+            for page in (0, max_page):
+                expect(map_page(sid, page, mode), Callback(MAP_PAGE, sid, modes.index(mode) + 1 if mode else 0, page))
+        for userid in _EXTREME_USERIDS:
+            expect(kick(sid, userid), Callback(KICK, sid, userid))
+    # Every decoded callback names what it was built from
+    for entry in cat.entries:
+        if decode(change_map(1, entry)).map_entry != entry:
+            problems.append(f"map {entry.name!r} does not resolve back to its entry")
+    for mode in modes:
+        if decode(change_mode(1, mode)).mode != mode or decode(map_page(1, 0, mode)).mode != mode:
+            problems.append(f"mode {mode!r} does not resolve back")
+    return problems
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["check"]:
+        sys.exit("usage: python callbacks.py check")
+    found = check()
+    if found:
+        sys.exit("callback_data check failed:\n  " + "\n  ".join(found[:50]))
+    print(f"callback_data ok: {len(catalog.get().entries)} maps, {len(catalog.get().game_modes)} modes, "
+          f"all buttons <= {MAX_BYTES} bytes and round-trip")
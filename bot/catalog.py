@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+from types import MappingProxyType
+from typing import NamedTuple
+
+import config
+
+# Compiled map catalog. `python catalog.py build` validates the map/mode data
+# and writes maps_catalog.json; the bot loads it lazily on first use and
+# builds read-only indexes. Without the artifact, or when config.py has
+# changed since it was built (config_hash, a hash of the file's bytes), the
+# catalog is compiled from the dicts in config.py instead.
+
+CATALOG_PATH = os.getenv(
+    "MAPS_CATALOG_PATH", os.path.join(os.path.dirname(__file__), "maps_catalog.json")
+)
+CATALOG_VERSION = 1
+
+_WORKSHOP_RE = re.compile(r"workshop/(\d+)/([\w.-]+)")
+
+
+class MapEntry(NamedTuple):
+    index: int
+    name: str
+    code: str
+    workshop_id: str | None
+    modes: tuple[str, ...]
+
+    @property
+    def command(self) -> str:
+        """RCON command that switches the server to this map."""
+        if self.workshop_id:
+            return f"host_workshop_map {self.workshop_id}"
+        return f"changelevel {self.code}"
+
+
+class Catalog:
+    def __init__(self, maps: list[tuple[str, str]], game_modes: dict[str, str],
+                 mode_maps: dict[str, list[int]], source: str):
+        modes_of: dict[int, tuple[str, ...]] = {}
+        for mode, ids in mode_maps.items():
+            for i in ids:
+                modes_of[i] = modes_of.get(i, ()) + (mode,)
+
+        entries = []
+        for i, (name, code) in enumerate(maps):
+            m = _WORKSHOP_RE.fullmatch(code)
+            entries.append(MapEntry(i, name, code, m.group(1) if m else None, modes_of.get(i, ())))
+
+        self.source = source
+        # Changes whenever map or mode indexes would; stored in callback_data
+        blob = json.dumps([maps, list(game_modes), mode_maps], sort_keys=True).encode()
+        self.tag = int(hashlib.sha256(blob).hexdigest()[:5], 16)
+        self.entries: tuple[MapEntry, ...] = tuple(entries)
+        self.by_name = MappingProxyType({e.name: e for e in entries})
+        self.by_code = MappingProxyType({e.code: e for e in entries})
+        self.by_workshop = MappingProxyType({e.workshop_id: e for e in entries if e.workshop_id})
+        self.game_modes = MappingProxyType(dict(game_modes))
+        self.mode_ids = MappingProxyType({m: tuple(ids) for m, ids in mode_maps.items()})
+
+    def mode_entries(self, mode: str) -> tuple[MapEntry, ...]:
+        return tuple(self.entries[i] for i in self.mode_ids.get(mode, ()))
+
+    def names(self, mode: str | None = None) -> list[str]:
+        if mode and mode in self.mode_ids:
+            return [e.name for e in self.mode_entries(mode)]
+        return [e.name for e in self.entries]
+
+    def code(self, name: str) -> str:
+        entry = self.by_name.get(name)
+        return entry.code if entry else name
+
+
+# ── Build / validation ──────────────────────────────────────────────
+
+def validate(maps: dict[str, str], game_modes: dict[str, str], mode_maps: dict[str, list[str]]) -> list[str]:
+    """Return a list of problems in the map/mode data (empty if valid)."""
+    problems = []
+    seen_ws: dict[str, str] = {}
+    for name, code in maps.items():
+        m = _WORKSHOP_RE.fullmatch(code)
+        if m:
+            if m.group(2) != name:
+                problems.append(f"map {name!r}: workshop code names {m.group(2)!r}")
+            if m.group(1) in seen_ws:
+                problems.append(f"map {name!r}: workshop id {m.group(1)} already used by {seen_ws[m.group(1)]!r}")
+            seen_ws[m.group(1)] = name
+        elif code.startswith("workshop/"):
+            problems.append(f"map {name!r}: malformed workshop code {code!r}")
+        elif not re.fullmatch(r"[\w.-]+", code):
+            problems.append(f"map {name!r}: invalid map code {code!r}")
+    for mode, names in mode_maps.items():
+        if mode not in game_modes:
+            problems.append(f"mode {mode!r}: no entry in GAME_MODES")
+        for name in names:
+            if name not in maps:
+                problems.append(f"mode {mode!r}: unknown map {name!r}")
+        if len(set(names)) != len(names):
+            problems.append(f"mode {mode!r}: duplicate maps")
+    return problems
+
+
+def compile_data(maps: dict[str, str], game_modes: dict[str, str], mode_maps: dict[str, list[str]]) -> dict:
+    index = {name: i for i, name in enumerate(maps)}
+    data = {
+        "version": CATALOG_VERSION,
+        "maps": [[name, code] for name, code in maps.items()],
+        "game_modes": dict(game_modes),
+        "mode_maps": {mode: [index[n] for n in names if n in index] for mode, names in mode_maps.items()},
+    }
+    blob = json.dumps(data, sort_keys=True).encode()
+    data["hash"] = hashlib.sha256(blob).hexdigest()[:16]
+    return data
+
+
+def build(path: str = CATALOG_PATH, maps=None, game_modes=None, mode_maps=None) -> dict:
+    """Validate the map data and write the catalog artifact."""
+    maps = config.MAPS if maps is None else maps
+    game_modes = config.GAME_MODES if game_modes is None else game_modes
+    mode_maps = config.MODE_MAPS if mode_maps is None else mode_maps
+    problems = validate(maps, game_modes, mode_maps)
+    if problems:
+        raise ValueError("Invalid map catalog:\n  " + "\n  ".join(problems))
+    data = compile_data(maps, game_modes, mode_maps)
+    data["config_hash"] = _config_hash()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return data
+
+
+# ── Loading ─────────────────────────────────────────────────────────
+
+_catalog: Catalog | None = None
+
+
+def _from_config() -> Catalog:
+    problems = validate(config.MAPS, config.GAME_MODES, config.MODE_MAPS)
+    for p in problems:
+        logging.warning("Map catalog: %s", p)
+    data = compile_data(config.MAPS, config.GAME_MODES, config.MODE_MAPS)
+    return Catalog(data["maps"], data["game_modes"], data["mode_maps"], "config.py")
+
+
+def _config_hash() -> str:
+    """Hash of config.py's bytes, which every artifact is built on top of.
+
+    Reading the file is much cheaper than compiling its map data; an edit
+    outside the maps only costs one fallback until the next build.
+    """
+    with open(config.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def load(path: str = CATALOG_PATH) -> Catalog:
+    try:
+        with open(path, "rb") as f:
+            data = json.loads(f.read())
+    except FileNotFoundError:
+        return _from_config()
+    except ValueError as e:
+        logging.warning("Map catalog %s is unreadable (%s), using config.py", path, e)
+        return _from_config()
+    if data.get("version") != CATALOG_VERSION:
+        logging.warning("Map catalog %s has version %s, using config.py", path, data.get("version"))
+        return _from_config()
+    if data.get("config_hash") != _config_hash():
+        logging.warning("Map catalog %s was built from an older config.py, using config.py "
+                        "(rebuild with: python catalog.py build)", path)
+        return _from_config()
+    return Catalog(data["maps"], data["game_modes"], data["mode_maps"], os.path.basename(path))
+
+
+def get() -> Catalog:
+    """Return the process-wide catalog, loading it on first use."""
+    global _catalog
+    if _catalog is None:
+        _catalog = load()
+    return _catalog
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        sys.exit("usage: python catalog.py build")
+    try:
+        result = build()
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Wrote {CATALOG_PATH}: {len(result['maps'])} maps, "
+          f"{len(result['mode_maps'])} modes, hash {result['hash']}")
@@ -6,6 +6,45 @@ load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 
+# Number of worker processes; 1 keeps everything in a single event loop
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+
+# UDP log receiver (logaddress_add). LOG_UDP_ADVERTISE is the host:port the
+# game servers should send their logs to; leave LOG_UDP_PORT at 0 to disable.
+# With several workers, worker N listens on LOG_UDP_PORT + N and points the
+# servers it owns at the advertised port + N (LOG_UDP_ADVERTISE is required).
+LOG_UDP_PORT = int(os.getenv("LOG_UDP_PORT", "0"))
+LOG_UDP_ADVERTISE = os.getenv("LOG_UDP_ADVERTISE", "")
+
+# Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics (0 = off).
+# With several workers, worker N listens on METRICS_PORT + 1 + N.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Telegram user ids allowed to use admin commands (/slowlog), comma-separated
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+
+# Token buckets for updates that reach a game server (RCON buttons, map and
+# mode changes, typed RCON/kick/broadcast): requests per minute and burst,
+# per Telegram user and per target server. 0 per minute disables a limit.
+# TRUSTED_IDS (default: ADMIN_IDS) get THROTTLE_TRUSTED_FACTOR times the
+# per-user limit; the per-server limit applies to everyone.
+THROTTLE_USER_PER_MIN = float(os.getenv("THROTTLE_USER_PER_MIN", "20"))
+THROTTLE_USER_BURST = int(os.getenv("THROTTLE_USER_BURST", "5"))
+THROTTLE_SERVER_PER_MIN = float(os.getenv("THROTTLE_SERVER_PER_MIN", "60"))
+THROTTLE_SERVER_BURST = int(os.getenv("THROTTLE_SERVER_BURST", "10"))
+THROTTLE_TRUSTED_FACTOR = float(os.getenv("THROTTLE_TRUSTED_FACTOR", "4"))
+TRUSTED_IDS = {int(x) for x in os.getenv("TRUSTED_IDS", "").replace(" ", "").split(",") if x} or ADMIN_IDS
+
+# Updates slower than this go to the /slowlog list. PROFILE_EVERY=N runs
+# cProfile on every Nth update and writes aggregated stats to PROFILE_PATH.
+SLOW_UPDATE_MS = float(os.getenv("SLOW_UPDATE_MS", "1000"))
+PROFILE_EVERY = int(os.getenv("PROFILE_EVERY", "0"))
+PROFILE_PATH = os.getenv("PROFILE_PATH", "/data/profile.pstats")
+
+# Time zone for /schedule cron expressions and times
+SCHEDULE_TZ = os.getenv("SCHEDULE_TZ", "UTC")
+
 # Maps: display_name -> map code (for changelevel / host_workshop_map)
 MAPS = {
     "1v1aim_map_longdustversion_d": "workshop/3082605693/1v1aim_map_longdustversion_d",
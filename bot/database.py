@@ -1,5 +1,10 @@
+import functools
 import sqlite3
 import os
+import time
+
+import metrics
+import profiling
 
 DB_PATH = os.getenv("DB_PATH", "/data/bot.db")
 
@@ -11,6 +16,23 @@ def _connect():
     return conn
 
 
+def _timed(fn):
+    """Record the call's duration in bot_db_call_seconds{op=<function name>} and the update's db span."""
+    op = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.db_seconds.observe(elapsed, op)
+            profiling.add("db", elapsed)
+    return wrapper
+
+
+@_timed
 def init_db():
     conn = _connect()
     conn.executescript("""
@@ -29,11 +51,86 @@ def init_db():
             created_at      TEXT DEFAULT (datetime('now')),
             FOREIGN KEY (telegram_id) REFERENCES users(telegram_id)
         );
+        CREATE TABLE IF NOT EXISTS map_loads (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            server_id   INTEGER NOT NULL,
+            map_name    TEXT NOT NULL,
+            seconds     REAL NOT NULL,
+            ok          INTEGER NOT NULL,
+            created_at  TEXT DEFAULT (datetime('now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_map_loads_map ON map_loads(map_name);
+        CREATE TABLE IF NOT EXISTS player_sessions (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            server_id   INTEGER NOT NULL,
+            player_key  TEXT NOT NULL,
+            name        TEXT NOT NULL,
+            steamid     TEXT,
+            joined_at   REAL NOT NULL,
+            left_at     REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_player_sessions_left ON player_sessions(server_id, left_at);
+        CREATE INDEX IF NOT EXISTS idx_player_sessions_key ON player_sessions(server_id, player_key);
+        CREATE TABLE IF NOT EXISTS schedules (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER NOT NULL,
+            server_id   INTEGER,
+            action      TEXT NOT NULL,
+            payload     TEXT NOT NULL DEFAULT '{}',
+            cron        TEXT,
+            next_run    REAL,
+            last_run    REAL,
+            last_result TEXT,
+            enabled     INTEGER NOT NULL DEFAULT 1,
+            created_at  TEXT DEFAULT (datetime('now')),
+            FOREIGN KEY (server_id) REFERENCES servers(id) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS idx_schedules_next ON schedules(enabled, next_run);
+        CREATE TABLE IF NOT EXISTS players_online (
+            server_id   INTEGER NOT NULL,
+            player_key  TEXT NOT NULL,
+            name        TEXT NOT NULL,
+            steamid     TEXT,
+            userid      INTEGER,
+            joined_at   REAL NOT NULL,
+            PRIMARY KEY (server_id, player_key)
+        );
+        CREATE TABLE IF NOT EXISTS alert_rules (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER NOT NULL,
+            server_id   INTEGER NOT NULL,
+            kind        TEXT NOT NULL,
+            op          TEXT NOT NULL DEFAULT '',
+            value       INTEGER NOT NULL DEFAULT 0,
+            hold        INTEGER NOT NULL DEFAULT 0,
+            last_fired  REAL,
+            created_at  TEXT DEFAULT (datetime('now')),
+            FOREIGN KEY (server_id) REFERENCES servers(id) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS idx_alert_rules_user ON alert_rules(telegram_id);
+        CREATE TABLE IF NOT EXISTS rcon_rtt (
+            host        TEXT NOT NULL,
+            port        INTEGER NOT NULL,
+            srtt        REAL NOT NULL,
+            rttvar      REAL NOT NULL,
+            samples     INTEGER NOT NULL,
+            updated_at  REAL NOT NULL,
+            PRIMARY KEY (host, port)
+        );
     """)
+    _ensure_column(conn, "servers", "log_secret", "TEXT")
     conn.commit()
     conn.close()
 
 
+def _ensure_column(conn, table: str, column: str, decl: str):
+    """Add a column to an existing table (databases created by older versions)."""
+    cols = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+@_timed
 def ensure_user(telegram_id: int, username: str | None = None):
     conn = _connect()
     conn.execute(
@@ -49,6 +146,7 @@ def ensure_user(telegram_id: int, username: str | None = None):
     conn.close()
 
 
+@_timed
 def add_server(telegram_id: int, name: str, host: str, port: int, rcon_password: str) -> int:
     conn = _connect()
     cur = conn.execute(
@@ -61,6 +159,20 @@ def add_server(telegram_id: int, name: str, host: str, port: int, rcon_password:
     return server_id
 
 
+@_timed
+def add_servers(telegram_id: int, servers: list[dict]) -> int:
+    """Insert many servers in one transaction; returns how many were added."""
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO servers (telegram_id, name, host, port, rcon_password) VALUES (?, ?, ?, ?, ?)",
+            [(telegram_id, s["name"], s["host"], s["port"], s["rcon_password"]) for s in servers],
+        )
+    conn.close()
+    return len(servers)
+
+
+@_timed
 def get_user_servers(telegram_id: int) -> list[dict]:
     conn = _connect()
     rows = conn.execute(
@@ -70,6 +182,7 @@ def get_user_servers(telegram_id: int) -> list[dict]:
     return [dict(r) for r in rows]
 
 
+@_timed
 def get_server(server_id: int, telegram_id: int) -> dict | None:
     conn = _connect()
     row = conn.execute(
@@ -80,16 +193,22 @@ def get_server(server_id: int, telegram_id: int) -> dict | None:
     return dict(row) if row else None
 
 
+@_timed
 def delete_server(server_id: int, telegram_id: int):
     conn = _connect()
-    conn.execute(
-        "DELETE FROM servers WHERE id = ? AND telegram_id = ?",
-        (server_id, telegram_id),
-    )
-    conn.commit()
+    with conn:
+        cur = conn.execute(
+            "DELETE FROM servers WHERE id = ? AND telegram_id = ?",
+            (server_id, telegram_id),
+        )
+        if cur.rowcount:
+            # schedules and alert_rules cascade; these tables have no foreign key
+            for table in ("player_sessions", "players_online", "map_loads"):
+                conn.execute(f"DELETE FROM {table} WHERE server_id = ?", (server_id,))
     conn.close()
 
 
+@_timed
 def update_server(server_id: int, telegram_id: int, **kwargs):
     allowed = {"name", "host", "port", "rcon_password"}
     fields = {k: v for k, v in kwargs.items() if k in allowed}
@@ -103,3 +222,317 @@ def update_server(server_id: int, telegram_id: int, **kwargs):
     )
     conn.commit()
     conn.close()
+
+
+@_timed
+def get_all_servers() -> list[dict]:
+    conn = _connect()
+    rows = conn.execute("SELECT * FROM servers ORDER BY id").fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@_timed
+def set_log_secret(server_id: int, secret: str):
+    conn = _connect()
+    conn.execute("UPDATE servers SET log_secret = ? WHERE id = ?", (secret, server_id))
+    conn.commit()
+    conn.close()
+
+
+@_timed
+def record_map_load(server_id: int, map_name: str, seconds: float, ok: bool):
+    conn = _connect()
+    conn.execute(
+        "INSERT INTO map_loads (server_id, map_name, seconds, ok) VALUES (?, ?, ?, ?)",
+        (server_id, map_name, seconds, int(ok)),
+    )
+    conn.commit()
+    conn.close()
+
+
+@_timed
+def map_load_stats(telegram_id: int, limit: int = 15) -> list[dict]:
+    """Per-map load times on the user's servers, slowest average first."""
+    conn = _connect()
+    rows = conn.execute(
+        """
+        SELECT l.map_name,
+               COUNT(*)                  AS loads,
+               SUM(l.ok = 0)             AS failures,
+               AVG(CASE WHEN l.ok THEN l.seconds END) AS avg_seconds,
+               MAX(CASE WHEN l.ok THEN l.seconds END) AS max_seconds
+        FROM map_loads l JOIN servers s ON s.id = l.server_id
+        WHERE s.telegram_id = ?
+        GROUP BY l.map_name
+        ORDER BY avg_seconds DESC
+        LIMIT ?
+        """,
+        (telegram_id, limit),
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+# ── Player sessions ─────────────────────────────────────────────────
+
+@_timed
+def append_player_sessions(sessions: list[tuple], online: dict[int, list[tuple]],
+                           observed: dict[int, list[tuple]] | None = None):
+    """Append closed sessions and replace the online snapshot of the given servers.
+
+    sessions: (server_id, player_key, name, steamid, joined_at, left_at)
+    online:   server_id -> [(player_key, name, steamid, userid, joined_at)]
+    observed: like online, from a worker that does not own the server; players
+              already listed keep their join time
+    Rows of servers deleted in the meantime are dropped.
+    """
+    conn = _connect()
+    with conn:
+        live = {r[0] for r in conn.execute("SELECT id FROM servers")}
+        conn.executemany(
+            "INSERT INTO player_sessions (server_id, player_key, name, steamid, joined_at, left_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [s for s in sessions if s[0] in live],
+        )
+        for server_id, rows in (observed or {}).items():
+            if server_id not in live:
+                continue
+            joined = dict(conn.execute(
+                "SELECT player_key, joined_at FROM players_online WHERE server_id = ?", (server_id,)
+            ).fetchall())
+            online = {**online, server_id: [(*row[:4], joined.get(row[0], row[4])) for row in rows]}
+        for server_id, rows in online.items():
+            if server_id not in live:
+                continue
+            conn.execute("DELETE FROM players_online WHERE server_id = ?", (server_id,))
+            conn.executemany(
+                "INSERT INTO players_online (server_id, player_key, name, steamid, userid, joined_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(server_id, *row) for row in rows],
+            )
+    conn.close()
+
+
+@_timed
+def get_players_online(server_id: int) -> list[dict]:
+    conn = _connect()
+    rows = conn.execute(
+        "SELECT * FROM players_online WHERE server_id = ? ORDER BY joined_at", (server_id,)
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@_timed
+def recent_players(server_id: int, limit: int = 15) -> list[dict]:
+    """Players by last time seen leaving, most recent first."""
+    conn = _connect()
+    rows = conn.execute(
+        """
+        SELECT player_key, name, steamid, MAX(left_at) AS last_seen
+        FROM (SELECT * FROM player_sessions WHERE server_id = ?
+              ORDER BY left_at DESC LIMIT ?)
+        GROUP BY player_key
+        ORDER BY last_seen DESC
+        """,
+        (server_id, limit * 10),
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows[:limit]]
+
+
+@_timed
+def top_players(server_id: int, limit: int = 15) -> list[dict]:
+    """Players by total playtime on a server, longest first."""
+    conn = _connect()
+    rows = conn.execute(
+        """
+        SELECT player_key,
+               (SELECT name FROM player_sessions p WHERE p.server_id = s.server_id
+                AND p.player_key = s.player_key ORDER BY left_at DESC LIMIT 1) AS name,
+               MAX(steamid)              AS steamid,
+               COUNT(*)                  AS sessions,
+               SUM(left_at - joined_at)  AS seconds
+        FROM player_sessions s
+        WHERE server_id = ?
+        GROUP BY player_key
+        ORDER BY seconds DESC
+        LIMIT ?
+        """,
+        (server_id, limit),
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+# ── Schedules ───────────────────────────────────────────────────────
+
+@_timed
+def add_schedule(telegram_id: int, server_id: int | None, action: str, payload: str,
+                 cron: str | None, next_run: float) -> int:
+    conn = _connect()
+    cur = conn.execute(
+        "INSERT INTO schedules (telegram_id, server_id, action, payload, cron, next_run) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (telegram_id, server_id, action, payload, cron, next_run),
+    )
+    schedule_id = cur.lastrowid
+    conn.commit()
+    conn.close()
+    return schedule_id
+
+
+@_timed
+def get_user_schedules(telegram_id: int) -> list[dict]:
+    conn = _connect()
+    rows = conn.execute(
+        """
+        SELECT sc.*, s.name AS server_name
+        FROM schedules sc LEFT JOIN servers s ON s.id = sc.server_id
+        WHERE sc.telegram_id = ?
+        ORDER BY sc.enabled DESC, sc.next_run
+        """,
+        (telegram_id,),
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@_timed
+def get_schedule(schedule_id: int) -> dict | None:
+    conn = _connect()
+    row = conn.execute("SELECT * FROM schedules WHERE id = ?", (schedule_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+@_timed
+def get_enabled_schedules() -> list[dict]:
+    conn = _connect()
+    rows = conn.execute(
+        "SELECT id, server_id, next_run FROM schedules WHERE enabled = 1 AND next_run IS NOT NULL"
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@_timed
+def delete_schedule(schedule_id: int, telegram_id: int) -> bool:
+    conn = _connect()
+    cur = conn.execute(
+        "DELETE FROM schedules WHERE id = ? AND telegram_id = ?", (schedule_id, telegram_id)
+    )
+    conn.commit()
+    conn.close()
+    return cur.rowcount > 0
+
+
+@_timed
+def claim_schedule(schedule_id: int, due: float, next_run: float | None, now: float) -> bool:
+    """Move a schedule past the run due at `due`; False if someone else already did."""
+    conn = _connect()
+    cur = conn.execute(
+        """
+        UPDATE schedules
+        SET next_run = ?, last_run = ?, enabled = CASE WHEN ? IS NULL THEN 0 ELSE enabled END
+        WHERE id = ? AND enabled = 1 AND next_run = ?
+        """,
+        (next_run, now, next_run, schedule_id, due),
+    )
+    conn.commit()
+    conn.close()
+    return cur.rowcount == 1
+
+
+@_timed
+def finish_schedule(schedule_id: int, result: str, payload: str | None):
+    conn = _connect()
+    if payload is None:
+        conn.execute("UPDATE schedules SET last_result = ? WHERE id = ?", (result[:500], schedule_id))
+    else:
+        conn.execute(
+            "UPDATE schedules SET last_result = ?, payload = ? WHERE id = ?",
+            (result[:500], payload, schedule_id),
+        )
+    conn.commit()
+    conn.close()
+
+
+# ── Alert rules ─────────────────────────────────────────────────────
+
+_ALERT_SELECT = """
+    SELECT a.*, s.name AS server_name, s.host, s.port
+    FROM alert_rules a JOIN servers s ON s.id = a.server_id
+"""
+
+
+@_timed
+def add_alert_rule(telegram_id: int, server_id: int, kind: str, op: str, value: int, hold: int) -> dict:
+    conn = _connect()
+    cur = conn.execute(
+        "INSERT INTO alert_rules (telegram_id, server_id, kind, op, value, hold) VALUES (?, ?, ?, ?, ?, ?)",
+        (telegram_id, server_id, kind, op, value, hold),
+    )
+    conn.commit()
+    row = conn.execute(_ALERT_SELECT + "WHERE a.id = ?", (cur.lastrowid,)).fetchone()
+    conn.close()
+    return dict(row)
+
+
+@_timed
+def get_alert_rules() -> list[dict]:
+    conn = _connect()
+    rows = conn.execute(_ALERT_SELECT).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@_timed
+def get_user_alert_rules(telegram_id: int) -> list[dict]:
+    conn = _connect()
+    rows = conn.execute(_ALERT_SELECT + "WHERE a.telegram_id = ? ORDER BY a.id", (telegram_id,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@_timed
+def delete_alert_rule(rule_id: int, telegram_id: int) -> bool:
+    conn = _connect()
+    cur = conn.execute("DELETE FROM alert_rules WHERE id = ? AND telegram_id = ?", (rule_id, telegram_id))
+    conn.commit()
+    conn.close()
+    return cur.rowcount > 0
+
+
+@_timed
+def mark_alerts_fired(rule_ids: list[int], ts: float):
+    conn = _connect()
+    with conn:
+        conn.executemany("UPDATE alert_rules SET last_fired = ? WHERE id = ?", [(ts, i) for i in rule_ids])
+    conn.close()
+
+
+# ── RCON round-trip estimates ───────────────────────────────────────
+
+@_timed
+def get_rcon_rtt() -> list[dict]:
+    conn = _connect()
+    rows = conn.execute("SELECT host, port, srtt, rttvar, samples FROM rcon_rtt").fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@_timed
+def save_rcon_rtt(rows: list[tuple]):
+    """Upsert (host, port, srtt, rttvar, samples) rows."""
+    now = time.time()
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO rcon_rtt (host, port, srtt, rttvar, samples, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (host, port) DO UPDATE SET srtt = excluded.srtt, rttvar = excluded.rttvar, "
+            "samples = excluded.samples, updated_at = excluded.updated_at",
+            [(*row, now) for row in rows],
+        )
+    conn.close()
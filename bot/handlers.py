@@ -1,14 +1,32 @@
 from aiogram import Router, F, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-import re
+from datetime import datetime
+import asyncio
 import html
-
-import config
+import json
+import os
+import tempfile
+import time
+
+import a2s
+import alerts
+import callbacks as cbk
+import catalog
 import database as db
+import map_search
+import map_tracker
+import player_index
+import prefetch
+import profiling
+import scheduler
+import server_io
 import rcon_client as rcon
+import status_parser
+import throttle
 import keyboards as kb
+from config import ADMIN_IDS
 
 router = Router()
 
@@ -25,6 +43,8 @@ class WaitInput(StatesGroup):
     broadcast = State()
     kick = State()
     rcon_cmd = State()
+    map_search = State()
+    import_file = State()
 
 
 # ── Helpers ─────────────────────────────────────────────────────────
@@ -42,6 +62,99 @@ def _rcon(server: dict, command: str) -> str:
         return f"Error: {e}"
 
 
+def _status(server: dict) -> dict:
+    """Parsed server status (plugin JSON when available, else console `status`)."""
+    return status_parser.collect(server["host"], server["port"], lambda c: rcon.execute(*_srv(server), c))
+
+
+LIST_A2S_TIMEOUT = 0.8    # the server list waits at most this long for query replies
+
+
+async def _servers_markup(servers: list[dict]):
+    """Server list keyboard with up/down and player counts from A2S (no RCON)."""
+    found = await a2s.info_many([(s["host"], s["port"]) for s in servers], timeout=LIST_A2S_TIMEOUT)
+    return kb.servers_list(servers, {s["id"]: found.get((s["host"], s["port"])) for s in servers})
+
+
+STALE_BUTTON = "This menu is out of date, please open it again."
+
+
+# Long RCON output: sent as <code> messages while it arrives, switched to a
+# .txt upload once it passes DOC_THRESHOLD. At most DOC_THRESHOLD bytes are
+# held in memory; anything past that is spooled to a temp file.
+MSG_CHUNK = 3500          # raw chars per message, leaves room for HTML escaping
+MSG_LIMIT = 4000          # escaped chars per message (Telegram caps at 4096)
+DOC_THRESHOLD = 12 * 1024
+
+
+def _take_chunk(buf: str) -> tuple[str, str]:
+    """Split one message-sized chunk off buf, preferring a line boundary."""
+    piece = buf[:MSG_CHUNK]
+    if len(buf) > MSG_CHUNK:
+        nl = piece.rfind("\n")
+        if nl > MSG_CHUNK // 2:
+            piece = piece[:nl + 1]
+    while (escaped := len(html.escape(piece))) > MSG_LIMIT:
+        piece = piece[:len(piece) * MSG_LIMIT // escaped - 1]
+    return piece, buf[len(piece):]
+
+
+async def _send_rcon_output(message: types.Message, server: dict, command: str):
+    buf = ""
+    kept: list[bytes] = []
+    kept_size = 0
+    spool = None
+    sent = 0
+    # The stream is a blocking socket reader: pull each chunk in a thread so a
+    # slow server does not hold up the dispatcher for everyone else
+    stream = rcon.execute_stream(*_srv(server), command)
+    try:
+        while (text := await asyncio.to_thread(next, stream, None)) is not None:
+            data = text.encode("utf-8")
+            if spool:
+                spool.write(data)
+                continue
+            kept.append(data)
+            kept_size += len(data)
+            if kept_size > DOC_THRESHOLD:
+                spool = tempfile.NamedTemporaryFile(prefix="rcon_", suffix=".txt", delete=False)
+                spool.writelines(kept)
+                kept.clear()
+                buf = ""
+                await message.answer("Output is large, sending as a file...")
+                continue
+            buf += text
+            while len(buf) > MSG_CHUNK:
+                piece, buf = _take_chunk(buf)
+                await message.answer(f"<code>{html.escape(piece)}</code>", parse_mode="HTML")
+                sent += 1
+    except Exception as e:
+        if spool:
+            spool.write(f"\nError: {e}\n".encode("utf-8"))
+        else:
+            buf += f"\nError: {e}" if sent or buf.strip() else f"Error: {e}"
+
+    if spool:
+        spool.close()
+        try:
+            await message.answer_document(
+                types.FSInputFile(spool.name, filename=f"{command.split()[0]}.txt"),
+                caption=f"<code>{html.escape(command[:200])}</code>",
+                parse_mode="HTML",
+            )
+        finally:
+            os.unlink(spool.name)
+        return
+
+    buf = buf.strip() if not sent else buf.rstrip()
+    if not buf and not sent:
+        buf = "(empty response)"
+    while buf:
+        piece, buf = _take_chunk(buf)
+        if piece.strip():
+            await message.answer(f"<code>{html.escape(piece)}</code>", parse_mode="HTML")
+
+
 # ── /start ──────────────────────────────────────────────────────────
 
 @router.message(Command("start"))
@@ -52,7 +165,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
 
     servers = db.get_user_servers(uid)
     if servers:
-        await message.answer("Your servers:", reply_markup=kb.servers_list(servers))
+        await message.answer("Your servers:", reply_markup=await _servers_markup(servers))
     else:
         await message.answer(
             "You have no servers yet. Add one to get started!",
@@ -68,7 +181,7 @@ async def cmd_menu(message: types.Message, state: FSMContext):
     db.ensure_user(uid, message.from_user.username)
     servers = db.get_user_servers(uid)
     if servers:
-        await message.answer("Your servers:", reply_markup=kb.servers_list(servers))
+        await message.answer("Your servers:", reply_markup=await _servers_markup(servers))
     else:
         await message.answer("No servers yet.", reply_markup=kb.no_servers())
 
@@ -141,6 +254,99 @@ async def on_server_password(message: types.Message, state: FSMContext):
     )
 
 
+# ── Bulk import / export ────────────────────────────────────────────
+
+IMPORT_PROMPT = (
+    "Send a CSV or JSON file with your servers.\n"
+    "CSV header: <code>name,host,port,rcon_password</code>\n"
+    "JSON: <code>[{\"name\": ..., \"host\": ..., \"port\": 27015, \"rcon_password\": ...}]</code>"
+)
+
+
+@router.message(Command("import"))
+async def cmd_import(message: types.Message, state: FSMContext):
+    await state.set_state(WaitInput.import_file)
+    await message.answer(IMPORT_PROMPT, parse_mode="HTML", reply_markup=kb.cancel_keyboard())
+
+
+@router.callback_query(F.data == "import_servers")
+async def cb_import(cb: types.CallbackQuery, state: FSMContext):
+    await state.set_state(WaitInput.import_file)
+    await cb.message.answer(IMPORT_PROMPT, parse_mode="HTML", reply_markup=kb.cancel_keyboard())
+    await cb.answer()
+
+
+@router.message(WaitInput.import_file, F.document)
+async def on_import_file(message: types.Message, state: FSMContext):
+    doc = message.document
+    if doc.file_size and doc.file_size > server_io.MAX_FILE_SIZE:
+        return await message.answer("File is too large.", reply_markup=kb.cancel_keyboard())
+    buf = await message.bot.download(doc)
+    try:
+        rows = server_io.parse(buf.read(), doc.file_name or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        return await message.answer(f"Could not read the file: {e}", reply_markup=kb.cancel_keyboard())
+    if not rows:
+        return await message.answer("The file has no servers.", reply_markup=kb.cancel_keyboard())
+
+    uid = message.from_user.id
+    for row in rows:
+        server_io.normalize(row)
+    server_io.mark_duplicates(rows, db.get_user_servers(uid))
+    checks = sum("error" not in r for r in rows)
+    if throttle.current and checks:
+        # One RCON login per row, all charged to the user
+        wait, scope = throttle.current.admit(uid, None, cost=checks)
+        if wait:
+            return await message.answer(throttle.slow_down(wait, scope), reply_markup=kb.cancel_keyboard())
+    await state.clear()
+    db.ensure_user(uid, message.from_user.username)
+    await message.answer(f"Checking {checks} server(s)...")
+    await server_io.check_all(rows)
+
+    good = [r for r in rows if "error" not in r]
+    if good:
+        db.add_servers(uid, good)
+    lines = [f"<b>Imported {len(good)} of {len(rows)}</b>"]
+    lines += [html.escape(line) for line in server_io.report(rows)]
+    piece = ""
+    for line in lines:
+        if len(piece) + len(line) > MSG_LIMIT:
+            await message.answer(piece, parse_mode="HTML")
+            piece = ""
+        piece += line + "\n"
+    servers = db.get_user_servers(uid)
+    await message.answer(piece, parse_mode="HTML",
+                         reply_markup=await _servers_markup(servers) if servers else kb.no_servers())
+
+
+@router.message(WaitInput.import_file)
+async def on_import_not_file(message: types.Message):
+    await message.answer("Please send the servers as a .csv or .json file.", reply_markup=kb.cancel_keyboard())
+
+
+@router.message(Command("export"))
+async def cmd_export(message: types.Message, command: CommandObject):
+    fmt = "json" if (command.args or "").strip().lower() == "json" else "csv"
+    await _send_export(message, message.from_user.id, fmt)
+
+
+@router.callback_query(F.data == "export_servers")
+async def cb_export(cb: types.CallbackQuery):
+    await _send_export(cb.message, cb.from_user.id, "csv")
+    await cb.answer()
+
+
+async def _send_export(message: types.Message, uid: int, fmt: str):
+    servers = db.get_user_servers(uid)
+    if not servers:
+        return await message.answer("No servers to export.")
+    await message.answer_document(
+        types.BufferedInputFile(server_io.export(servers, fmt), filename=f"servers.{fmt}"),
+        caption=f"{len(servers)} server(s). The file contains RCON passwords, keep it private.",
+    )
+
+
 # ── Cancel input ────────────────────────────────────────────────────
 
 @router.callback_query(F.data == "cancel_input")
@@ -150,7 +356,7 @@ async def cb_cancel_input(cb: types.CallbackQuery, state: FSMContext):
     uid = cb.from_user.id
     servers = db.get_user_servers(uid)
     if servers:
-        await cb.message.answer("Your servers:", reply_markup=kb.servers_list(servers))
+        await cb.message.answer("Your servers:", reply_markup=await _servers_markup(servers))
     await cb.answer()
 
 
@@ -168,7 +374,7 @@ async def cb_back_servers(cb: types.CallbackQuery, state: FSMContext):
     uid = cb.from_user.id
     servers = db.get_user_servers(uid)
     if servers:
-        await cb.message.edit_text("Your servers:", reply_markup=kb.servers_list(servers))
+        await cb.message.edit_text("Your servers:", reply_markup=await _servers_markup(servers))
     else:
         await cb.message.edit_text("No servers yet.", reply_markup=kb.no_servers())
     await cb.answer()
@@ -176,29 +382,51 @@ async def cb_back_servers(cb: types.CallbackQuery, state: FSMContext):
 
 # ── Select server → panel ───────────────────────────────────────────
 
-@router.callback_query(F.data.startswith("srv:"))
-async def cb_select_server(cb: types.CallbackQuery, state: FSMContext):
+@router.callback_query(cbk.Op(cbk.PANEL))
+async def cb_select_server(cb: types.CallbackQuery, state: FSMContext, cbd: cbk.Callback):
     await state.clear()
-    server_id = int(cb.data.split(":")[1])
+    server_id = cbd.server_id
     server = db.get_server(server_id, cb.from_user.id)
     if not server:
         await cb.answer("Server not found", show_alert=True)
         return
-    text = f"<b>{html.escape(server['name'])}</b>\n{server['host']}:{server['port']}"
+    text = _panel_text(server)
     try:
-        await cb.message.edit_text(text, parse_mode="HTML", reply_markup=kb.server_panel(server_id))
+        panel = await cb.message.edit_text(text, parse_mode="HTML", reply_markup=kb.server_panel(server_id))
     except Exception:
-        await cb.message.answer(text, parse_mode="HTML", reply_markup=kb.server_panel(server_id))
+        panel = await cb.message.answer(text, parse_mode="HTML", reply_markup=kb.server_panel(server_id))
+    if not isinstance(panel, types.Message):
+        panel = cb.message
     await cb.answer()
 
+    async def show(info: dict):
+        player_index.observe_status(server_id, info["entries"])
+        await panel.edit_text(_panel_text(server, info), parse_mode="HTML", reply_markup=kb.server_panel(server_id))
+
+    # The prefetch is what reaches the server, so it is what gets charged; over
+    # the limit the panel just stays without the status lines
+    if throttle.current and not prefetch.reusable(cb.from_user.id, server_id):
+        wait, _ = throttle.current.admit(cb.from_user.id, server_id)
+        if wait:
+            return
+    prefetch.start(cb.from_user.id, server_id, lambda: _status(server), show)
 
-# ── Server actions (s:{id}:{action}) ───────────────────────────────
 
-@router.callback_query(F.data.regexp(r"^s:\d+:\w"))
-async def cb_server_action(cb: types.CallbackQuery, state: FSMContext):
-    parts = cb.data.split(":")
-    server_id = int(parts[1])
-    action = parts[2]
+def _panel_text(server: dict, info: dict | None = None) -> str:
+    text = f"<b>{html.escape(server['name'])}</b>\n{server['host']}:{server['port']}"
+    if info:
+        text += f"\n\nMap: <b>{html.escape(info['map'])}</b>\nPlayers: <b>{info['player_count']}</b>"
+        if info["scores"]:
+            text += f"\nScore: T <b>{info['scores'].get('T', 0)}</b> : <b>{info['scores'].get('CT', 0)}</b> CT"
+    return text
+
+
+# ── Server actions (panel buttons) ─────────────────────────────────
+
+@router.callback_query(cbk.Op(cbk.ACTION))
+async def cb_server_action(cb: types.CallbackQuery, state: FSMContext, cbd: cbk.Callback):
+    server_id = cbd.server_id
+    action = cbd.action
     server = db.get_server(server_id, cb.from_user.id)
     if not server:
         await cb.answer("Server not found", show_alert=True)
@@ -207,34 +435,25 @@ async def cb_server_action(cb: types.CallbackQuery, state: FSMContext):
     # ── Status ──
     if action == "status":
         await cb.answer("Fetching...")
-        raw = _rcon(server, "status")
-        if raw.startswith("Error"):
-            await cb.message.answer(f"Error:\n<code>{html.escape(raw)}</code>", parse_mode="HTML")
+        try:
+            info = await prefetch.take(cb.from_user.id, server_id) or _status(server)
+        except Exception as e:
+            await cb.message.answer(f"Error:\n<code>{html.escape(f'Error: {e}')}</code>", parse_mode="HTML")
             return
 
-        hostname = "Unknown"
-        m = re.search(r"hostname\s*:\s*(.*)", raw)
-        if m:
-            hostname = m.group(1).strip()
-
-        map_name = "Unknown"
-        m = re.search(r"map\s*:\s*(\S+)", raw)
-        if m:
-            map_name = m.group(1)
-
-        players_m = re.search(r"players\s*:\s*(\d+)\s+humans", raw)
-        player_count = players_m.group(1) if players_m else "?"
-
-        player_names = []
-        for pm in re.finditer(r"^\s*\d+\s+(\S+).*\s+'([^']+)'", raw, re.MULTILINE):
-            if pm.group(1) != "BOT":
-                player_names.append(pm.group(2))
+        player_index.observe_status(server_id, info["entries"])
+        hostname = info["hostname"]
+        map_name = info["map"]
+        player_count = info["player_count"]
+        player_names = info["players"]
 
         msg = (
             f"<b>{html.escape(hostname)}</b>\n"
             f"Map: <b>{html.escape(map_name)}</b>\n"
             f"Players: <b>{player_count}</b>\n"
         )
+        if info["scores"]:
+            msg += f"Score: T <b>{info['scores'].get('T', 0)}</b> : <b>{info['scores'].get('CT', 0)}</b> CT\n"
         if player_names:
             msg += "\n".join(f"- {html.escape(n)}" for n in player_names)
         else:
@@ -248,6 +467,12 @@ async def cb_server_action(cb: types.CallbackQuery, state: FSMContext):
         await cb.message.answer("Choose a map:", reply_markup=kb.maps_keyboard(server_id, None, 0))
         await cb.answer()
 
+    elif action == "msearch":
+        await state.set_state(WaitInput.map_search)
+        await state.update_data(server_id=server_id)
+        await cb.message.answer("Enter part of a map name (e.g. utopia, surf uto):", reply_markup=kb.cancel_keyboard())
+        await cb.answer()
+
     # ── Modes ──
     elif action == "modes":
         await cb.message.answer("Choose a mode:", reply_markup=kb.modes_keyboard(server_id))
@@ -294,7 +519,13 @@ async def cb_server_action(cb: types.CallbackQuery, state: FSMContext):
         await cb.answer()
 
     # ── Kick player ──
-    elif action == "kick":
+    elif action in ("kick", "kickname"):
+        # Connected players come from the player index, no RCON round trip
+        players = [p for p in player_index.online(server_id) if p.get("userid") is not None]
+        if action == "kick" and players:
+            await cb.message.answer("Choose a player to kick:", reply_markup=kb.kick_keyboard(server_id, players))
+            await cb.answer()
+            return
         await state.set_state(WaitInput.kick)
         await state.update_data(server_id=server_id)
         await cb.message.answer("Enter player name to kick:", reply_markup=kb.cancel_keyboard())
@@ -319,73 +550,356 @@ async def cb_server_action(cb: types.CallbackQuery, state: FSMContext):
 
 # ── Delete confirm ──────────────────────────────────────────────────
 
-@router.callback_query(F.data.startswith("del_yes:"))
-async def cb_del_yes(cb: types.CallbackQuery):
-    server_id = int(cb.data.split(":")[1])
+@router.callback_query(cbk.Op(cbk.DELETE))
+async def cb_del_yes(cb: types.CallbackQuery, cbd: cbk.Callback):
+    server_id = cbd.server_id
     db.delete_server(server_id, cb.from_user.id)
     await cb.answer("Deleted")
     servers = db.get_user_servers(cb.from_user.id)
     if servers:
-        await cb.message.edit_text("Your servers:", reply_markup=kb.servers_list(servers))
+        await cb.message.edit_text("Your servers:", reply_markup=await _servers_markup(servers))
     else:
         await cb.message.edit_text("No servers yet.", reply_markup=kb.no_servers())
 
 
+# ── Kick from player keyboard ───────────────────────────────────────
+
+@router.callback_query(cbk.Op(cbk.KICK))
+async def cb_kick_player(cb: types.CallbackQuery, cbd: cbk.Callback):
+    server_id = cbd.server_id
+    userid = cbd.arg
+    server = db.get_server(server_id, cb.from_user.id)
+    if not server:
+        await cb.answer("Server not found", show_alert=True)
+        return
+    name = next((p["name"] for p in player_index.online(server_id) if p.get("userid") == userid), f"#{userid}")
+    result = _rcon(server, f"kickid {userid}")
+    if result.startswith("Error"):
+        await cb.message.answer(f"Failed: {result}")
+    else:
+        player_index.leave(server_id, name, userid=userid)
+        await cb.message.answer(f"Kicked {name}")
+    await cb.answer()
+
+
+@router.message(Command("players"))
+async def cmd_players(message: types.Message):
+    servers = db.get_user_servers(message.from_user.id)
+    if not servers:
+        return await message.answer("No servers yet.")
+    lines = []
+    for server in servers:
+        online = player_index.online(server["id"])
+        top = db.top_players(server["id"], 10)
+        recent = db.recent_players(server["id"], 10)
+        lines.append(f"<b>{html.escape(server['name'])}</b>")
+        lines.append("Online: " + (", ".join(html.escape(p["name"]) for p in online) or "nobody"))
+        if top:
+            lines.append("Top playtime:")
+            lines += [f"  {html.escape(p['name'])}: {_duration(p['seconds'])}, {p['sessions']} session(s)"
+                      for p in top]
+        if recent:
+            lines.append("Recently left: " + ", ".join(html.escape(p["name"]) for p in recent))
+        lines.append("")
+    await message.answer("\n".join(lines).strip(), parse_mode="HTML")
+
+
+def _duration(seconds: float) -> str:
+    minutes = int(seconds // 60)
+    return f"{minutes // 60}h {minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m"
+
+
 # ── Map change callback ────────────────────────────────────────────
 
-@router.callback_query(F.data.startswith("map:"))
-async def cb_change_map(cb: types.CallbackQuery):
-    parts = cb.data.split(":", 2)
-    server_id = int(parts[1])
-    map_code = parts[2]
+@router.callback_query(cbk.Op(cbk.MAP))
+async def cb_change_map(cb: types.CallbackQuery, cbd: cbk.Callback):
+    server_id = cbd.server_id
+    entry = cbd.map_entry
+    if cbd.stale or not entry:
+        await cb.answer(STALE_BUTTON, show_alert=True)
+        return
 
     server = db.get_server(server_id, cb.from_user.id)
     if not server:
         await cb.answer("Server not found", show_alert=True)
         return
 
-    if map_code.startswith("workshop/"):
-        workshop_id = map_code.split("/")[1]
-        result = _rcon(server, f"host_workshop_map {workshop_id}")
-    else:
-        result = _rcon(server, f"changelevel {map_code}")
+    result = _rcon(server, entry.command)
 
     if result.startswith("Error"):
-        await cb.message.answer(f"Failed: {result}")
+        if cb.message:
+            await cb.message.answer(f"Failed: {result}")
+            await cb.answer()
+        else:
+            await cb.answer(f"Failed: {result}", show_alert=True)
+        return
+
+    map_name = entry.name
+    workshop = entry.workshop_id is not None
+    text = f"Changing map to {map_name}..."
+    if cb.message:
+        status_msg = await cb.message.answer(text)
+        report = status_msg.edit_text
+        await cb.answer()
     else:
-        await cb.message.answer(f"Map changed to {map_code}")
-    await cb.answer()
+        # Button on an inline-query result: edit that inline message instead
+        inline_id = cb.inline_message_id
+        async def report(t):
+            await cb.bot.edit_message_text(t, inline_message_id=inline_id)
+        await cb.answer(text)
+    map_tracker.track(server, map_name, workshop, report)
+
+
+@router.message(Command("maploads"))
+async def cmd_maploads(message: types.Message):
+    stats = db.map_load_stats(message.from_user.id)
+    if not stats:
+        return await message.answer("No map loads recorded yet.")
+    lines = ["<b>Map load times</b> (avg / max, slowest first)"]
+    for st in stats:
+        avg = f"{st['avg_seconds']:.1f}s" if st["avg_seconds"] is not None else "-"
+        mx = f"{st['max_seconds']:.1f}s" if st["max_seconds"] is not None else "-"
+        line = f"{html.escape(st['map_name'])}: {avg} / {mx}, {st['loads']} load(s)"
+        if st["failures"]:
+            line += f", {st['failures']} failed"
+        lines.append(line)
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@router.message(Command("slowlog"))
+async def cmd_slowlog(message: types.Message, command: CommandObject):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    limit = int(command.args) if command.args and command.args.isdigit() else 15
+    entries = list(profiling.slow_log)[-limit:]
+    if not entries:
+        return await message.answer("No slow updates recorded.")
+    lines = [f"<b>Slow updates</b> (last {len(entries)}, this process)"]
+    for e in reversed(entries):
+        spans = ", ".join(
+            f"{kind} {e[kind] * 1000:.0f}ms×{e[kind + '_calls']}"
+            for kind in ("db", "rcon", "api") if kind in e
+        )
+        lines.append(
+            f"{time.strftime('%H:%M:%S', time.localtime(e['at']))} "
+            f"<b>{e['total'] * 1000:.0f}ms</b> {html.escape(e['update'])} "
+            f"user {e['user_id']}" + (f"\n    {spans}" if spans else "")
+        )
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+# ── Scheduled actions ───────────────────────────────────────────────
+
+SCHEDULE_HELP = (
+    "<b>/schedule add</b> &lt;server id|all&gt; &lt;when&gt; &lt;action&gt; [arg]\n"
+    "when: cron <code>m h dom mon dow</code>, <code>@daily</code>/<code>@hourly</code>/<code>@weekly</code>, "
+    "or <code>at 20:00</code> / <code>at 2025-12-24T20:00</code> for one run\n"
+    "actions: restart, warmup [seconds], mode &lt;Mode&gt;, rotate &lt;Mode&gt; (next map of the mode), "
+    "rcon &lt;command&gt;\n"
+    "e.g. <code>/schedule add all 0 5 * * * restart</code>\n"
+    "<b>/schedule del</b> &lt;id&gt;"
+)
+
+
+@router.message(Command("schedule"))
+async def cmd_schedule(message: types.Message, command: CommandObject):
+    uid = message.from_user.id
+    parts = (command.args or "").split()
+    if not parts:
+        return await _list_schedules(message)
+    if parts[0] == "del" and len(parts) == 2 and parts[1].isdigit():
+        if not db.delete_schedule(int(parts[1]), uid):
+            return await message.answer("No such schedule.")
+        if scheduler.current:
+            scheduler.current.push(int(parts[1]), None)
+        return await message.answer("Schedule deleted.")
+    if parts[0] != "add" or len(parts) < 4:
+        return await message.answer(SCHEDULE_HELP, parse_mode="HTML")
+
+    target, rest = parts[1], parts[2:]
+    servers = db.get_user_servers(uid)
+    if target == "all":
+        server_id = None
+    elif target.isdigit() and any(s["id"] == int(target) for s in servers):
+        server_id = int(target)
+    else:
+        return await message.answer("Unknown server. Use an id from /schedule or 'all'.")
+
+    try:
+        if rest[0].startswith("@"):
+            cron, at, rest = rest[0], None, rest[1:]
+        elif rest[0] == "at" and len(rest) > 1:
+            cron, at, rest = None, rest[1], rest[2:]
+        else:
+            cron, at, rest = " ".join(rest[:5]), None, rest[5:]
+        if not rest:
+            raise ValueError("missing action")
+        action, arg = rest[0].lower(), " ".join(rest[1:])
+        payload = scheduler.validate_action(action, arg)
+        next_run = scheduler.next_run(cron) if cron else scheduler.parse_at(at)
+    except ValueError as e:
+        return await message.answer(f"Invalid schedule: {html.escape(str(e))}\n\n{SCHEDULE_HELP}", parse_mode="HTML")
+
+    schedule_id = db.add_schedule(uid, server_id, action, json.dumps(payload), cron, next_run)
+    if scheduler.current and scheduler.owned(schedule_id, server_id):
+        scheduler.current.push(schedule_id, next_run)
+    await message.answer(f"Schedule #{schedule_id} added, next run {_when(next_run)}.")
+
+
+async def _list_schedules(message: types.Message):
+    uid = message.from_user.id
+    servers = db.get_user_servers(uid)
+    lines = ["Servers: " + (", ".join(f"{s['id']} = {html.escape(s['name'])}" for s in servers) or "none")]
+    for sc in db.get_user_schedules(uid):
+        where = html.escape(sc["server_name"] or "?") if sc["server_id"] else "all servers"
+        when = html.escape(sc["cron"]) if sc["cron"] else "once"
+        line = f"#{sc['id']} {html.escape(scheduler.describe(sc))} on {where}, {when}"
+        line += f", next {_when(sc['next_run'])}" if sc["enabled"] else ", done"
+        if sc["last_result"]:
+            line += f"\n    last: {html.escape(sc['last_result'][:100])}"
+        lines.append(line)
+    if len(lines) == 1:
+        lines.append("No schedules yet.")
+    lines.append("")
+    lines.append(SCHEDULE_HELP)
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+def _when(ts: float) -> str:
+    return datetime.fromtimestamp(ts, scheduler.TZ).strftime("%Y-%m-%d %H:%M %Z")
+
+
+# ── /alerts ─────────────────────────────────────────────────────────
+
+ALERTS_HELP = (
+    "<b>/alerts add</b> &lt;server id|all&gt; &lt;rule&gt; [for &lt;minutes&gt;]\n"
+    "rules: <code>down</code>, <code>up</code>, <code>players &gt; 8</code> (also &lt; &gt;= &lt;= =), "
+    "<code>empty 30</code> (no players for 30 min), <code>map</code> (map changed)\n"
+    "<code>for N</code>: the condition must hold N minutes before you are notified\n"
+    "e.g. <code>/alerts add 3 players &gt;= 10</code>\n"
+    "<b>/alerts del</b> &lt;id&gt;"
+)
+
+
+@router.message(Command("alerts"))
+async def cmd_alerts(message: types.Message, command: CommandObject):
+    uid = message.from_user.id
+    parts = (command.args or "").split(None, 2)
+    if not parts:
+        return await _list_alerts(message)
+    if parts[0] == "del" and len(parts) == 2 and parts[1].isdigit():
+        if not db.delete_alert_rule(int(parts[1]), uid):
+            return await message.answer("No such alert.")
+        if alerts.current:
+            alerts.current.remove(int(parts[1]))
+        return await message.answer("Alert deleted.")
+    if parts[0] != "add" or len(parts) < 3:
+        return await message.answer(ALERTS_HELP, parse_mode="HTML")
+
+    servers = db.get_user_servers(uid)
+    target = parts[1]
+    if target == "all":
+        targets = servers
+    else:
+        targets = [s for s in servers if target.isdigit() and s["id"] == int(target)]
+    if not targets:
+        return await message.answer("Unknown server. Use an id from /alerts or 'all'.")
+    try:
+        kind, op, value, hold = alerts.parse_rule(parts[2])
+    except ValueError as e:
+        return await message.answer(f"Invalid rule: {html.escape(str(e))}\n\n{ALERTS_HELP}", parse_mode="HTML")
+
+    rows = [db.add_alert_rule(uid, server["id"], kind, op, value, hold) for server in targets]
+    if alerts.current:
+        alerts.current.add(rows)
+    ids = ", ".join(f"#{row['id']}" for row in rows)
+    await message.answer(f"Alert {ids} added: {alerts.describe(rows[0])}.")
+
+
+async def _list_alerts(message: types.Message):
+    uid = message.from_user.id
+    servers = db.get_user_servers(uid)
+    lines = ["Servers: " + (", ".join(f"{s['id']} = {html.escape(s['name'])}" for s in servers) or "none")]
+    for rule in db.get_user_alert_rules(uid):
+        line = f"#{rule['id']} {html.escape(rule['server_name'])}: {html.escape(alerts.describe(rule))}"
+        if rule["last_fired"]:
+            line += f", last {_when(rule['last_fired'])}"
+        lines.append(line)
+    if len(lines) == 1:
+        lines.append("No alerts yet.")
+    lines.append("")
+    lines.append(ALERTS_HELP)
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+# ── Map search (text input + inline query) ─────────────────────────
+
+INLINE_PAGE_SIZE = 20
+
+
+@router.inline_query()
+async def on_inline_query(iq: types.InlineQuery):
+    offset = int(iq.offset) if iq.offset.isdigit() else 0
+    names = map_search.search(iq.query)
+    page = names[offset:offset + INLINE_PAGE_SIZE]
+    servers = db.get_user_servers(iq.from_user.id)
+
+    results = []
+    for name in page:
+        entry = catalog.get().by_name[name]
+        results.append(types.InlineQueryResultArticle(
+            id=name[:64],
+            title=name,
+            description=", ".join(entry.modes) if entry.modes else entry.code,
+            input_message_content=types.InputTextMessageContent(message_text=f"Map: {name}"),
+            reply_markup=kb.map_servers_keyboard(name, servers) if servers else None,
+        ))
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(names) else ""
+    await iq.answer(results, cache_time=30, is_personal=True, next_offset=next_offset)
+
+
+@router.message(WaitInput.map_search, F.text)
+async def on_map_search(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    server_id = data["server_id"]
+    names = map_search.search(message.text)
+    if not names:
+        return await message.answer("No maps found. Try another name:", reply_markup=kb.cancel_keyboard())
+    await state.clear()
+    await message.answer(
+        f"Found {len(names)} map(s):",
+        reply_markup=kb.map_results_keyboard(server_id, list(names)),
+    )
 
 
 # ── Map pagination ──────────────────────────────────────────────────
 
-@router.callback_query(F.data.startswith("mpage:"))
-async def cb_map_page(cb: types.CallbackQuery):
-    parts = cb.data.split(":")
-    server_id = int(parts[1])
-    page = int(parts[2])
-    mode = parts[3] if len(parts) > 3 and parts[3] else None
-    await cb.message.edit_reply_markup(reply_markup=kb.maps_keyboard(server_id, mode, page))
+@router.callback_query(cbk.Op(cbk.MAP_PAGE))
+async def cb_map_page(cb: types.CallbackQuery, cbd: cbk.Callback):
+    if cbd.stale or (cbd.arg and not cbd.mode):
+        await cb.answer(STALE_BUTTON, show_alert=True)
+        return
+    await cb.message.edit_reply_markup(reply_markup=kb.maps_keyboard(cbd.server_id, cbd.mode, cbd.page))
     await cb.answer()
 
 
 # ── Mode change callback ───────────────────────────────────────────
 
-@router.callback_query(F.data.startswith("mode:"))
-async def cb_change_mode(cb: types.CallbackQuery):
-    parts = cb.data.split(":", 2)
-    server_id = int(parts[1])
-    mode_name = parts[2]
+@router.callback_query(cbk.Op(cbk.MODE))
+async def cb_change_mode(cb: types.CallbackQuery, cbd: cbk.Callback):
+    server_id = cbd.server_id
+    mode_name = cbd.mode
+    if cbd.stale or not mode_name:
+        await cb.answer(STALE_BUTTON, show_alert=True)
+        return
 
     server = db.get_server(server_id, cb.from_user.id)
     if not server:
         await cb.answer("Server not found", show_alert=True)
         return
 
-    cmd = config.GAME_MODES.get(mode_name)
-    if not cmd:
-        await cb.answer("Unknown mode", show_alert=True)
-        return
+    cat = catalog.get()
+    cmd = cat.game_modes[mode_name]
 
     result = _rcon(server, cmd)
     if result.startswith("Error"):
@@ -394,8 +908,7 @@ async def cb_change_mode(cb: types.CallbackQuery):
         await cb.message.answer(f"Mode set to {mode_name}")
 
     # Show map selection for this mode
-    maps_in_mode = config.MODE_MAPS.get(mode_name)
-    if maps_in_mode:
+    if cat.mode_ids.get(mode_name):
         await cb.message.answer("Choose a map for this mode:", reply_markup=kb.maps_keyboard(server_id, mode_name, 0))
     await cb.answer()
 
@@ -409,7 +922,14 @@ async def on_broadcast(message: types.Message, state: FSMContext):
     await state.clear()
     if not server:
         return await message.answer("Server not found.")
-    result = _rcon(server, f'say "{message.text.strip()}"')
+    lines = [line.strip().replace('"', "'") for line in message.text.splitlines() if line.strip()]
+    if len(lines) > 1:
+        # One round trip for all lines when the BroadcastCenter plugin is loaded
+        result = _rcon(server, "css_broadcast_batch " + " ".join(f'"{line}"' for line in lines))
+        if "Unknown command" in result:
+            result = _rcon(server, "; ".join(f'say "{line}"' for line in lines))
+    else:
+        result = _rcon(server, f'say "{message.text.strip()}"')
     await message.answer(f"Broadcast sent. {result}")
 
 
@@ -431,9 +951,4 @@ async def on_rcon_cmd(message: types.Message, state: FSMContext):
     await state.clear()
     if not server:
         return await message.answer("Server not found.")
-    result = _rcon(server, message.text.strip())
-    text = result if result else "(empty response)"
-    # Truncate long responses
-    if len(text) > 4000:
-        text = text[:4000] + "\n...(truncated)"
-    await message.answer(f"<code>{html.escape(text)}</code>", parse_mode="HTML")
+    await _send_rcon_output(message, server, message.text.strip())
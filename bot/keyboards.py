@@ -1,5 +1,6 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
-import config
+import callbacks as cbk
+import catalog
 
 PAGE_SIZE = 18
 
@@ -13,41 +14,47 @@ def reply_menu():
 
 # ── Main: server list ──────────────────────────────────────────────
 
-def servers_list(servers: list[dict]):
+def servers_list(servers: list[dict], live: dict | None = None):
+    """`live` maps server id -> a2s.Info (None = not answering) for the up/down mark."""
     rows = []
     for s in servers:
-        rows.append([InlineKeyboardButton(
-            text=f"{s['name']}  ({s['host']}:{s['port']})",
-            callback_data=f"srv:{s['id']}",
-        )])
+        text = f"{s['name']}  ({s['host']}:{s['port']})"
+        if live is not None and s["id"] in live:
+            info = live[s["id"]]
+            text = f"🟢 {s['name']}  {info.players}/{info.max_players} · {info.map}" if info else f"🔴 {text}"
+        rows.append([InlineKeyboardButton(text=text, callback_data=cbk.panel(s["id"]))])
     rows.append([InlineKeyboardButton(text="+ Добавить сервер", callback_data="add_server")])
+    rows.append([InlineKeyboardButton(text="Импорт", callback_data="import_servers"),
+                 InlineKeyboardButton(text="Экспорт", callback_data="export_servers")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
 def no_servers():
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="+ Добавить сервер", callback_data="add_server")]
+        [InlineKeyboardButton(text="+ Добавить сервер", callback_data="add_server")],
+        [InlineKeyboardButton(text="Импорт из файла", callback_data="import_servers")],
     ])
 
 
 # ── Server control panel ───────────────────────────────────────────
 
 def server_panel(server_id: int):
-    p = f"s:{server_id}"
+    def p(name):
+        return cbk.action(server_id, name)
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Status", callback_data=f"{p}:status"),
-         InlineKeyboardButton(text="RCON cmd", callback_data=f"{p}:rcon")],
-        [InlineKeyboardButton(text="Change Map", callback_data=f"{p}:maps"),
-         InlineKeyboardButton(text="Change Mode", callback_data=f"{p}:modes")],
-        [InlineKeyboardButton(text="Restart", callback_data=f"{p}:restart"),
-         InlineKeyboardButton(text="Warmup On", callback_data=f"{p}:warmup_on"),
-         InlineKeyboardButton(text="Warmup Off", callback_data=f"{p}:warmup_off")],
-        [InlineKeyboardButton(text="+ Bot T", callback_data=f"{p}:addt"),
-         InlineKeyboardButton(text="+ Bot CT", callback_data=f"{p}:addct"),
-         InlineKeyboardButton(text="Kick bots", callback_data=f"{p}:kickbots")],
-        [InlineKeyboardButton(text="Broadcast", callback_data=f"{p}:broadcast"),
-         InlineKeyboardButton(text="Kick player", callback_data=f"{p}:kick")],
-        [InlineKeyboardButton(text="Delete server", callback_data=f"{p}:delete")],
+        [InlineKeyboardButton(text="Status", callback_data=p("status")),
+         InlineKeyboardButton(text="RCON cmd", callback_data=p("rcon"))],
+        [InlineKeyboardButton(text="Change Map", callback_data=p("maps")),
+         InlineKeyboardButton(text="Change Mode", callback_data=p("modes"))],
+        [InlineKeyboardButton(text="Restart", callback_data=p("restart")),
+         InlineKeyboardButton(text="Warmup On", callback_data=p("warmup_on")),
+         InlineKeyboardButton(text="Warmup Off", callback_data=p("warmup_off"))],
+        [InlineKeyboardButton(text="+ Bot T", callback_data=p("addt")),
+         InlineKeyboardButton(text="+ Bot CT", callback_data=p("addct")),
+         InlineKeyboardButton(text="Kick bots", callback_data=p("kickbots"))],
+        [InlineKeyboardButton(text="Broadcast", callback_data=p("broadcast")),
+         InlineKeyboardButton(text="Kick player", callback_data=p("kick"))],
+        [InlineKeyboardButton(text="Delete server", callback_data=p("delete"))],
         [InlineKeyboardButton(text="<< Back to servers", callback_data="back_servers")],
     ])
 
@@ -55,52 +62,90 @@ def server_panel(server_id: int):
 # ── Maps keyboard ──────────────────────────────────────────────────
 
 def maps_keyboard(server_id: int, mode: str | None, page: int = 0):
-    if mode and mode in config.MODE_MAPS:
-        all_maps = config.MODE_MAPS[mode]
-    else:
-        all_maps = list(config.MAPS.keys())
+    all_maps = catalog.get().names(mode)
 
     start = page * PAGE_SIZE
     end = start + PAGE_SIZE
-    current = all_maps[start:end]
+    rows = _map_rows(server_id, all_maps[start:end])
 
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="<< Prev", callback_data=cbk.map_page(server_id, page - 1, mode)))
+    if end < len(all_maps):
+        nav.append(InlineKeyboardButton(text="Next >>", callback_data=cbk.map_page(server_id, page + 1, mode)))
+    if nav:
+        rows.append(nav)
+
+    rows.append([InlineKeyboardButton(text="Search", callback_data=cbk.action(server_id, "msearch"))])
+    rows.append([InlineKeyboardButton(text="<< Back", callback_data=cbk.panel(server_id))])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def map_results_keyboard(server_id: int, names: list[str]):
+    rows = _map_rows(server_id, names[:PAGE_SIZE])
+    rows.append([InlineKeyboardButton(text="Search again", callback_data=cbk.action(server_id, "msearch"))])
+    rows.append([InlineKeyboardButton(text="<< Back", callback_data=cbk.panel(server_id))])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def map_servers_keyboard(name: str, servers: list[dict]):
+    """Server picker attached to an inline-query map result."""
+    entry = catalog.get().by_name[name]
+    rows = [[InlineKeyboardButton(text=s["name"], callback_data=cbk.change_map(s["id"], entry))]
+            for s in servers]
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def _map_rows(server_id: int, names: list[str]):
+    cat = catalog.get()
     rows = []
     row = []
-    for name in current:
-        code = config.MAPS.get(name, name)
+    for name in names:
+        entry = cat.by_name[name]
         display = name[:22] + ".." if len(name) > 24 else name
-        row.append(InlineKeyboardButton(text=display, callback_data=f"map:{server_id}:{code}"))
+        row.append(InlineKeyboardButton(text=display, callback_data=cbk.change_map(server_id, entry)))
         if len(row) == 2:
             rows.append(row)
             row = []
     if row:
         rows.append(row)
+    return rows
 
-    nav = []
-    if page > 0:
-        nav.append(InlineKeyboardButton(text="<< Prev", callback_data=f"mpage:{server_id}:{page - 1}:{mode or ''}"))
-    if end < len(all_maps):
-        nav.append(InlineKeyboardButton(text="Next >>", callback_data=f"mpage:{server_id}:{page + 1}:{mode or ''}"))
-    if nav:
-        rows.append(nav)
 
-    rows.append([InlineKeyboardButton(text="<< Back", callback_data=f"srv:{server_id}")])
+# ── Modes keyboard ─────────────────────────────────────────────────
+
+def modes_keyboard(server_id: int):
+    rows = []
+    row = []
+    for mode_name in catalog.get().game_modes:
+        row.append(InlineKeyboardButton(text=mode_name, callback_data=cbk.change_mode(server_id, mode_name)))
+        if len(row) == 2:
+            rows.append(row)
+            row = []
+    if row:
+        rows.append(row)
+    rows.append([InlineKeyboardButton(text="<< Back", callback_data=cbk.panel(server_id))])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-# ── Modes keyboard ─────────────────────────────────────────────────
+# ── Kick keyboard ───────────────────────────────────────────────────
 
-def modes_keyboard(server_id: int):
+def kick_keyboard(server_id: int, players: list[dict]):
     rows = []
     row = []
-    for mode_name in config.GAME_MODES:
-        row.append(InlineKeyboardButton(text=mode_name, callback_data=f"mode:{server_id}:{mode_name}"))
+    for p in players:
+        if p.get("userid") is None:
+            continue
+        name = p["name"]
+        display = name[:22] + ".." if len(name) > 24 else name
+        row.append(InlineKeyboardButton(text=display, callback_data=cbk.kick(server_id, p["userid"])))
         if len(row) == 2:
             rows.append(row)
             row = []
     if row:
         rows.append(row)
-    rows.append([InlineKeyboardButton(text="<< Back", callback_data=f"srv:{server_id}")])
+    rows.append([InlineKeyboardButton(text="Type a name", callback_data=cbk.action(server_id, "kickname"))])
+    rows.append([InlineKeyboardButton(text="<< Back", callback_data=cbk.panel(server_id))])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
@@ -108,8 +153,8 @@ def modes_keyboard(server_id: int):
 
 def confirm_delete(server_id: int):
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Yes, delete", callback_data=f"del_yes:{server_id}"),
-         InlineKeyboardButton(text="Cancel", callback_data=f"srv:{server_id}")],
+        [InlineKeyboardButton(text="Yes, delete", callback_data=cbk.delete(server_id)),
+         InlineKeyboardButton(text="Cancel", callback_data=cbk.panel(server_id))],
     ])
 
 
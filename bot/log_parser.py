@@ -0,0 +1,87 @@
+import re
+from typing import NamedTuple
+
+# Incremental parser for CS2 log lines, as pushed by `logaddress_add` or as
+# found in the captured console logs (docker timestamp prefix). Each line is
+# parsed on its own; only lines that look like an event reach a regex.
+
+
+class LogEvent(NamedTuple):
+    kind: str          # connect, disconnect, validated, chat, round_start, round_end, map
+    server_id: int | None
+    ts: str | None
+    data: dict
+
+
+_PREFIX_L = re.compile(r"L (\d\d/\d\d/\d{4} - \d\d:\d\d:\d\d(?:\.\d+)?): ")
+_PREFIX_ISO = re.compile(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?Z) ")
+
+# "name<userid><steamid><team>"
+_PLAYER = r'"(?P<name>.*?)<(?P<userid>-?\d+)><(?P<steamid>[^>]*)><(?P<team>[^>]*)>"'
+
+_CONNECTED = re.compile(_PLAYER + r' connected, address "(?P<address>[^"]*)"')
+_CLIENT_CONNECTED = re.compile(r'Client #(?P<userid>\d+) "(?P<name>.*)" connected @ (?P<address>\S+)')
+_DISCONNECTED = re.compile(_PLAYER + r' disconnected(?: \(reason "(?P<reason>[^"]*)"\))?')
+_VALIDATED = re.compile(r'(?:SV:\s+)?' + _PLAYER + r' STEAM USERID validated')
+_SAY = re.compile(_PLAYER + r' (?P<channel>say|say_team) "(?P<text>.*)"')
+_WORLD = re.compile(r'World triggered "(?P<what>Round_Start|Round_End)"')
+_MAP = re.compile(r'(?:Loading|Started) map "(?P<map>[^"]+)"')
+
+
+def split_prefix(line: str) -> tuple[str | None, str]:
+    """Strip the timestamp prefix, returning (timestamp, message)."""
+    m = _PREFIX_L.match(line) or _PREFIX_ISO.match(line)
+    if m:
+        return m.group(1), line[m.end():]
+    return None, line
+
+
+def parse_line(line: str, server_id: int | None = None) -> LogEvent | None:
+    ts, msg = split_prefix(line.rstrip("\r\n\x00"))
+
+    if '" connected' in msg or "connected @" in msg:
+        m = _CONNECTED.match(msg)
+        if m:
+            return LogEvent("connect", server_id, ts, _player(m, address=m.group("address")))
+        m = _CLIENT_CONNECTED.match(msg)
+        if m:
+            return LogEvent("connect", server_id, ts, {
+                "name": m.group("name"), "userid": int(m.group("userid")),
+                "steamid": None, "team": None, "bot": False, "address": m.group("address"),
+            })
+    elif '" disconnected' in msg:
+        m = _DISCONNECTED.match(msg)
+        if m:
+            return LogEvent("disconnect", server_id, ts, _player(m, reason=m.group("reason")))
+    elif msg.endswith("STEAM USERID validated"):
+        m = _VALIDATED.match(msg)
+        if m:
+            return LogEvent("validated", server_id, ts, _player(m))
+    elif '" say' in msg:
+        m = _SAY.match(msg)
+        if m:
+            return LogEvent("chat", server_id, ts, _player(
+                m, text=m.group("text"), team_only=m.group("channel") == "say_team"))
+    elif msg.startswith("World triggered"):
+        m = _WORLD.match(msg)
+        if m:
+            kind = "round_start" if m.group("what") == "Round_Start" else "round_end"
+            return LogEvent(kind, server_id, ts, {})
+    elif " map \"" in msg:
+        m = _MAP.match(msg)
+        if m:
+            return LogEvent("map", server_id, ts, {"map": m.group("map")})
+    return None
+
+
+def _player(m: re.Match, **extra) -> dict:
+    steamid = m.group("steamid")
+    data = {
+        "name": m.group("name"),
+        "userid": int(m.group("userid")),
+        "steamid": steamid if steamid.startswith(("[U:", "STEAM_")) else None,
+        "team": m.group("team") or None,
+        "bot": steamid == "BOT",
+    }
+    data.update(extra)
+    return data
@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import logging
+import secrets
+import socket
+import time
+from typing import Callable
+
+from log_parser import LogEvent, parse_line, split_prefix
+
+# UDP endpoint for `logaddress_add`. Source engine log packets look like
+#   \xff\xff\xff\xff R L 12/06/2025 - 14:24:57: <message>
+#   \xff\xff\xff\xff S <sv_logsecret> L 12/06/2025 - 14:24:57: <message>
+# A stream is accepted only from a registered server: by secret when one is
+# configured for it, otherwise by source IP. Parsed events go into a bounded
+# queue; when consumers fall behind the oldest events are dropped (UDP cannot
+# push back on the sender) and counted.
+
+HEADER = b"\xff\xff\xff\xff"
+QUEUE_SIZE = 10000
+RCVBUF = 4 * 1024 * 1024  # absorb bursts while the event loop is busy
+
+
+class LogReceiver(asyncio.DatagramProtocol):
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue: asyncio.Queue[LogEvent] = asyncio.Queue(maxsize=queue_size)
+        self.transport = None
+        self._by_secret: dict[str, tuple[int, str]] = {}
+        self._by_ip: dict[str, list[int]] = {}
+        self.stats = {"packets": 0, "lines": 0, "events": 0, "rejected": 0, "dropped": 0}
+
+    # ── Registration ──
+
+    def register(self, server_id: int, ip: str, secret: str | None = None):
+        """Accept the server's stream; `ip` is its resolved address (no DNS on the loop)."""
+        self.unregister(server_id)
+        if secret:
+            self._by_secret[secret] = (server_id, ip)
+        else:
+            self._by_ip.setdefault(ip, []).append(server_id)
+
+    def unregister(self, server_id: int):
+        for secret, (sid, _) in list(self._by_secret.items()):
+            if sid == server_id:
+                del self._by_secret[secret]
+        for ip, ids in list(self._by_ip.items()):
+            if server_id in ids:
+                ids.remove(server_id)
+                if not ids:
+                    del self._by_ip[ip]
+
+    def _authenticate(self, ip: str, secret: str | None) -> int | None:
+        if secret is not None:
+            entry = self._by_secret.get(secret)
+            return entry[0] if entry and entry[1] == ip else None
+        ids = self._by_ip.get(ip)
+        # Several secret-less servers behind one IP cannot be told apart
+        return ids[0] if ids and len(ids) == 1 else None
+
+    # ── Protocol ──
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        self.stats["packets"] += 1
+        secret = None
+        if data.startswith(HEADER):
+            kind = data[4:5]
+            if kind == b"S":
+                end = data.find(b"L ", 5)
+                if end < 0:
+                    self.stats["rejected"] += 1
+                    return
+                secret = data[5:end].decode("ascii", errors="replace")
+                data = data[end:]
+            elif kind == b"R":
+                data = data[5:]
+            else:
+                self.stats["rejected"] += 1
+                return
+
+        server_id = self._authenticate(addr[0], secret)
+        if server_id is None:
+            self.stats["rejected"] += 1
+            return
+
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            self.stats["lines"] += 1
+            event = parse_line(line, server_id)
+            if event:
+                self._put(event)
+
+    def _put(self, event: LogEvent):
+        self.stats["events"] += 1
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.stats["dropped"] += 1
+        self.queue.put_nowait(event)
+
+    async def events(self):
+        while True:
+            yield await self.queue.get()
+
+
+async def start(host: str, port: int, queue_size: int = QUEUE_SIZE) -> LogReceiver:
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: LogReceiver(queue_size), local_addr=(host, port)
+    )
+    sock = transport.get_extra_info("socket")
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+    except OSError:
+        pass
+    return protocol
+
+
+# Callbacks run for every event by dispatch(); they must not block.
+listeners: list[Callable[[LogEvent], None]] = []
+
+
+async def dispatch(receiver: LogReceiver):
+    async for event in receiver.events():
+        for callback in listeners:
+            try:
+                callback(event)
+            except Exception:
+                logging.exception("Log event listener failed")
+
+
+def enable_logging(server: dict, advertise: str, execute) -> str:
+    """Point a server's log stream at this bot; returns the secret used."""
+    secret = server.get("log_secret") or str(secrets.randbelow(10**9) + 1)
+    execute(server["host"], server["port"], server["rcon_password"],
+            f"sv_logsecret {secret}; logaddress_add {advertise}; log on")
+    return secret
+
+
+def disable_logging(server: dict, advertise: str, execute):
+    """Stop a server sending its log stream to `advertise`."""
+    execute(server["host"], server["port"], server["rcon_password"], f"logaddress_del {advertise}")
+
+
+def pack_line(line: str, secret: str | None = None) -> bytes:
+    body = line.encode("utf-8")
+    if secret:
+        return HEADER + b"S" + secret.encode("ascii") + body
+    return HEADER + b"R" + body
+
+
+def replay(path: str, host: str, port: int, secret: str | None = None, rate: float = 0) -> int:
+    """Send a captured log file line by line to a receiver; returns lines sent."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sent = 0
+    started = time.monotonic()
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                if not line:
+                    continue
+                if not line.startswith("L "):
+                    _, msg = split_prefix(line)
+                    line = "L " + time.strftime("%m/%d/%Y - %H:%M:%S") + ": " + msg
+                sock.sendto(pack_line(line, secret), (host, port))
+                sent += 1
+                if rate:
+                    delay = sent / rate - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+    finally:
+        sock.close()
+    return sent
+
+
+async def _listen(port: int, secret: str | None, source: str):
+    receiver = await start("0.0.0.0", port)
+    receiver.register(0, await asyncio.to_thread(socket.gethostbyname, source), secret)
+    logging.info("Listening for logs on udp/%d", port)
+    async for event in receiver.events():
+        print(event.kind, event.ts, event.data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CS2 UDP log receiver")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("listen", help="print events from one server")
+    p.add_argument("--port", type=int, default=27500)
+    p.add_argument("--source", default="127.0.0.1", help="server host to accept logs from")
+    p.add_argument("--secret")
+    p = sub.add_parser("replay", help="send a captured log file to a receiver")
+    p.add_argument("path")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=27500)
+    p.add_argument("--secret")
+    p.add_argument("--rate", type=float, default=0, help="lines per second (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.cmd == "listen":
+        try:
+            asyncio.run(_listen(args.port, args.secret, args.source))
+        except KeyboardInterrupt:
+            pass
+    else:
+        started = time.monotonic()
+        n = replay(args.path, args.host, args.port, args.secret, args.rate)
+        print(f"Sent {n} lines in {time.monotonic() - started:.2f} s")
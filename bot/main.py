@@ -1,13 +1,58 @@
 import asyncio
+import json
 import logging
+import multiprocessing
+import os
+import queue as queue_mod
+import socket
+import time
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import GetUpdates
 
-from config import TELEGRAM_BOT_TOKEN
-from database import init_db
+import alerts
+import database as db
+import log_receiver
+import metrics
+import middlewares
+import player_index
+import rcon_client
+import rtt
+import scheduler
+import sharding
+import throttle
+from config import (
+    TELEGRAM_BOT_TOKEN, BOT_WORKERS, LOG_UDP_PORT, LOG_UDP_ADVERTISE, METRICS_PORT, METRICS_HOST,
+    SLOW_UPDATE_MS, PROFILE_EVERY, PROFILE_PATH, THROTTLE_USER_PER_MIN, THROTTLE_USER_BURST,
+    THROTTLE_SERVER_PER_MIN, THROTTLE_SERVER_BURST, THROTTLE_TRUSTED_FACTOR, TRUSTED_IDS,
+)
+from database import init_db, DB_PATH
 from handlers import router
 
 
+def _dispatcher(worker_id: str = "") -> Dispatcher:
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(router)
+    profile_path = PROFILE_PATH
+    if worker_id:
+        root, ext = os.path.splitext(PROFILE_PATH)
+        profile_path = f"{root}.{worker_id}{ext}"
+    limits = None
+    if THROTTLE_USER_PER_MIN or THROTTLE_SERVER_PER_MIN:
+        limits = throttle.Throttle(throttle.Limit(THROTTLE_USER_PER_MIN, THROTTLE_USER_BURST),
+                                   throttle.Limit(THROTTLE_SERVER_PER_MIN, THROTTLE_SERVER_BURST),
+                                   TRUSTED_IDS, THROTTLE_TRUSTED_FACTOR)
+    throttle.current = limits
+    middlewares.setup(dp, SLOW_UPDATE_MS, PROFILE_EVERY, profile_path, limits)
+    return dp
+
+
+def _bot() -> Bot:
+    bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    bot.session.middleware(middlewares.ApiTimer())
+    return bot
+
+
 async def main():
     logging.basicConfig(level=logging.INFO)
 
@@ -17,13 +62,269 @@ async def main():
 
     init_db()
     logging.info("Database initialized")
+    rtt.load()
+    if METRICS_PORT:
+        await metrics.serve(METRICS_HOST, METRICS_PORT)
 
-    bot = Bot(token=TELEGRAM_BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
-    dp.include_router(router)
+    if BOT_WORKERS > 1:
+        return await run_router(BOT_WORKERS)
+
+    bot = _bot()
+    dp = _dispatcher()
+    if LOG_UDP_PORT:
+        await start_log_receiver()
+    asyncio.create_task(player_index.run_flusher())
+    asyncio.create_task(rtt.run_saver())
+    start_scheduler(bot)
 
     logging.info("Bot starting...")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        rtt.save()
+
+
+LOG_SYNC_INTERVAL = 30.0    # servers added by the wizard, /import or another worker stream within this
+LOG_RETRY_INTERVAL = 300.0  # a server whose log setup failed is retried this often
+
+_tasks: set[asyncio.Task] = set()  # background tasks nothing else holds a reference to
+
+
+def _background(coro):
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+def _finished(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logging.error("Background task %s stopped", task.get_coro().__qualname__, exc_info=task.exception())
+
+
+async def start_log_receiver(port: int = LOG_UDP_PORT, advertise: str = LOG_UDP_ADVERTISE, settle: float = 0.0):
+    receiver = await log_receiver.start("0.0.0.0", port)
+    log_receiver.listeners.append(player_index.on_event)
+    _background(log_receiver.dispatch(receiver))
+    _background(_sync_log_servers(receiver, advertise, settle))
+    logging.info("Log receiver listening on udp/%d", port)
+    return receiver
+
+
+def _log_endpoint(index: int) -> tuple[int, str]:
+    """UDP port and advertised address of worker `index`'s log receiver."""
+    host, _, port = LOG_UDP_ADVERTISE.rpartition(":")
+    return LOG_UDP_PORT + index, f"{host}:{int(port) + index}"
+
+
+async def _attach_log_stream(receiver, server: dict, advertise: str):
+    if advertise:
+        secret = await asyncio.to_thread(
+            log_receiver.enable_logging, server, advertise, rcon_client.execute
+        )
+        if secret != server.get("log_secret"):
+            await asyncio.to_thread(db.set_log_secret, server["id"], secret)
+        server["log_secret"] = secret
+    ip = await asyncio.to_thread(socket.gethostbyname, server["host"])
+    receiver.register(server["id"], ip, server.get("log_secret"))
+
+
+async def _sync_log_servers(receiver, advertise: str, settle: float = 0.0):
+    """Stream the servers this process owns as they are added (by any process).
+
+    Deleted servers are dropped; servers another worker owns now are pointed
+    away from this receiver, and the new owner points them at its own.
+    """
+    await asyncio.sleep(settle)
+    attached: dict[int, dict] = {}  # server id -> server row
+    failed: dict[int, float] = {}   # server id -> when to retry
+    while True:
+        try:
+            servers = await asyncio.to_thread(db.get_all_servers)
+        except Exception as e:
+            logging.warning("Could not list servers for log streams: %s", e)
+            servers = None
+        if servers is not None:
+            now = time.monotonic()
+            ids = {s["id"] for s in servers}
+            owned = [s for s in servers if sharding.owns_server(s["id"])]
+            for server_id in attached.keys() - {s["id"] for s in owned}:
+                server = attached.pop(server_id)
+                receiver.unregister(server_id)
+                if advertise and server_id in ids:
+                    try:
+                        await asyncio.to_thread(
+                            log_receiver.disable_logging, server, advertise, rcon_client.execute
+                        )
+                    except Exception as e:
+                        logging.warning("Log stream for server %s not handed over: %s", server_id, e)
+            for server in owned:
+                if server["id"] in attached or failed.get(server["id"], 0) > now:
+                    continue
+                try:
+                    await _attach_log_stream(receiver, server, advertise)
+                except Exception as e:
+                    logging.warning("Log stream for server %s not set up: %s", server["id"], e)
+                    failed[server["id"]] = now + LOG_RETRY_INTERVAL
+                    continue
+                attached[server["id"]] = server
+                failed.pop(server["id"], None)
+        await asyncio.sleep(LOG_SYNC_INTERVAL)
+
+
+def start_scheduler(bot: Bot):
+    """Scheduled actions and alert polling for the servers this process owns."""
+    async def notify(telegram_id: int, text: str):
+        await bot.send_message(telegram_id, text)
+
+    scheduler.current = scheduler.Scheduler(notify)
+    _background(scheduler.current.run())
+    alerts.current = alerts.Monitor(notify)
+    _background(alerts.current.run())
+
+
+# ── Multi-worker mode ───────────────────────────────────────────────
+
+async def run_router(workers: int):
+    """Poll Telegram and route each update to a worker by telegram_id."""
+    bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    allowed = _dispatcher().resolve_used_update_types()
+    ctx = multiprocessing.get_context("spawn")
+    queues: dict[str, multiprocessing.Queue] = {}
+    procs: dict[str, multiprocessing.Process] = {}
+    ring = sharding.HashRing()
+    loop = asyncio.get_running_loop()
+    routed = metrics.counter("bot_updates_routed_total", "Updates handed to each worker", ("worker",))
+
+    def spawn(worker_id: str):
+        # A restarted worker takes over its predecessor's queue and the updates waiting in it
+        queue = queues.get(worker_id) or ctx.Queue(maxsize=1000)
+        proc = ctx.Process(target=run_worker, args=(worker_id, queue), daemon=True)
+        proc.start()
+        queues[worker_id] = queue
+        procs[worker_id] = proc
+
+    def revive():
+        for worker_id, proc in list(procs.items()):
+            if not proc.is_alive():
+                logging.warning("Worker %s exited (%s), restarting", worker_id, proc.exitcode)
+                spawn(worker_id)
+
+    def deliver(worker_id: str, payload: str):
+        # Runs in an executor thread; a full queue usually means a dead worker
+        while True:
+            try:
+                return queues[worker_id].put(payload, timeout=1.0)
+            except queue_mod.Full:
+                loop.call_soon_threadsafe(revive)
+
+    for i in range(workers):
+        spawn(f"w{i}")
+    logging.info("Bot starting with %d workers...", workers)
+
+    offset = None
+    try:
+        while True:
+            revive()
+            ring.set_nodes(procs)
+
+            try:
+                updates = await bot(GetUpdates(offset=offset, timeout=30, allowed_updates=allowed))
+            except Exception as e:
+                logging.error("getUpdates failed: %s", e)
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                offset = update.update_id + 1
+                raw = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+                key = sharding.update_user_id(raw)
+                worker_id = ring.node_for(key if key is not None else update.update_id)
+                await loop.run_in_executor(None, deliver, worker_id, json.dumps(raw))
+                routed.inc(worker_id)
+    finally:
+        for queue in queues.values():
+            queue.put(None)
+        await bot.session.close()
+
+
+def run_worker(worker_id: str, queue):
+    try:
+        asyncio.run(_worker(worker_id, queue))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker(worker_id: str, queue):
+    logging.basicConfig(level=logging.INFO, format=f"[{worker_id}] %(levelname)s:%(name)s:%(message)s")
+    index = int(worker_id[1:])
+    membership = sharding.Membership(worker_id, sharding.SqliteBackend(DB_PATH))
+    membership.refresh()
+    sharding.current = membership
+
+    bot = _bot()
+    dp = _dispatcher(worker_id)
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    if METRICS_PORT:
+        await metrics.serve(METRICS_HOST, METRICS_PORT + 1 + index)
+    if LOG_UDP_PORT and LOG_UDP_ADVERTISE:
+        # Each worker has its own socket and points the servers it owns at it.
+        # The first sync waits a heartbeat, until the other workers have joined.
+        port, advertise = _log_endpoint(index)
+        await start_log_receiver(port, advertise, settle=sharding.HEARTBEAT_INTERVAL)
+    elif LOG_UDP_PORT and index == 0:
+        logging.warning("Log streams need LOG_UDP_ADVERTISE with several workers; log receiver disabled")
+    start_scheduler(bot)
+    flusher = asyncio.create_task(player_index.run_flusher())
+    rtt.load()
+    rtt_saver = asyncio.create_task(rtt.run_saver())
+    hb = asyncio.create_task(_heartbeat(membership))
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, queue.get)
+            if raw is None:
+                break
+            task = asyncio.create_task(dp.feed_raw_update(bot, json.loads(raw)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        hb.cancel()
+        flusher.cancel()
+        rtt_saver.cancel()
+        player_index.flush()
+        rtt.save()
+        membership.leave()
+        await bot.session.close()
+
+
+async def _heartbeat(membership: sharding.Membership):
+    while True:
+        await asyncio.sleep(sharding.HEARTBEAT_INTERVAL)
+        try:
+            changed = await asyncio.to_thread(membership.refresh)
+        except Exception as e:
+            logging.warning("Heartbeat failed: %s", e)
+            continue
+        if changed:
+            logging.info("Live workers: %s", ", ".join(membership.ring.nodes))
+            await _rebalance()
+
+
+async def _rebalance():
+    """Workers joined or left: take up and drop per-server work to match the ring.
+
+    Log streams follow on the next sync (LOG_SYNC_INTERVAL).
+    """
+    try:
+        await player_index.release()
+        if scheduler.current:
+            await asyncio.to_thread(scheduler.current.reload)
+        if alerts.current:
+            await alerts.current.reload()
+    except Exception as e:
+        logging.warning("Could not rebalance background work: %s", e)
 
 
 if __name__ == "__main__":
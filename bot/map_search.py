@@ -0,0 +1,131 @@
+from functools import lru_cache
+
+import catalog
+
+# Search index over the map catalog, built on first search:
+#   - a prefix trie over full map names and their "_"-separated tokens
+#   - a trigram index for typo tolerance
+# Results are ranked by MODE_MAPS membership (maps used by more modes first).
+
+MIN_SIMILARITY = 0.25
+CACHE_SIZE = 1024  # cached results per index
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Node:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: dict[str, "_Node"] = {}
+        self.ids: set[int] = set()
+
+
+class MapIndex:
+    def __init__(self, cat: catalog.Catalog):
+        self.catalog = cat
+        # Per instance, so a replaced index and its cached results can be freed
+        self._search = lru_cache(maxsize=CACHE_SIZE)(self._search_uncached)
+        self.names: list[str] = cat.names()
+        self.mode_names = {m.lower(): m for m in cat.mode_ids}
+        self.mode_maps = {m: frozenset(cat.names(m)) for m in cat.mode_ids}
+
+        # Static rank: membership count desc, then name
+        order = sorted(range(len(self.names)),
+                       key=lambda i: (-len(cat.entries[i].modes), self.names[i]))
+        self.rank = {i: r for r, i in enumerate(order)}
+
+        self.root = _Node()
+        self.name_root = _Node()
+        self.trigrams: dict[str, list[int]] = {}
+        self.name_trigrams: list[list[set[str]]] = []
+        for i, name in enumerate(self.names):
+            low = name.lower()
+            self._insert(self.name_root, low, i)
+            self._insert(self.root, low, i)
+            for token in low.split("_")[1:]:
+                if token:
+                    self._insert(self.root, token, i)
+            sets = [_trigrams(low)] + [_trigrams(t) for t in low.split("_") if len(t) > 2]
+            self.name_trigrams.append(sets)
+            for t in set().union(*sets):
+                self.trigrams.setdefault(t, []).append(i)
+
+    @staticmethod
+    def _insert(root: _Node, key: str, idx: int):
+        node = root
+        node.ids.add(idx)
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+            node.ids.add(idx)
+
+    @staticmethod
+    def _prefix(root: _Node, key: str) -> set[int]:
+        node = root
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.ids
+
+    def _split_mode(self, query: str) -> tuple[str | None, str]:
+        """Strip a leading mode name ("surf uto") from the query."""
+        low = query.lower()
+        for key in sorted(self.mode_names, key=len, reverse=True):
+            if low == key or low.startswith(key + " "):
+                return self.mode_names[key], low[len(key):].strip()
+        return None, low
+
+    def search(self, query: str, mode: str | None = None) -> tuple[str, ...]:
+        query = " ".join(query.split())
+        return self._search(query, mode)
+
+    def _search_uncached(self, query: str, mode: str | None) -> tuple[str, ...]:
+        if mode is None:
+            mode, query = self._split_mode(query)
+        else:
+            query = query.lower()
+        in_mode = self.mode_maps.get(mode, frozenset())
+
+        if not query:
+            if mode:
+                return tuple(self.catalog.names(mode))
+            ids = sorted(range(len(self.names)), key=self.rank.__getitem__)
+            return tuple(self.names[i] for i in ids)
+
+        scores: dict[int, tuple[int, float]] = {}
+        for i in self._prefix(self.name_root, query):
+            scores[i] = (0, 1.0)
+        for i in self._prefix(self.root, query):
+            scores.setdefault(i, (1, 1.0))
+
+        # Fuzzy fallback: trigram similarity against the name or any token
+        if not scores:
+            q_tris = _trigrams(query)
+            candidates = set()
+            for t in q_tris:
+                candidates.update(self.trigrams.get(t, ()))
+            for i in candidates:
+                sim = max(len(q_tris & s) / len(q_tris | s) for s in self.name_trigrams[i])
+                if sim >= MIN_SIMILARITY:
+                    scores[i] = (2, sim)
+
+        def key(i):
+            tier, sim = scores[i]
+            return (self.names[i] not in in_mode, tier, -sim, self.rank[i])
+
+        return tuple(self.names[i] for i in sorted(scores, key=key))
+
+
+_index: MapIndex | None = None
+
+
+def search(query: str, mode: str | None = None) -> tuple[str, ...]:
+    """Return map names matching query, best first."""
+    global _index
+    if _index is None:
+        _index = MapIndex(catalog.get())
+    return _index.search(query, mode)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+import a2s
+import database as db
+import rcon_client as rcon
+import status_parser
+
+# Follows a changelevel / host_workshop_map until the server reports the new
+# map, probing with exponential backoff. Probes use A2S_INFO (one UDP round
+# trip, no RCON login); `status` over RCON is the fallback for servers whose
+# query port does not answer. While the map loads the server usually drops
+# connections; those failures just mean "not yet".
+
+FIRST_PROBE = 3.0
+MAX_INTERVAL = 15.0
+BACKOFF = 1.5
+TIMEOUT = 120.0
+WORKSHOP_TIMEOUT = 600.0  # workshop maps may need a download first
+
+_tracking: dict[int, asyncio.Task] = {}
+
+
+def _on_map(info: dict, map_name: str) -> bool:
+    current = info["map"]
+    return current != "Unknown" and current.lower().rsplit("/", 1)[-1] == map_name.lower()
+
+
+def _status(server: dict) -> dict:
+    return status_parser.collect(
+        server["host"], server["port"],
+        lambda command: rcon.execute(server["host"], server["port"], server["rcon_password"], command),
+    )
+
+
+async def _probe(server: dict) -> dict | None:
+    try:
+        info = await a2s.info(server["host"], server["port"])
+        return {"map": info.map or "Unknown"}
+    except (OSError, asyncio.TimeoutError, ValueError):
+        pass
+    try:
+        return await asyncio.to_thread(_status, server)
+    except Exception:
+        return None
+
+
+async def wait_for_map(server: dict, map_name: str, timeout: float) -> float | None:
+    """Return seconds until the server is on map_name, or None on timeout."""
+    started = time.monotonic()
+    interval = FIRST_PROBE
+    while True:
+        await asyncio.sleep(interval)
+        info = await _probe(server)
+        elapsed = time.monotonic() - started
+        if info and _on_map(info, map_name):
+            return elapsed
+        if elapsed >= timeout:
+            return None
+        interval = min(interval * BACKOFF, MAX_INTERVAL, timeout - elapsed + 0.1)
+
+
+async def _track(server: dict, map_name: str, workshop: bool,
+                 report: Callable[[str], Awaitable]):
+    timeout = WORKSHOP_TIMEOUT if workshop else TIMEOUT
+    seconds = await wait_for_map(server, map_name, timeout)
+    ok = seconds is not None
+    try:
+        db.record_map_load(server["id"], map_name, seconds if ok else timeout, ok)
+    except Exception as e:
+        logging.warning("Could not record map load: %s", e)
+
+    if ok:
+        text = f"Map changed to {map_name} (loaded in {seconds:.1f} s)"
+    else:
+        text = f"Map change to {map_name} not confirmed after {timeout:.0f} s"
+    try:
+        await report(text)
+    except Exception as e:
+        logging.warning("Could not report map change: %s", e)
+
+
+def track(server: dict, map_name: str, workshop: bool, report: Callable[[str], Awaitable]):
+    """Start tracking a map change; a newer change on the same server replaces it."""
+    old = _tracking.pop(server["id"], None)
+    if old:
+        old.cancel()
+    task = asyncio.create_task(_track(server, map_name, workshop, report))
+    _tracking[server["id"]] = task
+    task.add_done_callback(lambda t: _tracking.pop(server["id"], None) if _tracking.get(server["id"]) is t else None)
+    return task
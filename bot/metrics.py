@@ -0,0 +1,156 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process metrics: counters and fixed-bucket histograms, rendered in the
+# Prometheus text format by an optional local HTTP endpoint. Recording is a
+# dict lookup and a few additions; the series dicts are only iterated when
+# /metrics is scraped. Updates come from the event loop and from to_thread
+# workers, so new series are created under a lock (increments of existing
+# series are plain Python ops and tolerate the rare lost update).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_SERIES = 500  # per metric; label sets past this are folded into "other"
+
+_lock = threading.Lock()
+_registry: dict[str, "_Metric"] = {}
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...]):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.series: dict[tuple, object] = {}
+
+    def _key(self, values: tuple) -> tuple:
+        if values in self.series or len(self.series) < MAX_SERIES:
+            return values
+        return ("other",) * len(self.labels)
+
+    def _labels(self, values: tuple, le: str | None = None) -> str:
+        parts = [f'{k}="{_escape(str(v))}"' for k, v in zip(self.labels, values)]
+        if le is not None:
+            parts.append(f'le="{le}"')
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        try:
+            self.series[key] += amount
+        except KeyError:
+            with _lock:
+                self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{self._labels(k)} {_num(v)}" for k, v in self.series.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...], buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        s = self.series.get(key)
+        if s is None:
+            with _lock:
+                s = self.series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        s[0][bisect.bisect_left(self.buckets, value)] += 1
+        s[1] += value
+        s[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> list[str]:
+        out = []
+        for k, (counts, total, n) in list(self.series.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                out.append(f"{self.name}_bucket{self._labels(k, le)} {cumulative}")
+            out.append(f"{self.name}_sum{self._labels(k)} {_num(total)}")
+            out.append(f"{self.name}_count{self._labels(k)} {n}")
+        return out
+
+
+def counter(name: str, doc: str, labels: tuple[str, ...] = ()) -> Counter:
+    return _register(Counter, name, doc, labels)
+
+
+def histogram(name: str, doc: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram, name, doc, labels, buckets)
+
+
+def _register(cls, name, doc, labels, *args):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, doc, tuple(labels), *args)
+        return metric
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in list(_registry.values()):
+        lines.append(f"# HELP {metric.name} {metric.doc}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def serve(host: str, port: int):
+    """Expose GET /metrics on host:port; returns the aiohttp runner."""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info("Metrics on http://%s:%d/metrics", host, port)
+    return runner
+
+
+# ── Shared metrics ──────────────────────────────────────────────────
+
+rcon_seconds = histogram("bot_rcon_request_seconds", "RCON command time, connect to last packet",
+                         ("server", "command"))
+rcon_rtt = histogram("bot_rcon_rtt_seconds", "RCON auth round trip, the per-server RTT sample", ("server",))
+rcon_errors = counter("bot_rcon_errors_total", "Failed RCON commands by reason", ("server", "reason"))
+db_seconds = histogram("bot_db_call_seconds", "SQLite call time", ("op",))
+handler_seconds = histogram("bot_handler_seconds", "Telegram handler time", ("event", "handler"))
+handler_errors = counter("bot_handler_errors_total", "Telegram handlers that raised", ("event", "handler"))
+a2s_seconds = histogram("bot_a2s_query_seconds", "A2S UDP query time", ("query",))
+a2s_errors = counter("bot_a2s_errors_total", "Failed A2S queries by reason", ("query", "reason"))
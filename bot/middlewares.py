@@ -0,0 +1,141 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+import callbacks
+import metrics
+import prefetch
+import profiling
+import throttle
+
+
+class HandlerMetrics(BaseMiddleware):
+    """Inner middleware: time each matched handler, labeled by its function name."""
+
+    def __init__(self, event: str):
+        self.event = event
+
+    async def __call__(self, handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: dict[str, Any]) -> Any:
+        obj = data.get("handler")
+        name = obj.callback.__name__ if obj else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.handler_errors.inc(self.event, name)
+            raise
+        finally:
+            metrics.handler_seconds.observe(time.perf_counter() - started, self.event, name)
+
+
+class UpdateProfiler(BaseMiddleware):
+    """Outer update middleware: end-to-end time split into db / rcon / api spans.
+
+    Updates slower than slow_ms go to profiling.slow_log; every Nth update
+    is run under cProfile when sampling is enabled.
+    """
+
+    def __init__(self, slow_ms: float, sampler: profiling.Sampler):
+        self.slow = slow_ms / 1000
+        self.sampler = sampler
+
+    async def __call__(self, handler, event: Update, data: dict[str, Any]) -> Any:
+        spans = profiling.begin()
+        profile = self.sampler.start()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            total = time.perf_counter() - started
+            if profile:
+                self.sampler.stop(profile)
+            if total >= self.slow:
+                user = data.get("event_from_user")
+                profiling.record_slow(_describe(event), user.id if user else None, total, spans)
+
+
+class CallbackDecoder(BaseMiddleware):
+    """Outer update middleware: decodes callback_data once into data["cbd"] for callbacks.Op filters."""
+
+    async def __call__(self, handler, event: Update, data: dict[str, Any]) -> Any:
+        if event.callback_query:
+            data["cbd"] = callbacks.decode(event.callback_query.data)
+        return await handler(event, data)
+
+
+class PrefetchGuard(BaseMiddleware):
+    """Outer update middleware: a user's message or callback about another server cancels their prefetch."""
+
+    async def __call__(self, handler, event: Update, data: dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user and (event.message or event.callback_query):
+            cbd = data.get("cbd")
+            prefetch.cancel(user.id, cbd.server_id if cbd else None)
+        return await handler(event, data)
+
+
+class ThrottleGuard(BaseMiddleware):
+    """Outer update middleware: token-bucket limits on updates that reach a game server.
+
+    Rejected callbacks get a "slow down" answer, rejected typed commands one
+    reply per wait; the input state is kept so the text can simply be resent.
+    """
+
+    def __init__(self, limits: throttle.Throttle):
+        self.limits = limits
+
+    async def __call__(self, handler, event: Update, data: dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user and event.callback_query:
+            cbd = data.get("cbd")
+            if throttle.costly(cbd):
+                wait, scope = self.limits.admit(user.id, cbd.server_id)
+                if wait:
+                    return await event.callback_query.answer(throttle.slow_down(wait, scope))
+        elif user and event.message and data.get("raw_state") in throttle.RCON_STATES:
+            text = event.message.text or ""
+            # /cancel, other commands and "menu" are handled ahead of the input states
+            if text and not text.startswith("/") and text.lower() != "menu":
+                server_id = (await data["state"].get_data()).get("server_id")
+                wait, scope = self.limits.admit(user.id, server_id)
+                if wait:
+                    if self.limits.should_warn(user.id, wait):
+                        await event.message.answer(throttle.slow_down(wait, scope))
+                    return None
+        return await handler(event, data)
+
+
+class ApiTimer(BaseRequestMiddleware):
+    """Bot session middleware: adds Telegram API call time to the update's spans."""
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            profiling.add("api", time.perf_counter() - started)
+
+
+def _describe(update: Update) -> str:
+    if update.message:
+        return f"message {(update.message.text or update.message.content_type)[:40]!r}"
+    if update.callback_query:
+        return f"callback {update.callback_query.data!r}"
+    if update.inline_query:
+        return f"inline {update.inline_query.query[:40]!r}"
+    return update.event_type
+
+
+def setup(dp, slow_ms: float = 1000, profile_every: int = 0, profile_path: str = "profile.pstats",
+          limits: throttle.Throttle | None = None):
+    dp.update.outer_middleware(UpdateProfiler(slow_ms, profiling.Sampler(profile_every, profile_path)))
+    dp.update.outer_middleware(CallbackDecoder())
+    if limits:
+        dp.update.outer_middleware(ThrottleGuard(limits))
+    dp.update.outer_middleware(PrefetchGuard())
+    for event in ("message", "callback_query", "inline_query"):
+        dp.observers[event].middleware(HandlerMetrics(event))
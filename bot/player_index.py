@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from typing import NamedTuple
+
+import database as db
+import sharding
+from log_parser import LogEvent
+
+# Who is (and was) on each server. Fed by log events (connect / validated /
+# disconnect, with SteamIDs) and by status snapshots (css_status_json has
+# SteamIDs, console `status` only names and userids). Players are keyed by
+# SteamID when known, otherwise by name. Closed sessions are buffered and
+# appended to SQLite in batches together with a snapshot of the online
+# players, so other workers and restarts see them too. Only the worker that
+# owns a server (and receives its logs) keeps its entries and closes its
+# sessions, so two copies of the index never close the same session twice.
+# Other workers read that snapshot, and a status check they run replaces it
+# (without touching sessions). Times are when the bot observed the change,
+# not server clock.
+
+FLUSH_INTERVAL = 5.0
+BATCH_SIZE = 200
+
+
+class Online(NamedTuple):
+    name: str
+    steamid: str | None
+    userid: int | None
+    joined_at: float
+
+
+_online: dict[int, dict[str, Online]] = {}
+_pending: list[tuple] = []
+_dirty: set[int] = set()
+_observed: dict[int, list[tuple]] = {}  # status snapshots of servers another worker owns
+
+
+def player_key(name: str, steamid: str | None) -> str:
+    return steamid or f"name:{name}"
+
+
+def _players(server_id: int) -> dict[str, Online]:
+    """In-memory players of a server, seeded from the stored snapshot after a restart."""
+    players = _online.get(server_id)
+    if players is None:
+        players = _online[server_id] = {
+            r["player_key"]: Online(r["name"], r["steamid"], r["userid"], r["joined_at"])
+            for r in db.get_players_online(server_id)
+        }
+    return players
+
+
+def _find(players: dict[str, Online], name: str, userid: int | None) -> str | None:
+    for key, p in players.items():
+        if (userid is not None and p.userid == userid) or p.name == name:
+            return key
+    return None
+
+
+def join(server_id: int, name: str, steamid: str | None = None, userid: int | None = None,
+         now: float | None = None):
+    if not sharding.owns_server(server_id):
+        return
+    now = time.time() if now is None else now
+    players = _players(server_id)
+    key = player_key(name, steamid)
+    old_key = key if key in players else _find(players, name, userid)
+    if old_key is not None:
+        # Known already: keep the join time, fill in what we learned
+        old = players.pop(old_key)
+        if steamid is None:
+            key = old_key
+        players[key] = Online(name, steamid or old.steamid,
+                              userid if userid is not None else old.userid, old.joined_at)
+    else:
+        players[key] = Online(name, steamid, userid, now)
+    _dirty.add(server_id)
+
+
+def leave(server_id: int, name: str | None = None, steamid: str | None = None,
+          userid: int | None = None, now: float | None = None):
+    if not sharding.owns_server(server_id):
+        return
+    players = _players(server_id)
+    key = steamid if steamid in players else _find(players, name, userid)
+    if key is None:
+        return
+    p = players.pop(key)
+    _close(server_id, key, p, time.time() if now is None else now)
+
+
+def _close(server_id: int, key: str, p: Online, now: float):
+    _pending.append((server_id, key, p.name, p.steamid, p.joined_at, now))
+    _dirty.add(server_id)
+
+
+def on_event(event: LogEvent):
+    """log_receiver listener."""
+    if event.server_id is None or event.kind not in ("connect", "validated", "disconnect"):
+        return
+    d = event.data
+    if d.get("bot"):
+        return
+    if event.kind == "disconnect":
+        leave(event.server_id, d["name"], d.get("steamid"), d.get("userid"))
+    else:
+        join(event.server_id, d["name"], d.get("steamid"), d.get("userid"))
+
+
+def observe_status(server_id: int, players: list[dict], now: float | None = None):
+    """Reconcile with a parsed status snapshot ({"userid", "name", "steamid"?} per player)."""
+    now = time.time() if now is None else now
+    if not sharding.owns_server(server_id):
+        # The online snapshot is replaced per server as a whole, so it is safe
+        # to write from here; sessions are left to the owner
+        _observed[server_id] = [(player_key(p["name"], p.get("steamid")), p["name"], p.get("steamid"),
+                                 p.get("userid"), now) for p in players]
+        return
+    current = _players(server_id)
+    seen = set()
+    for p in players:
+        join(server_id, p["name"], p.get("steamid"), p.get("userid"), now=now)
+        seen.add(_find(current, p["name"], p.get("userid")))
+    for key in [k for k in current if k not in seen]:
+        _close(server_id, key, current.pop(key), now)
+    _dirty.add(server_id)
+
+
+def online(server_id: int) -> list[dict]:
+    """Currently connected players, without asking the server."""
+    if server_id in _observed:
+        keys = ("player_key", "name", "steamid", "userid", "joined_at")
+        return [dict(zip(keys, row)) for row in _observed[server_id]]
+    if server_id not in _online:
+        # Another process may be the one receiving this server's logs
+        return db.get_players_online(server_id)
+    return [{"player_key": k, **p._asdict()} for k, p in _online[server_id].items()]
+
+
+# ── Persistence ─────────────────────────────────────────────────────
+
+def _take_batch() -> tuple[list[tuple], dict[int, list[tuple]], dict[int, list[tuple]]]:
+    sessions = _pending[:]
+    _pending.clear()
+    snapshot = {
+        sid: [(k, p.name, p.steamid, p.userid, p.joined_at) for k, p in _online[sid].items()]
+        for sid in _dirty if sid in _online
+    }
+    _dirty.clear()
+    observed = dict(_observed)
+    _observed.clear()
+    return sessions, snapshot, observed
+
+
+def flush():
+    sessions, snapshot, observed = _take_batch()
+    if sessions or snapshot or observed:
+        db.append_player_sessions(sessions, snapshot, observed)
+
+
+async def release():
+    """After a membership change: write out and forget the servers another worker owns now."""
+    batch = _take_batch()
+    for server_id in [sid for sid in _online if not sharding.owns_server(sid)]:
+        del _online[server_id]
+    await _store(*batch)
+
+
+async def _store(sessions: list[tuple], snapshot: dict[int, list[tuple]], observed: dict[int, list[tuple]]):
+    if not (sessions or snapshot or observed):
+        return
+    try:
+        await asyncio.to_thread(db.append_player_sessions, sessions, snapshot, observed)
+    except Exception as e:
+        logging.warning("Could not store player sessions: %s", e)
+        _pending[:0] = sessions
+        _dirty.update(snapshot)
+        for server_id, rows in observed.items():
+            _observed.setdefault(server_id, rows)
+
+
+async def run_flusher():
+    """Write buffered sessions every FLUSH_INTERVAL, or sooner once BATCH_SIZE pile up."""
+    waited = 0.0
+    while True:
+        await asyncio.sleep(0.5)
+        waited += 0.5
+        if len(_pending) < BATCH_SIZE and waited < FLUSH_INTERVAL:
+            continue
+        waited = 0.0
+        await _store(*_take_batch())
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+import metrics
+
+# Speculative server-state fetch. Opening a server panel starts the status
+# round trip in the background; when it lands the panel is edited in place,
+# and the Status button right after reuses the result instead of asking the
+# server again. One prefetch per user: opening another panel or doing
+# anything not about that server cancels it. Cancelling drops the result; a
+# request already running in a worker thread still finishes on its own.
+
+FRESH = 20.0  # seconds a finished prefetch may stand in for a Status press
+
+outcomes = metrics.counter("bot_prefetch_total", "Panel prefetches by outcome: started, hit (ready), "
+                           "joined (still running), miss, stale, failed, cancelled, unused", ("outcome",))
+
+
+class _Entry:
+    __slots__ = ("server_id", "task", "done_at", "on_ready")
+
+    def __init__(self, server_id: int, on_ready):
+        self.server_id = server_id
+        self.on_ready = on_ready
+        self.done_at = 0.0
+        self.task: asyncio.Task | None = None
+
+
+_entries: dict[int, _Entry] = {}  # telegram id -> latest prefetch
+_pruned = 0.0
+_replays: set[asyncio.Task] = set()  # on_ready calls for an already finished fetch
+
+
+async def _deliver(on_ready: Callable[[dict], Awaitable], result: dict):
+    try:
+        await on_ready(result)
+    except Exception as e:
+        logging.debug("Prefetch callback failed: %s", e)
+
+
+async def _run(entry: _Entry, fetch: Callable[[], dict]) -> dict:
+    try:
+        result = await asyncio.to_thread(fetch)
+    except Exception:
+        outcomes.inc("failed")
+        raise
+    entry.done_at = time.monotonic()
+    if entry.on_ready:
+        await _deliver(entry.on_ready, result)
+    return result
+
+
+def _fresh(entry: _Entry) -> bool:
+    task = entry.task
+    if not task.done():
+        return True
+    return (not task.cancelled() and task.exception() is None
+            and time.monotonic() - entry.done_at <= FRESH)
+
+
+def _prune(now: float):
+    """Drop finished prefetches too old to use, for users who never pressed anything after."""
+    global _pruned
+    _pruned = now
+    for telegram_id, entry in list(_entries.items()):
+        if entry.task.done() and not _fresh(entry):
+            del _entries[telegram_id]
+            outcomes.inc("unused")
+
+
+def reusable(telegram_id: int, server_id: int) -> bool:
+    """Whether start() for this panel would reuse a running or fresh fetch instead of asking the server."""
+    entry = _entries.get(telegram_id)
+    return bool(entry and entry.server_id == server_id and _fresh(entry))
+
+
+def start(telegram_id: int, server_id: int, fetch: Callable[[], dict],
+          on_ready: Callable[[dict], Awaitable] | None = None):
+    """Begin fetching for a just-opened panel; on_ready(result) is awaited when it lands."""
+    if reusable(telegram_id, server_id):
+        # Panel reopened: keep the running or fresh fetch, redirect the callback
+        entry = _entries[telegram_id]
+        entry.on_ready = on_ready
+        if entry.task.done() and on_ready:
+            task = asyncio.create_task(_deliver(on_ready, entry.task.result()))
+            _replays.add(task)
+            task.add_done_callback(_replays.discard)
+        return
+    cancel(telegram_id)
+    now = time.monotonic()
+    if now - _pruned >= FRESH:
+        _prune(now)
+    entry = _Entry(server_id, on_ready)
+    entry.task = asyncio.create_task(_run(entry, fetch))
+    entry.task.add_done_callback(lambda t: t.cancelled() or t.exception())  # exceptions are reported via take()
+    _entries[telegram_id] = entry
+    outcomes.inc("started")
+
+
+async def take(telegram_id: int, server_id: int) -> dict | None:
+    """The prefetched result for this panel, waiting for it if still running; None = fetch yourself."""
+    entry = _entries.get(telegram_id)
+    if not entry or entry.server_id != server_id:
+        outcomes.inc("miss")
+        return None
+    del _entries[telegram_id]
+    entry.on_ready = None  # the caller renders the result itself
+    task = entry.task
+    if task.done():
+        if task.cancelled() or task.exception() is not None:
+            outcomes.inc("miss")
+            return None
+        if time.monotonic() - entry.done_at > FRESH:
+            outcomes.inc("stale")
+            return None
+        outcomes.inc("hit")
+        return task.result()
+    outcomes.inc("joined")
+    try:
+        return await task
+    except Exception:
+        return None
+
+
+def cancel(telegram_id: int, keep_server: int | None = None):
+    """Drop the user's prefetch unless it is for keep_server."""
+    entry = _entries.get(telegram_id)
+    if not entry or entry.server_id == keep_server:
+        return
+    del _entries[telegram_id]
+    if not entry.task.done():
+        entry.task.cancel()
+        outcomes.inc("cancelled")
+    else:
+        outcomes.inc("unused")
+
@@ -0,0 +1,93 @@
+import cProfile
+import logging
+import os
+import pstats
+import time
+from collections import deque
+from contextvars import ContextVar
+
+# Per-update time breakdown. The update middleware puts a fresh span dict in
+# a context variable; database, RCON and Telegram API calls add their time
+# to it. The dict is shared with asyncio.to_thread workers (they copy the
+# context), so blocking calls made off the loop are counted too. Spans of
+# concurrent calls are summed, so db + rcon + api can exceed the total.
+
+SLOW_LOG_SIZE = 100
+
+_spans: ContextVar[dict | None] = ContextVar("profiling_spans", default=None)
+slow_log: deque[dict] = deque(maxlen=SLOW_LOG_SIZE)
+
+
+def add(kind: str, seconds: float):
+    spans = _spans.get()
+    if spans is not None:
+        spans[kind] = spans.get(kind, 0.0) + seconds
+        spans[kind + "_calls"] = spans.get(kind + "_calls", 0) + 1
+
+
+def begin() -> dict:
+    spans: dict = {}
+    _spans.set(spans)
+    return spans
+
+
+def record_slow(description: str, user_id: int | None, total: float, spans: dict):
+    slow_log.append({
+        "at": time.time(),
+        "update": description,
+        "user_id": user_id,
+        "total": total,
+        **spans,
+    })
+
+
+# ── cProfile sampling ───────────────────────────────────────────────
+
+class Sampler:
+    """Profile every Nth update and keep aggregated stats in a .pstats file.
+
+    The profiler sees everything the event loop runs while the sampled
+    update is in flight, so concurrent updates leak into samples a little.
+    """
+
+    def __init__(self, every: int, path: str, dump_every: int = 10):
+        self.every = every
+        self.path = path
+        self.dump_every = dump_every
+        self.seen = 0
+        self.samples = 0
+        self.active = False
+        self.stats: pstats.Stats | None = None
+
+    def start(self) -> cProfile.Profile | None:
+        self.seen += 1
+        if self.every <= 0 or self.active or self.seen % self.every:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is already running
+            return None
+        self.active = True
+        return profile
+
+    def stop(self, profile: cProfile.Profile):
+        profile.disable()
+        self.active = False
+        self.samples += 1
+        if self.stats is None:
+            self.stats = pstats.Stats(profile)
+        else:
+            self.stats.add(profile)
+        if self.samples % self.dump_every == 0:
+            self.dump()
+
+    def dump(self):
+        if self.stats is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.stats.dump_stats(self.path)
+            logging.info("Profile of %d sampled updates written to %s", self.samples, self.path)
+        except OSError as e:
+            logging.warning("Could not write profile: %s", e)
@@ -1,9 +1,23 @@
+import codecs
 import socket
 import struct
+import time
+
+import metrics
+import profiling
+import rtt
 
 SERVERDATA_AUTH = 3
 SERVERDATA_EXECCOMMAND = 2
 
+# The protocol has no end-of-response marker: after the last packet we wait
+# this long for more. Also how long to wait for the extra post-auth packet.
+# These are the values for servers without an RTT estimate yet; measured
+# servers get timeouts from rtt.timeouts() instead.
+TIMEOUT = 5.0
+RESPONSE_IDLE = 2.0
+AUTH_EXTRA_WAIT = 0.5
+
 
 def _pack(request_id: int, pkt_type: int, body: str) -> bytes:
     body_bytes = body.encode("utf-8") + b"\x00\x00"
@@ -12,63 +26,142 @@ def _pack(request_id: int, pkt_type: int, body: str) -> bytes:
 
 
 def _read(sock: socket.socket):
-    raw = b""
-    while len(raw) < 4:
-        chunk = sock.recv(4 - len(raw))
-        if not chunk:
-            raise ConnectionError("Connection closed")
-        raw += chunk
-    size = struct.unpack("<i", raw)[0]
-    data = b""
+    request_id, pkt_type, body = _read_packet(sock)
+    return request_id, pkt_type, body.decode("utf-8", errors="replace")
+
+
+class TruncatedPacket(ConnectionError):
+    """The server went quiet partway through a packet."""
+
+
+def _recv(sock: socket.socket, size: int, data: bytes = b"") -> bytes:
     while len(data) < size:
         chunk = sock.recv(size - len(data))
         if not chunk:
             raise ConnectionError("Connection closed")
         data += chunk
+    return data
+
+
+def _read_packet(sock: socket.socket, rest_timeout: float | None = None):
+    """Read one packet. A timeout before its first byte means no packet came and
+    is raised as is; once it has started, the rest gets `rest_timeout` (default:
+    the socket's current one) and a timeout is a TruncatedPacket.
+    """
+    first = sock.recv(4)
+    if not first:
+        raise ConnectionError("Connection closed")
+    if rest_timeout is not None:
+        sock.settimeout(rest_timeout)
+    try:
+        raw = _recv(sock, 4, first)
+        size = struct.unpack("<i", raw)[0]
+        data = _recv(sock, size)
+    except socket.timeout:
+        raise TruncatedPacket("Response cut off mid-packet") from None
     request_id = struct.unpack("<i", data[0:4])[0]
     pkt_type = struct.unpack("<i", data[4:8])[0]
-    body = data[8:-2].decode("utf-8", errors="replace")
-    return request_id, pkt_type, body
+    return request_id, pkt_type, data[8:-2]
 
 
-def execute(host: str, port: int, password: str, command: str, timeout: float = 5.0) -> str:
+def execute(host: str, port: int, password: str, command: str, timeout: float | None = None) -> str:
     """Execute a single RCON command on a remote CS2 server."""
+    return "".join(execute_stream(host, port, password, command, timeout)).strip()
+
+
+def execute_stream(host: str, port: int, password: str, command: str, timeout: float | None = None):
+    """Execute an RCON command, yielding the response text packet by packet.
+
+    Bodies are decoded incrementally, so a UTF-8 character split across two
+    packets is not mangled. The socket is closed when the generator finishes.
+    Timeouts follow the server's measured RTT; `timeout` overrides the
+    connect / command one.
+    """
+    server = f"{host}:{port}"
+    limits = rtt.timeouts(host, port, TIMEOUT, AUTH_EXTRA_WAIT, RESPONSE_IDLE)
+    late = False  # the first packet missed its window; the backoff is applied already
+    started = time.perf_counter()
+    busy = 0.0  # time spent in here, not in the consumer between packets
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(timeout)
+    sock.settimeout(timeout or limits.connect)
     try:
         sock.connect((host, port))
 
-        # Authenticate
+        # Authenticate; the auth round trip is the RTT sample
+        sent = time.perf_counter()
         sock.sendall(_pack(1, SERVERDATA_AUTH, password))
         rid, _, _ = _read(sock)
+        rtt.sample(host, port, time.perf_counter() - sent)
         if rid == -1:
             raise PermissionError("RCON authentication failed — wrong password")
         # Some servers send an extra empty packet after auth
         try:
-            sock.settimeout(0.5)
+            sock.settimeout(limits.auth_extra)
             _read(sock)
         except socket.timeout:
             pass
 
         # Execute
-        sock.settimeout(timeout)
+        sock.settimeout(timeout or limits.connect)
         sock.sendall(_pack(2, SERVERDATA_EXECCOMMAND, command))
 
-        # Read response (may be multi-packet)
-        response = ""
-        sock.settimeout(2)
+        # Read response (may be multi-packet). The short windows only decide
+        # whether another packet is coming; a packet that has started gets the
+        # command timeout to arrive in full.
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        rest = timeout or limits.connect
+        sock.settimeout(limits.first_packet)
         try:
-            while True:
-                _, _, body = _read(sock)
-                response += body
+            _, _, body = _read_packet(sock, rest)
         except socket.timeout:
-            pass
-        return response.strip()
+            # Slower than the estimate allows (map load, tick hitch): widen the
+            # server's windows and give the reply the full command timeout
+            metrics.rcon_errors.inc(server, "late")
+            rtt.timed_out(host, port)
+            late = True
+            sock.settimeout(timeout or TIMEOUT)
+            _, _, body = _read_packet(sock, rest)
+        while True:
+            text = decoder.decode(body)
+            if text:
+                busy += time.perf_counter() - started
+                yield text
+                started = time.perf_counter()
+            sock.settimeout(limits.idle)
+            try:
+                _, _, body = _read_packet(sock, rest)
+            except socket.timeout:
+                break  # no packet started within the idle window: response complete
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+    except PermissionError:
+        metrics.rcon_errors.inc(server, "auth")
+        raise
+    except socket.timeout:
+        metrics.rcon_errors.inc(server, "timeout")
+        if not late:
+            rtt.timed_out(host, port)
+        raise
+    except TruncatedPacket:
+        metrics.rcon_errors.inc(server, "truncated")
+        raise
+    except OSError:
+        metrics.rcon_errors.inc(server, "connection")
+        raise
     finally:
         sock.close()
+        busy += time.perf_counter() - started
+        metrics.rcon_seconds.observe(busy, server, _command_label(command))
+        profiling.add("rcon", busy)
 
 
-def test_connection(host: str, port: int, password: str, timeout: float = 5.0) -> tuple[bool, str]:
+def _command_label(command: str) -> str:
+    words = command.split(None, 1)
+    return words[0].lower()[:32] if words else ""
+
+
+def test_connection(host: str, port: int, password: str, timeout: float | None = None) -> tuple[bool, str]:
     """Test RCON connection. Returns (ok, message)."""
     try:
         result = execute(host, port, password, "status", timeout)
@@ -77,3 +170,25 @@ def test_connection(host: str, port: int, password: str, timeout: float = 5.0) -
         return False, str(e)
     except Exception as e:
         return False, f"{type(e).__name__}: {e}"
+
+
+def check_auth(host: str, port: int, password: str, timeout: float = 3.0) -> tuple[bool, str]:
+    """Connect and authenticate without running a command. Returns (ok, message)."""
+    try:
+        sock = socket.create_connection((host, port), timeout)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+    try:
+        sent = time.perf_counter()
+        sock.sendall(_pack(1, SERVERDATA_AUTH, password))
+        rid, pkt_type, _ = _read(sock)
+        rtt.sample(host, port, time.perf_counter() - sent)
+        if pkt_type == 0:  # empty RESPONSE_VALUE some servers send before the auth reply
+            rid, _, _ = _read(sock)
+        if rid == -1:
+            return False, "RCON authentication failed — wrong password"
+        return True, "ok"
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+    finally:
+        sock.close()
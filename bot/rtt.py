@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import NamedTuple
+
+import database as db
+import metrics
+
+# Per-server RCON round-trip estimate and the timeouts derived from it.
+# Same estimator as TCP's retransmission timer (RFC 6298): a smoothed RTT
+# and a mean deviation, each an EWMA of the auth round trip, with the
+# timeout scale doubled on every timeout and reset by the next good sample.
+# Servers without an estimate get the fixed defaults the client always used.
+# Estimates are kept in SQLite so a restart does not start from scratch.
+
+ALPHA = 1 / 8   # gain of the smoothed RTT
+BETA = 1 / 4    # gain of the deviation
+MAX_BACKOFF = 8
+
+# Floors and ceilings, seconds
+MIN_TIMEOUT, MAX_TIMEOUT = 1.0, 15.0      # connect, auth reply, command
+MIN_AUTH_EXTRA = 0.05                     # ceiling is the fixed default
+# The response windows also cover server-side work (a command runs on the next
+# tick, status walks every client), not just the network, so their floors sit
+# well above a LAN round trip. A first packet later than its window is waited
+# for up to the command timeout and widens the windows (see rcon_client).
+MIN_FIRST_PACKET, MAX_IDLE = 1.0, 4.0     # first response packet / gaps between packets
+MIN_IDLE = 0.5
+COMMAND_SLACK = 0.5                       # server-side processing before the first packet
+
+SAVE_INTERVAL = 60.0
+ADAPTIVE = True
+
+
+class Timeouts(NamedTuple):
+    connect: float       # TCP connect, auth reply, sending the command
+    auth_extra: float    # the optional extra packet after auth
+    first_packet: float  # first packet of the command's response
+    idle: float          # gap after which the response is taken as complete
+
+
+class _Estimate:
+    __slots__ = ("srtt", "rttvar", "samples", "backoff")
+
+    def __init__(self, srtt: float, rttvar: float, samples: int = 0):
+        self.srtt = srtt
+        self.rttvar = rttvar
+        self.samples = samples
+        self.backoff = 1
+
+    def rto(self) -> float:
+        return (self.srtt + 4 * self.rttvar) * self.backoff
+
+
+_estimates: dict[tuple[str, int], _Estimate] = {}
+_dirty: set[tuple[str, int]] = set()
+_lock = threading.Lock()
+
+
+def _clamp(value: float, lo: float, hi: float) -> float:
+    return max(lo, min(hi, value))
+
+
+def timeouts(host: str, port: int, default: float, auth_extra: float, idle: float) -> Timeouts:
+    """Timeouts for the next command; the given fixed values apply until the server has an estimate."""
+    est = _estimates.get((host, port)) if ADAPTIVE else None
+    if est is None:
+        return Timeouts(default, auth_extra, idle, idle)
+    rto = est.rto()
+    return Timeouts(
+        connect=_clamp(4 * rto, MIN_TIMEOUT, MAX_TIMEOUT),
+        auth_extra=_clamp(rto, MIN_AUTH_EXTRA, auth_extra),
+        first_packet=_clamp(2 * rto + COMMAND_SLACK, MIN_FIRST_PACKET, MAX_IDLE),
+        idle=_clamp(2 * rto, MIN_IDLE, MAX_IDLE),
+    )
+
+
+def sample(host: str, port: int, seconds: float):
+    """Feed one measured round trip."""
+    key = (host, port)
+    with _lock:
+        est = _estimates.get(key)
+        if est is None:
+            est = _estimates[key] = _Estimate(seconds, seconds / 2)
+        else:
+            est.rttvar += BETA * (abs(est.srtt - seconds) - est.rttvar)
+            est.srtt += ALPHA * (seconds - est.srtt)
+            est.backoff = 1
+        est.samples += 1
+        _dirty.add(key)
+    metrics.rcon_rtt.observe(seconds, f"{host}:{port}")
+
+
+def timed_out(host: str, port: int):
+    """A timeout: widen this server's timeouts until the next good sample."""
+    with _lock:
+        est = _estimates.get((host, port))
+        if est is not None:
+            est.backoff = min(est.backoff * 2, MAX_BACKOFF)
+
+
+def estimate(host: str, port: int) -> tuple[float, float] | None:
+    """(srtt, rttvar) in seconds, or None if the server has not been measured."""
+    est = _estimates.get((host, port))
+    return (est.srtt, est.rttvar) if est else None
+
+
+# ── Persistence ─────────────────────────────────────────────────────
+
+def load():
+    rows = db.get_rcon_rtt()
+    with _lock:
+        for r in rows:
+            _estimates.setdefault((r["host"], r["port"]), _Estimate(r["srtt"], r["rttvar"], r["samples"]))
+
+
+def save():
+    with _lock:
+        rows = [(h, p, e.srtt, e.rttvar, e.samples) for (h, p) in _dirty
+                if (e := _estimates.get((h, p)))]
+        _dirty.clear()
+    if rows:
+        db.save_rcon_rtt(rows)
+
+
+async def run_saver():
+    while True:
+        await asyncio.sleep(SAVE_INTERVAL)
+        try:
+            await asyncio.to_thread(save)
+        except Exception as e:
+            logging.warning("Could not store RCON RTT estimates: %s", e)
@@ -0,0 +1,300 @@
+import asyncio
+import heapq
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+import catalog
+import database as db
+import rcon_client as rcon
+import sharding
+from config import SCHEDULE_TZ
+
+# Scheduled RCON actions. Schedules live in SQLite; one task keeps a heap of
+# (next_run, schedule_id) and sleeps until the earliest is due. A run is
+# claimed with a compare-and-set on next_run before anything is sent, so a
+# restart, a reload or a second scheduler process can never fire the same
+# run twice. Runs missed while the bot was down are coalesced into one
+# catch-up run if they are at most CATCHUP_WINDOW old, otherwise skipped.
+# With several workers each one runs the schedules of the servers it owns.
+
+CATCHUP_WINDOW = 6 * 3600
+RELOAD_INTERVAL = 60.0   # picks up schedules added by other worker processes
+MAX_PARALLEL = 16        # actions running at once
+
+ACTIONS = ("restart", "warmup", "mode", "rotate", "rcon")
+TZ = ZoneInfo(SCHEDULE_TZ)
+
+
+# ── Cron expressions ────────────────────────────────────────────────
+
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(text: str, lo: int, hi: int) -> frozenset[int]:
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"bad step in {text!r}")
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            a, b = part.split("-", 1)
+            start, end = int(a), int(b)
+        else:
+            start = int(part)
+            end = hi if step > 1 else start
+        if not (lo <= start <= end <= hi):
+            raise ValueError(f"{text!r} is out of range {lo}-{hi}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class Cron:
+    """Standard 5-field cron: minute hour day-of-month month day-of-week (0 = Sunday)."""
+
+    def __init__(self, expr: str):
+        self.expr = expr.strip()
+        fields = _ALIASES.get(self.expr, self.expr).split()
+        if len(fields) != 5:
+            raise ValueError("cron needs 5 fields: minute hour day month weekday")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _FIELDS)
+        )
+        self.weekdays = frozenset(d % 7 for d in weekdays)  # 7 is Sunday too
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_ok(self, t: datetime) -> bool:
+        dom = t.day in self.days
+        dow = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return dom and dow
+        return dom or dow  # both restricted: either matches (cron semantics)
+
+    def next(self, after: datetime) -> datetime:
+        """First matching minute strictly after `after` (naive or aware wall clock)."""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_ok(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron {self.expr!r} never fires")
+
+
+def next_run(cron: str, after: float | None = None) -> float:
+    """Epoch of the first cron match after `after` (default now), in SCHEDULE_TZ."""
+    start = datetime.fromtimestamp(time.time() if after is None else after, TZ)
+    return Cron(cron).next(start.replace(tzinfo=None)).replace(tzinfo=TZ).timestamp()
+
+
+def parse_at(text: str) -> float:
+    """One-off time: 2025-12-24T20:00 or 20:00 (next occurrence), in SCHEDULE_TZ."""
+    now = datetime.now(TZ)
+    if "T" in text or "-" in text:
+        t = datetime.fromisoformat(text.replace(" ", "T")).replace(tzinfo=TZ)
+    else:
+        hour, minute = (int(x) for x in text.split(":"))
+        t = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if t <= now:
+            t += timedelta(days=1)
+    if t <= now:
+        raise ValueError("that time has already passed")
+    return t.timestamp()
+
+
+# ── Actions ─────────────────────────────────────────────────────────
+
+def validate_action(action: str, arg: str) -> dict:
+    """Check an action and its argument; return the payload to store."""
+    if action == "restart":
+        return {}
+    if action == "warmup":
+        return {"seconds": int(arg) if arg else 90}
+    if action in ("mode", "rotate"):
+        cat = catalog.get()
+        if arg not in cat.game_modes:
+            raise ValueError(f"unknown mode {arg!r}")
+        if action == "rotate" and not cat.mode_ids.get(arg):
+            raise ValueError(f"mode {arg!r} has no maps to rotate through")
+        return {"mode": arg, "pos": 0} if action == "rotate" else {"mode": arg}
+    if action == "rcon":
+        if not arg:
+            raise ValueError("rcon needs a command")
+        return {"command": arg}
+    raise ValueError(f"unknown action {action!r}; use one of {', '.join(ACTIONS)}")
+
+
+def action_command(action: str, payload: dict) -> tuple[str, dict]:
+    """RCON command for a run, and the payload to store after it."""
+    if action == "restart":
+        return "mp_restartgame 1", payload
+    if action == "warmup":
+        return f"mp_warmuptime {payload['seconds']}; mp_warmup_pausetimer 0; mp_warmup_start", payload
+    if action == "mode":
+        command = catalog.get().game_modes.get(payload["mode"])
+        if command is None:
+            raise ValueError(f"mode {payload['mode']!r} is no longer in the map catalog")
+        return command, payload
+    if action == "rotate":
+        entries = catalog.get().mode_entries(payload["mode"])
+        if not entries:
+            raise ValueError(f"mode {payload['mode']!r} has no maps in the map catalog any more")
+        pos = payload.get("pos", 0) % len(entries)
+        return entries[pos].command, {**payload, "pos": pos + 1}
+    return payload["command"], payload
+
+
+def describe(schedule: dict) -> str:
+    payload = json.loads(schedule["payload"])
+    what = schedule["action"]
+    if "mode" in payload:
+        what += f" {payload['mode']}"
+    elif "seconds" in payload:
+        what += f" {payload['seconds']}s"
+    elif "command" in payload:
+        what += f" `{payload['command']}`"
+    return what
+
+
+# ── Timer loop ──────────────────────────────────────────────────────
+
+def owned(schedule_id: int, server_id: int | None) -> bool:
+    """Whether this process runs the schedule; "all servers" ones are spread by id."""
+    if server_id is None:
+        return sharding.owns(f"schedule:{schedule_id}")
+    return sharding.owns_server(server_id)
+
+
+class Scheduler:
+    def __init__(self, notify: Callable[[int, str], Awaitable] | None = None):
+        self.notify = notify
+        self._heap: list[tuple[float, int]] = []
+        self._due: dict[int, float] = {}   # schedule id -> next_run the heap entry must match
+        self._wake = asyncio.Event()
+        self._sem = asyncio.Semaphore(MAX_PARALLEL)
+        self._tasks: set[asyncio.Task] = set()
+
+    def push(self, schedule_id: int, next_run: float | None):
+        """(Re)queue a schedule; None removes it. Stale heap entries are skipped lazily."""
+        if next_run is None:
+            self._due.pop(schedule_id, None)
+            return
+        self._due[schedule_id] = next_run
+        heapq.heappush(self._heap, (next_run, schedule_id))
+        if self._heap[0][1] == schedule_id:
+            self._wake.set()
+
+    def reload(self):
+        self._due = {s["id"]: s["next_run"] for s in db.get_enabled_schedules() if owned(s["id"], s["server_id"])}
+        self._heap = [(t, sid) for sid, t in self._due.items()]
+        heapq.heapify(self._heap)
+        self._wake.set()
+
+    async def run(self):
+        reloaded = float("-inf")
+        while True:
+            if time.monotonic() - reloaded >= RELOAD_INTERVAL:
+                reloaded = time.monotonic()
+                try:
+                    await asyncio.to_thread(self.reload)
+                except Exception as e:
+                    # Keep the current heap; the next reload tries again
+                    logging.warning("Could not load schedules: %s", e)
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, sid = heapq.heappop(self._heap)
+                if self._due.get(sid) != due:
+                    continue
+                del self._due[sid]
+                task = asyncio.create_task(self._fire(sid, due, now))
+                self._tasks.add(task)
+                task.add_done_callback(self._done)
+            wait = RELOAD_INTERVAL
+            if self._heap:
+                wait = min(wait, max(0.0, self._heap[0][0] - time.time()))
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logging.error("Scheduled run failed", exc_info=task.exception())
+
+    async def _fire(self, schedule_id: int, due: float, now: float):
+        schedule = await asyncio.to_thread(db.get_schedule, schedule_id)
+        if not schedule or not schedule["enabled"] or schedule["next_run"] != due:
+            return
+        missed_by = now - due
+        if schedule["cron"]:
+            following = next_run(schedule["cron"], max(now, due))
+        else:
+            following = None
+        skip = missed_by > CATCHUP_WINDOW
+        # Claim the run before doing anything: only one claimer can win
+        if not await asyncio.to_thread(db.claim_schedule, schedule_id, due, following, now):
+            return
+        self.push(schedule_id, following)
+        if skip:
+            await asyncio.to_thread(db.finish_schedule, schedule_id, f"skipped, missed by {missed_by / 3600:.1f} h", None)
+            return
+
+        async with self._sem:
+            try:
+                result, payload = await self._execute(schedule)
+            except Exception as e:
+                # The run is claimed already: record the failure and tell the owner
+                result, payload = f"Error: {e}", None
+        await asyncio.to_thread(db.finish_schedule, schedule_id, result, payload)
+        if result.startswith("Error") and self.notify:
+            try:
+                await self.notify(schedule["telegram_id"], f"Scheduled {describe(schedule)} failed: {result}")
+            except Exception as e:
+                logging.warning("Could not report schedule failure: %s", e)
+
+    async def _execute(self, schedule: dict) -> tuple[str, str | None]:
+        payload = json.loads(schedule["payload"])
+        if schedule["server_id"] is None:
+            servers = await asyncio.to_thread(db.get_user_servers, schedule["telegram_id"])
+        else:
+            server = await asyncio.to_thread(db.get_server, schedule["server_id"], schedule["telegram_id"])
+            servers = [server] if server else []
+        if not servers:
+            return "Error: server not found", None
+
+        command, new_payload = action_command(schedule["action"], payload)
+        results = await asyncio.gather(*(
+            asyncio.to_thread(rcon.execute, s["host"], s["port"], s["rcon_password"], command)
+            for s in servers
+        ), return_exceptions=True)
+        failed = [f"{s['name']}: {r}" for s, r in zip(servers, results) if isinstance(r, Exception)]
+        result = ("Error: " + "; ".join(failed)) if failed else f"ok ({len(servers)} server(s))"
+        return result, json.dumps(new_payload) if new_payload != payload else None
+
+
+current: Scheduler | None = None
@@ -0,0 +1,116 @@
+import asyncio
+import csv
+import io
+import json
+
+import rcon_client as rcon
+
+# Bulk server import / export. An import file is CSV (header row with
+# name, host, port, rcon_password) or JSON (a list of objects with the same
+# keys, or {"servers": [...]}). `host` may carry the port as host:port.
+# All rows are checked at once: field validation first, then an RCON login
+# for every valid row, at most CONCURRENCY at a time.
+
+FIELDS = ("name", "host", "port", "rcon_password")
+MAX_ROWS = 200
+MAX_FILE_SIZE = 256 * 1024
+CONCURRENCY = 10
+AUTH_TIMEOUT = 4.0
+
+
+def parse(data: bytes, filename: str = "") -> list[dict]:
+    """Rows as dicts with a 1-based `row` number; raises ValueError on a bad file."""
+    text = data.decode("utf-8-sig")
+    stripped = text.lstrip()
+    if filename.lower().endswith(".json") or stripped[:1] in ("[", "{"):
+        doc = json.loads(text)
+        items = doc.get("servers") if isinstance(doc, dict) else doc
+        if not isinstance(items, list):
+            raise ValueError("JSON must be a list of servers or {\"servers\": [...]}")
+        rows = [dict(item) if isinstance(item, dict) else {"_error": "not an object"} for item in items]
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        try:
+            if not reader.fieldnames:
+                raise ValueError("CSV has no header row")
+            reader.fieldnames = [f.strip().lower() for f in reader.fieldnames]
+            rows = [{k: v for k, v in r.items() if k} for r in reader]
+        except csv.Error as e:
+            raise ValueError(f"malformed CSV (line {reader.line_num}): {e}") from None
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f"too many servers ({len(rows)}), at most {MAX_ROWS} per file")
+    for i, row in enumerate(rows, 1):
+        row["row"] = i
+    return rows
+
+
+def normalize(row: dict) -> dict:
+    """Clean one row in place; sets row["error"] when it cannot be imported."""
+    if "_error" in row:
+        row["error"] = row.pop("_error")
+        return row
+    password = row.get("rcon_password") or row.get("password") or ""
+    host = str(row.get("host") or "").strip()
+    port = row.get("port")
+    if ":" in host and not port:
+        host, port = host.rsplit(":", 1)
+    try:
+        port = int(port or 27015)
+    except (TypeError, ValueError):
+        row["error"] = f"invalid port {port!r}"
+        return row
+    name = str(row.get("name") or host).strip()
+    if not host:
+        row["error"] = "missing host"
+    elif not 0 < port < 65536:
+        row["error"] = f"invalid port {port}"
+    elif not password:
+        row["error"] = "missing rcon_password"
+    row.update(name=name[:64], host=host, port=port, rcon_password=str(password))
+    return row
+
+
+async def check_all(rows: list[dict], concurrency: int = CONCURRENCY) -> list[dict]:
+    """RCON-login every row without an error, concurrently; sets ok / error."""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def check(row):
+        async with sem:
+            ok, info = await asyncio.to_thread(
+                rcon.check_auth, row["host"], row["port"], row["rcon_password"], AUTH_TIMEOUT
+            )
+        if not ok:
+            row["error"] = info
+
+    await asyncio.gather(*(check(r) for r in rows if "error" not in r))
+    return rows
+
+
+def mark_duplicates(rows: list[dict], existing: list[dict]):
+    seen = {(s["host"], s["port"]) for s in existing}
+    for row in rows:
+        if "error" in row:
+            continue
+        key = (row["host"], row["port"])
+        if key in seen:
+            row["error"] = "already added"
+        seen.add(key)
+
+
+def export(servers: list[dict], fmt: str = "csv") -> bytes:
+    rows = [{k: s[k] for k in FIELDS} for s in servers]
+    if fmt == "json":
+        return json.dumps({"servers": rows}, ensure_ascii=False, indent=2).encode("utf-8")
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+def report(rows: list[dict]) -> list[str]:
+    lines = []
+    for row in rows:
+        label = f"{row['row']}. {row.get('name') or row.get('host') or '?'}"
+        lines.append(f"{label}: {row['error']}" if "error" in row else f"{label}: added")
+    return lines
@@ -0,0 +1,213 @@
+import bisect
+import hashlib
+import sqlite3
+import threading
+import time
+
+# Multi-worker mode: the router process polls Telegram and hands each update
+# to a worker picked by consistent hashing on telegram_id, so a user's FSM
+# state always lives in the same process. Background work for a server (its
+# log stream, scheduled actions and alert polling) is owned by exactly one
+# live worker (ring lookup on server id); when workers join or leave, the
+# ring is rebuilt from the state backend and ownership moves with it.
+
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TTL = 15.0
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+
+    def __init__(self, nodes=(), replicas: int = 64):
+        self.replicas = replicas
+        self.nodes: tuple[str, ...] = ()
+        # (sorted point hashes, owner of each point), swapped as one object so
+        # a lookup from another thread never sees half of a rebuild
+        self._points: tuple[list[int], list[str]] = ([], [])
+        self.set_nodes(nodes)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def set_nodes(self, nodes):
+        nodes = tuple(sorted(set(nodes)))
+        if nodes == self.nodes:
+            return
+        points = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in nodes for i in range(self.replicas)
+        )
+        self._points = ([p[0] for p in points], [p[1] for p in points])
+        self.nodes = nodes
+
+    def node_for(self, key) -> str | None:
+        keys, owners = self._points
+        if not keys:
+            return None
+        i = bisect.bisect(keys, self._hash(str(key))) % len(keys)
+        return owners[i]
+
+
+# ── State backends ──────────────────────────────────────────────────
+
+class StateBackend:
+    """Worker membership and small shared key/value state."""
+
+    def heartbeat(self, worker_id: str):
+        raise NotImplementedError
+
+    def leave(self, worker_id: str):
+        raise NotImplementedError
+
+    def live_workers(self, ttl: float = HEARTBEAT_TTL) -> list[str]:
+        raise NotImplementedError
+
+    def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str):
+        raise NotImplementedError
+
+
+class LocalBackend(StateBackend):
+    """In-process stand-in, for a single process and for tests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen: dict[str, float] = {}
+        self._kv: dict[str, str] = {}
+
+    def heartbeat(self, worker_id: str):
+        with self._lock:
+            self._seen[worker_id] = time.monotonic()
+
+    def leave(self, worker_id: str):
+        with self._lock:
+            self._seen.pop(worker_id, None)
+
+    def live_workers(self, ttl: float = HEARTBEAT_TTL) -> list[str]:
+        now = time.monotonic()
+        with self._lock:
+            return sorted(w for w, seen in self._seen.items() if now - seen <= ttl)
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            return self._kv.get(key)
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._kv[key] = value
+
+
+class SqliteBackend(StateBackend):
+    """Shared state for worker processes on one host, in the bot database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shard_workers (
+                worker_id   TEXT PRIMARY KEY,
+                seen        REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS shard_state (
+                key         TEXT PRIMARY KEY,
+                value       TEXT NOT NULL
+            );
+        """)
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def heartbeat(self, worker_id: str):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO shard_workers (worker_id, seen) VALUES (?, ?)",
+            (worker_id, time.time()),
+        )
+        conn.commit()
+        conn.close()
+
+    def leave(self, worker_id: str):
+        conn = self._connect()
+        conn.execute("DELETE FROM shard_workers WHERE worker_id = ?", (worker_id,))
+        conn.commit()
+        conn.close()
+
+    def live_workers(self, ttl: float = HEARTBEAT_TTL) -> list[str]:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT worker_id FROM shard_workers WHERE seen >= ? ORDER BY worker_id",
+            (time.time() - ttl,),
+        ).fetchall()
+        conn.close()
+        return [r[0] for r in rows]
+
+    def get(self, key: str) -> str | None:
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM shard_state WHERE key = ?", (key,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO shard_state (key, value) VALUES (?, ?)", (key, value))
+        conn.commit()
+        conn.close()
+
+
+# ── Membership ──────────────────────────────────────────────────────
+
+class Membership:
+    """This worker's view of the live workers and what it owns."""
+
+    def __init__(self, worker_id: str, backend: StateBackend):
+        self.worker_id = worker_id
+        self.backend = backend
+        self.ring = HashRing()
+
+    def refresh(self) -> bool:
+        """Heartbeat and rebuild the ring; True if the set of live workers changed."""
+        self.backend.heartbeat(self.worker_id)
+        live = self.backend.live_workers()
+        if self.worker_id not in live:
+            live.append(self.worker_id)
+        before = self.ring.nodes
+        self.ring.set_nodes(live)
+        return self.ring.nodes != before
+
+    def leave(self):
+        self.backend.leave(self.worker_id)
+
+    def owns(self, key: str) -> bool:
+        return self.ring.node_for(key) == self.worker_id
+
+
+# Set by a worker process at startup; None means single-process mode.
+current: Membership | None = None
+
+
+def owns(key: str) -> bool:
+    """Whether this process should run the background work keyed by `key`."""
+    return current is None or current.owns(key)
+
+
+def owns_server(server_id: int) -> bool:
+    """Whether this process should run background work for server_id."""
+    return owns(f"server:{server_id}")
+
+
+def update_user_id(update: dict) -> int | None:
+    """Extract the sender's telegram_id from a raw Update payload."""
+    for event in update.values():
+        if isinstance(event, dict):
+            user = event.get("from") or event.get("user")
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+            chat = event.get("chat")
+            if isinstance(chat, dict) and "id" in chat:
+                return chat["id"]
+    return None
@@ -0,0 +1,97 @@
+import json
+import re
+import time
+
+_HOSTNAME_RE = re.compile(r"hostname\s*:\s*(.*)")
+_MAP_RE = re.compile(r"map\s*:\s*(\S+)")
+_PLAYERS_RE = re.compile(r"players\s*:\s*(\d+)\s+humans")
+_PLAYER_LINE_RE = re.compile(r"^\s*(\d+)\s+(\S+).*\s+'([^']+)'", re.MULTILINE)
+
+
+def parse_map(raw: str) -> str | None:
+    m = _MAP_RE.search(raw)
+    return m.group(1) if m else None
+
+
+def parse_status(raw: str) -> dict:
+    """Parse the console `status` output into hostname, map and players."""
+    m = _HOSTNAME_RE.search(raw)
+    hostname = m.group(1).strip() if m else "Unknown"
+    m = _PLAYERS_RE.search(raw)
+    entries = parse_players(raw)
+    return {
+        "hostname": hostname,
+        "map": parse_map(raw) or "Unknown",
+        "player_count": m.group(1) if m else "?",
+        "players": [p["name"] for p in entries],
+        "entries": entries,
+        "scores": None,
+    }
+
+
+def parse_players(raw: str) -> list[dict]:
+    """Human players from `status` as {"userid", "name"} (CS2 status has no SteamIDs)."""
+    return [
+        {"userid": int(pm.group(1)), "name": pm.group(3)}
+        for pm in _PLAYER_LINE_RE.finditer(raw)
+        if pm.group(2) != "BOT"
+    ]
+
+
+# ── css_status_json (BroadcastCenter plugin) ─────────────────────────
+
+STATUS_JSON_COMMAND = "css_status_json"
+STATUS_JSON_VERSION = 1
+NO_PLUGIN_RETRY = 600.0  # seconds before trying the JSON command again
+
+_STEAMID64_BASE = 76561197960265728
+_no_plugin: dict[tuple[str, int], float] = {}
+
+
+def steamid3(steamid64: str | None) -> str | None:
+    """76561197960265851 -> [U:1:123], the form used in server logs."""
+    if not steamid64 or not steamid64.isdigit() or int(steamid64) <= _STEAMID64_BASE:
+        return None
+    return f"[U:1:{int(steamid64) - _STEAMID64_BASE}]"
+
+
+def parse_status_json(raw: str) -> dict | None:
+    """Parse css_status_json output into the parse_status shape; None if it is not JSON."""
+    start = raw.find("{")
+    if start < 0:
+        return None
+    try:
+        data = json.loads(raw[start:raw.rfind("}") + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get("v") != STATUS_JSON_VERSION:
+        return None
+    entries = [
+        {"userid": p.get("userid"), "name": p.get("name", ""), "steamid": steamid3(p.get("steamid")),
+         "team": p.get("team"), "ping": p.get("ping"), "score": p.get("score")}
+        for p in data.get("players", []) if not p.get("bot")
+    ]
+    return {
+        "hostname": data.get("hostname") or "Unknown",
+        "map": data.get("map") or "Unknown",
+        "player_count": str(len(entries)),
+        "players": [p["name"] for p in entries],
+        "entries": entries,
+        "scores": data.get("scores") or None,
+    }
+
+
+def collect(host: str, port: int, execute) -> dict:
+    """Fetch and parse server status, preferring the plugin's JSON.
+
+    execute(command) -> str runs one RCON command. Servers without the plugin
+    are remembered for NO_PLUGIN_RETRY so they cost one round trip, not two.
+    """
+    key = (host, port)
+    if time.monotonic() >= _no_plugin.get(key, 0):
+        info = parse_status_json(execute(STATUS_JSON_COMMAND))
+        if info:
+            _no_plugin.pop(key, None)
+            return info
+        _no_plugin[key] = time.monotonic() + NO_PLUGIN_RETRY
+    return parse_status(execute("status"))
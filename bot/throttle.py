@@ -0,0 +1,142 @@
+import math
+import time
+
+import callbacks as cbk
+import metrics
+
+# Token buckets in front of everything that opens an RCON connection. Every
+# such update needs a token from the user's bucket and one from the target
+# server's bucket; both are checked before either is spent, so a rejected
+# press costs nothing. The per-user limit stops one person hammering a button;
+# the per-server limit caps what all users together send to one live match.
+# Buckets are per process: with several workers a user always lands on the
+# same worker, a server's budget is per worker.
+
+# Panel buttons that run an RCON command; the rest only open a prompt or a keyboard
+RCON_ACTIONS = {"status", "restart", "warmup_on", "warmup_off", "addt", "addct", "kickbots"}
+# handlers states whose text reply is sent to the server (AddServer:password
+# tests the connection; it has no server id yet and only costs the user)
+RCON_STATES = {"WaitInput:broadcast", "WaitInput:kick", "WaitInput:rcon_cmd", "AddServer:password"}
+
+PRUNE_SIZE = 1024  # start dropping idle buckets past this many keys
+PRUNE_INTERVAL = 60.0
+
+decisions = metrics.counter("bot_throttle_total", "Updates that reach a game server: admitted, "
+                            "rejected_user, rejected_server", ("outcome",))
+
+
+def costly(cbd: cbk.Callback | None) -> bool:
+    """Whether a decoded callback makes an RCON call.
+
+    Opening a panel (PANEL, also every Back button) is free: only the status
+    prefetch it starts reaches the server, and handlers charge that itself.
+    """
+    if cbd is None:
+        return False
+    if cbd.op == cbk.ACTION:
+        return cbd.action in RCON_ACTIONS
+    return cbd.op in (cbk.MAP, cbk.MODE, cbk.KICK)
+
+
+class Bucket:
+    __slots__ = ("tokens", "stamp", "scale")
+
+    def __init__(self, burst: float, now: float, scale: float):
+        self.tokens = burst
+        self.stamp = now
+        self.scale = scale  # trusted users' buckets fill faster and hold more
+
+    def refill(self, rate: float, burst: float, now: float) -> float:
+        self.tokens = min(burst, self.tokens + (now - self.stamp) * rate)
+        self.stamp = now
+        return self.tokens
+
+
+class Limit:
+    """One family of buckets: `per_min` tokens a minute, at most `burst` saved up."""
+
+    def __init__(self, per_min: float, burst: int):
+        self.rate = per_min / 60
+        self.burst = max(1, burst)
+        self.buckets: dict[int, Bucket] = {}
+        self._pruned = 0.0
+
+    def wait(self, key: int, now: float, scale: float = 1.0) -> float:
+        """Seconds until a token is available (0 = now), without taking it."""
+        if not self.rate:
+            return 0.0
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return 0.0
+        tokens = bucket.refill(self.rate * scale, self.burst * scale, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / (self.rate * scale)
+
+    def take(self, key: int, now: float, scale: float = 1.0, cost: int = 1):
+        """Spend `cost` tokens; more than are left puts the bucket in debt until it refills."""
+        if not self.rate:
+            return
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= PRUNE_SIZE and now - self._pruned >= PRUNE_INTERVAL:
+                self._prune(now)
+            bucket = self.buckets[key] = Bucket(self.burst * scale, now, scale)
+        bucket.refill(self.rate * scale, self.burst * scale, now)
+        bucket.tokens -= cost
+
+    def _prune(self, now: float):
+        # A bucket that has refilled completely is the same as no bucket
+        self._pruned = now
+        self.buckets = {k: b for k, b in self.buckets.items()
+                        if b.tokens + (now - b.stamp) * self.rate * b.scale < self.burst * b.scale}
+
+
+class Throttle:
+    def __init__(self, user: Limit, server: Limit, trusted: set[int] = frozenset(), trusted_factor: float = 1.0):
+        self.user = user
+        self.server = server
+        self.trusted = trusted
+        self.trusted_factor = trusted_factor
+        self._warned: dict[int, float] = {}  # telegram id -> until when a "slow down" was already said
+
+    def admit(self, telegram_id: int, server_id: int | None, now: float | None = None,
+              cost: int = 1) -> tuple[float, str]:
+        """(0, "") if admitted and charged; else (seconds to wait, "user" | "server").
+
+        `cost` is the number of RCON connections (an import checks one per
+        row); it is charged to the user in full once a single token is there.
+        """
+        now = time.monotonic() if now is None else now
+        scale = self.trusted_factor if telegram_id in self.trusted else 1.0
+        wait = self.user.wait(telegram_id, now, scale)
+        if wait:
+            decisions.inc("rejected_user")
+            return wait, "user"
+        if server_id is not None:
+            wait = self.server.wait(server_id, now)
+            if wait:
+                decisions.inc("rejected_server")
+                return wait, "server"
+            self.server.take(server_id, now)
+        self.user.take(telegram_id, now, scale, cost)
+        decisions.inc("admitted")
+        return 0.0, ""
+
+    def should_warn(self, telegram_id: int, wait: float, now: float | None = None) -> bool:
+        """True once per rejection window, so typed messages get one reply rather than one each."""
+        now = time.monotonic() if now is None else now
+        if self._warned.get(telegram_id, 0.0) > now:
+            return False
+        if len(self._warned) >= PRUNE_SIZE:
+            self._warned = {k: t for k, t in self._warned.items() if t > now}
+        self._warned[telegram_id] = now + wait
+        return True
+
+
+# Set by main when limits are configured; handlers charge multi-connection work here
+current: Throttle | None = None
+
+
+def slow_down(wait: float, scope: str) -> str:
+    if scope == "server":
+        return f"This server is getting too many requests right now. Try again in {math.ceil(wait)} s."
+    return f"Slow down, please: try again in {math.ceil(wait)} s."
@@ -1,6 +1,10 @@
+using System.Collections.Generic;
+using System.Linq;
+using System.Text.Json;
 using CounterStrikeSharp.API;
 using CounterStrikeSharp.API.Core;
 using CounterStrikeSharp.API.Modules.Commands;
+using CounterStrikeSharp.API.Modules.Cvars;
 using CounterStrikeSharp.API.Modules.Entities;
 using CounterStrikeSharp.API.Modules.Entities.Constants;
 using CounterStrikeSharp.API.Modules.Utils;
@@ -10,14 +14,18 @@ namespace CaptainCS2.BroadcastCenter;
 public sealed class BroadcastCenterPlugin : BasePlugin
 {
     private const int MaxMessageLength = 256;
+    private const int MaxBatchMessages = 16;
+    private const int StatusJsonVersion = 1;
 
     public override string ModuleName => "BroadcastCenter";
-    public override string ModuleDescription => "Adds css_broadcast_center to show a center-screen overlay";
-    public override string ModuleVersion => "1.0.0";
+    public override string ModuleDescription => "Center-screen broadcasts, batched chat broadcasts and JSON server status";
+    public override string ModuleVersion => "1.1.0";
 
     public override void Load(bool hotReload)
     {
         AddCommand("css_broadcast_center", "Show a center-screen banner", BroadcastCenterCommand);
+        AddCommand("css_broadcast_batch", "Print several chat messages in one call", BroadcastBatchCommand);
+        AddCommand("css_status_json", "Server status as one JSON document", StatusJsonCommand);
     }
 
     private void BroadcastCenterCommand(CCSPlayerController? caller, CommandInfo command)
@@ -41,6 +49,88 @@ public sealed class BroadcastCenterPlugin : BasePlugin
         command.ReplyToCommand($"Sent banner to {recipients} players.");
     }
 
+    // css_broadcast_batch "first message" "second message" ...
+    private void BroadcastBatchCommand(CCSPlayerController? caller, CommandInfo command)
+    {
+        var messages = new List<string>();
+        for (var i = 1; i < command.ArgCount && messages.Count < MaxBatchMessages; i++)
+        {
+            var text = command.ArgByIndex(i).Trim();
+            if (text.Length == 0)
+            {
+                continue;
+            }
+
+            messages.Add(text.Length > MaxMessageLength ? text[..MaxMessageLength] : text);
+        }
+
+        if (messages.Count == 0)
+        {
+            command.ReplyToCommand("Usage: css_broadcast_batch \"<text>\" [\"<text>\" ...]");
+            return;
+        }
+
+        foreach (var message in messages)
+        {
+            Server.PrintToChatAll(message);
+        }
+
+        command.ReplyToCommand($"Sent {messages.Count} messages.");
+    }
+
+    private void StatusJsonCommand(CCSPlayerController? caller, CommandInfo command)
+    {
+        var scores = new Dictionary<string, int>();
+        foreach (var team in Utilities.FindAllEntitiesByDesignerName<CCSTeam>("cs_team_manager"))
+        {
+            var name = TeamName(team.TeamNum);
+            if (name is "T" or "CT")
+            {
+                scores[name] = team.Score;
+            }
+        }
+
+        var players = Utilities.GetPlayers()
+            .Where(p => p is not null && p.IsValid && p.Connected == PlayerConnectedState.PlayerConnected)
+            .Select(p => new Dictionary<string, object?>
+            {
+                ["slot"] = p.Slot,
+                ["userid"] = p.UserId,
+                ["name"] = p.PlayerName,
+                ["steamid"] = p.IsBot ? null : p.SteamID.ToString(),
+                ["team"] = TeamName(p.TeamNum),
+                ["ping"] = p.Ping,
+                ["score"] = p.Score,
+                ["bot"] = p.IsBot,
+            })
+            .ToList();
+
+        var status = new Dictionary<string, object?>
+        {
+            ["v"] = StatusJsonVersion,
+            ["hostname"] = ConVar.Find("hostname")?.StringValue,
+            ["map"] = Server.MapName,
+            ["game_type"] = ConVar.Find("game_type")?.GetPrimitiveValue<int>(),
+            ["game_mode"] = ConVar.Find("game_mode")?.GetPrimitiveValue<int>(),
+            ["max_players"] = Server.MaxPlayers,
+            ["scores"] = scores,
+            ["players"] = players,
+        };
+
+        command.ReplyToCommand(JsonSerializer.Serialize(status));
+    }
+
+    private static string TeamName(int teamNum)
+    {
+        return teamNum switch
+        {
+            2 => "T",
+            3 => "CT",
+            1 => "SPEC",
+            _ => "NONE",
+        };
+    }
+
     private static int Broadcast(string htmlPayload)
     {
         var sent = 0;
@@ -0,0 +1,300 @@
+"""Offline analytics for captured CS2 server logs.
+
+Memory-maps each log, splits it at line boundaries into chunks and scans the
+chunks in a process pool. Produces a compact JSON report with:
+  - per-minute counts (lines, errors, warnings, connects, map loads, SDR)
+  - error / warning classes (numbers and quoted strings normalized)
+  - player sessions from connect / disconnect lines
+  - startup phase timings, per server boot
+
+    python log_analytics.py cs2-server-logs.txt cs2-server-logs-latest.txt -o report.json
+    python log_analytics.py --bench 1024      # replicate bundled logs to ~1 GB and compare
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "bot"))
+from log_parser import parse_line  # noqa: E402
+
+CHUNK_SIZE = 32 * 1024 * 1024
+BENCH_SOURCES = ["cs2-server-logs.txt", "cs2-server-logs-latest.txt", "cs2-server-20251130_122732.log.txt"]
+
+_ANSI = re.compile(rb"\x1b?\[[0-9;]*m")
+_NUM = re.compile(r"\d+")
+_QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"")
+_LEVEL = re.compile(r"\[(EROR|ERROR|WARN|WARNING)\]\s*(?:\([^)]*\)\s*)?(.*)")
+
+# Startup phases, in boot order; a "boot" marker starts a new cycle
+PHASES = [
+    ("boot", b"Starting on Steam Runtime"),
+    ("steamcmd_done", b"Success! App '730'"),
+    ("server_start", b"Starting server on"),
+    ("cssharp", b"CounterStrikeSharp is starting up"),
+    ("map_load", b'Loading map "'),
+    ("host_activate", b"Host activate"),
+    ("first_client", b'" connected @'),
+]
+
+
+def _error_class(text: str) -> tuple[str, str] | None:
+    m = _LEVEL.search(text)
+    if m:
+        level = "error" if m.group(1).startswith("ER") else "warning"
+        msg = m.group(2)
+    elif "Segmentation fault" in text:
+        return "error", "Segmentation fault"
+    elif "Exception" in text and not text.lstrip().startswith("at "):
+        level, msg = "error", text
+    elif text.startswith("Unknown command"):
+        level, msg = "warning", text
+    else:
+        return None
+    msg = _QUOTED.sub("'…'", _NUM.sub("#", msg.strip()))
+    return level, msg[:120]
+
+
+def _new_partial() -> dict:
+    return {"lines": 0, "minutes": Counter(), "classes": Counter(), "markers": []}
+
+
+# One C-level search decides whether a line needs any further work
+_INTERESTING = re.compile(
+    rb"EROR|WARN|rror|fault|Exception|Unknown command|SDR|elay|connected|Server shutting down|"
+    + b"|".join(re.escape(needle) for _, needle in PHASES)
+)
+
+
+def _scan_line(line: bytes, acc: dict, line_minutes: Counter):
+    if len(line) < 25 or line[4:5] != b"-":
+        return
+    minute_key = line[:16]
+    line_minutes[minute_key] += 1
+    if not _INTERESTING.search(line, 25):
+        return
+
+    minute = minute_key.decode()
+    minutes = acc["minutes"]
+    ts = line[:24].decode()
+    body = line[25:]
+    if b"[" in body:
+        body = _ANSI.sub(b"", body)
+
+    if b"EROR" in body or b"WARN" in body or b"rror" in body or b"fault" in body \
+            or b"Exception" in body or body.startswith(b"Unknown command"):
+        cls = _error_class(body.decode("utf-8", "replace"))
+        if cls:
+            minutes[(minute, cls[0] + "s")] += 1
+            acc["classes"][cls] += 1
+            if cls[1] == "Segmentation fault":
+                acc["markers"].append((ts, "crash", None))
+    if b"SDR" in body or b"elay" in body:
+        minutes[(minute, "sdr")] += 1
+
+    for name, needle in PHASES:
+        if needle in body:
+            acc["markers"].append((ts, "phase", name))
+    if b"connected" in body:
+        event = parse_line(line.decode("utf-8", "replace"))
+        if event and event.kind in ("connect", "disconnect"):
+            if event.kind == "connect":
+                minutes[(minute, "connects")] += 1
+            acc["markers"].append((ts, event.kind, event.data["name"]))
+    elif b'Loading map "' in body:
+        minutes[(minute, "map_loads")] += 1
+    elif b"Server shutting down" in body:
+        acc["markers"].append((ts, "shutdown", None))
+
+
+def _finish(acc: dict, line_minutes: Counter) -> dict:
+    for key, n in line_minutes.items():
+        acc["minutes"][(key.decode(), "lines")] += n
+        acc["lines"] += n
+    return acc
+
+
+def scan_chunk(path: str, start: int, end: int) -> dict:
+    acc = _new_partial()
+    if start == 0:
+        acc["markers"].append((None, "file", path))
+    line_minutes: Counter = Counter()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for line in mm[start:end].split(b"\n"):
+            _scan_line(line.rstrip(b"\r"), acc, line_minutes)
+    return _finish(acc, line_minutes)
+
+
+def chunk_bounds(path: str, chunk_size: int = CHUNK_SIZE) -> list[tuple[int, int]]:
+    """Split a file into [start, end) ranges that end on a newline."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bounds = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                nl = mm.find(b"\n", end)
+                end = size if nl < 0 else nl + 1
+            bounds.append((start, end))
+            start = end
+    return bounds
+
+
+# ── Merge ───────────────────────────────────────────────────────────
+
+def _ts(value: str) -> datetime:
+    return datetime.fromisoformat(value.rstrip("Z"))
+
+
+def merge(partials: list[dict]) -> dict:
+    lines = 0
+    minutes: Counter = Counter()
+    classes: Counter = Counter()
+    markers = []
+    for p in partials:
+        lines += p["lines"]
+        minutes.update(p["minutes"])
+        classes.update(p["classes"])
+        markers.extend(p["markers"])
+
+    timeline: dict[str, dict] = {}
+    for (minute, kind), n in sorted(minutes.items()):
+        timeline.setdefault(minute, {})[kind] = n
+
+    sessions, open_sessions = [], {}
+    boots, boot = [], None
+    for ts, kind, value in markers:
+        if kind == "connect":
+            if value in open_sessions:
+                sessions.append(_session(value, open_sessions.pop(value), ts, "reconnect"))
+            open_sessions[value] = ts
+        elif kind == "disconnect":
+            if value in open_sessions:
+                sessions.append(_session(value, open_sessions.pop(value), ts, "disconnect"))
+        elif kind in ("shutdown", "crash"):
+            for name, started in open_sessions.items():
+                sessions.append(_session(name, started, ts, kind))
+            open_sessions.clear()
+        elif kind == "file":
+            # New log file: sessions still open in the previous one never ended in it
+            for name, started in open_sessions.items():
+                sessions.append({"name": name, "start": started, "end": None, "seconds": None, "ended_by": None})
+            open_sessions.clear()
+            boot = None
+        elif kind == "phase":
+            if value == "boot" or boot is None:
+                boot = {"started": ts, "phases": {}}
+                boots.append(boot)
+            if value not in boot["phases"]:
+                boot["phases"][value] = round((_ts(ts) - _ts(boot["started"])).total_seconds(), 3)
+    for name, started in open_sessions.items():
+        sessions.append({"name": name, "start": started, "end": None, "seconds": None, "ended_by": None})
+
+    return {
+        "lines": lines,
+        "timeline": timeline,
+        "errors": [{"level": lvl, "message": msg, "count": n}
+                   for (lvl, msg), n in classes.most_common() if lvl == "error"],
+        "warnings": [{"level": lvl, "message": msg, "count": n}
+                     for (lvl, msg), n in classes.most_common() if lvl == "warning"],
+        "sessions": sessions,
+        "startups": boots,
+    }
+
+
+def _session(name: str, start: str, end: str, ended_by: str) -> dict:
+    return {"name": name, "start": start, "end": end,
+            "seconds": round((_ts(end) - _ts(start)).total_seconds(), 3), "ended_by": ended_by}
+
+
+# ── Entry points ────────────────────────────────────────────────────
+
+def analyze(paths: list[str], workers: int | None = None, chunk_size: int = CHUNK_SIZE) -> dict:
+    jobs = [(p, s, e) for p in paths for s, e in chunk_bounds(p, chunk_size)]
+    if workers == 1 or len(jobs) <= 1:
+        partials = [scan_chunk(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(scan_chunk, *zip(*jobs)))
+    return merge(partials)
+
+
+def analyze_serial(paths: list[str]) -> dict:
+    """Baseline: plain single-threaded line loop over the same scanner."""
+    acc = _new_partial()
+    line_minutes: Counter = Counter()
+    for path in paths:
+        acc["markers"].append((None, "file", path))
+        with open(path, "rb") as f:
+            for line in f:
+                _scan_line(line.rstrip(b"\r\n"), acc, line_minutes)
+    return merge([_finish(acc, line_minutes)])
+
+
+def bench(size_mb: int, workers: int | None):
+    sources = [os.path.join(ROOT, p) for p in BENCH_SOURCES if os.path.exists(os.path.join(ROOT, p))]
+    blob = b"".join(open(p, "rb").read().rstrip(b"\n") + b"\n" for p in sources)
+    target = size_mb * 1024 * 1024
+    fd, path = tempfile.mkstemp(prefix="cs2bench_", suffix=".log")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            written = 0
+            while written < target:
+                f.write(blob)
+                written += len(blob)
+        print(f"Benchmark file: {written / 1024 / 1024:.0f} MB ({path})")
+
+        started = time.perf_counter()
+        serial = analyze_serial([path])
+        t_serial = time.perf_counter() - started
+        print(f"  serial line loop: {t_serial:6.2f} s  {written / t_serial / 1e6:7.1f} MB/s")
+
+        started = time.perf_counter()
+        parallel = analyze([path], workers)
+        t_parallel = time.perf_counter() - started
+        print(f"  mmap + {workers or os.cpu_count()} procs:  {t_parallel:6.2f} s  "
+              f"{written / t_parallel / 1e6:7.1f} MB/s  ({t_serial / t_parallel:.1f}x)")
+        if serial["lines"] != parallel["lines"] or serial["errors"] != parallel["errors"]:
+            print("  WARNING: serial and parallel results differ")
+    finally:
+        os.unlink(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="*", help="log files")
+    parser.add_argument("-o", "--out", help="write the JSON report here (default: stdout)")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--bench", type=int, metavar="MB", help="benchmark on bundled logs replicated to MB")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        return bench(args.bench, args.workers)
+    if not args.paths:
+        parser.error("give log files or --bench")
+
+    report = analyze(args.paths, args.workers)
+    text = json.dumps(report, ensure_ascii=False, separators=(",", ":"))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"{report['lines']} lines, {len(report['errors'])} error classes, "
+              f"{len(report['warnings'])} warning classes, {len(report['sessions'])} sessions, "
+              f"{len(report['startups'])} startups -> {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,78 +1,243 @@
-import re
+"""Regenerate the map/mode catalog from CS2 server data files.
+
+Sources (any combination):
+  --gamemodes PATH   Valve KeyValues gamemodes_server.txt (mapgroups -> maps)
+  --info PATH        cs2-modded-server README (cs2Server_info.md) map tables
+
+Both are tokenized in a single streaming pass. The result is merged into the
+current catalog (config.py dicts) and written to bot/maps_catalog.json, or
+with --write-config straight into the MAPS / MODE_MAPS literals of
+bot/config.py; the per-group listing in maps_by_mode.txt is refreshed when it
+changes. Inputs, config.py included, are content-hashed; nothing is rebuilt
+unless an input or the output target changed (use --force to rebuild anyway).
+
+    python update_map_data.py --info cs2Server_info.md
+    python update_map_data.py --gamemodes game/csgo/gamemodes_server.txt --write-config
+"""
+import argparse
+import hashlib
+import json
 import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BOT_DIR = os.path.join(ROOT, "bot")
+STATE_PATH = os.path.join(ROOT, ".map_catalog.state.json")
+MAPS_TXT_PATH = os.path.join(ROOT, "maps_by_mode.txt")
+
+sys.path.insert(0, BOT_DIR)
+import catalog  # noqa: E402
+import config  # noqa: E402
+
+# Server map groups -> bot game modes (config.GAME_MODES keys)
+GROUP_MODES = {
+    "mg_comp": "Competitive",
+    "mg_retake": "Retakes",
+    "mg_wingman": "Wingman",
+    "mg_dm": "Deathmatch",
+    "mg_gg": "GunGame",
+    "mg_1v1": "1v1",
+    "mg_bhop": "BHop",
+    "mg_kz": "KZ",
+    "mg_surf": "Surf",
+    "mg_minigames": "Mini Games",
+    "mg_battleroyale": "Battle Royale",
+    "mg_deathrun": "Deathrun",
+    "mg_course": "Course",
+    "mg_scoutzknivez": "ScoutzKnivez",
+    "mg_hns": "Hide n Seek",
+    "mg_awp": "AWP",
+    "mg_aim": "Aim",
+    "mg_ctf": "Capture The Flag",
+}
+
+
+# ── KeyValues ───────────────────────────────────────────────────────
+
+_KV_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}])|(//)|([^\s{}"]+)')
+
+
+def kv_tokens(lines):
+    """Yield KeyValues tokens (strings, '{', '}') from an iterable of lines."""
+    for line in lines:
+        for m in _KV_TOKEN.finditer(line):
+            quoted, brace, comment, bare = m.groups()
+            if comment:
+                break
+            if brace:
+                yield brace
+            elif quoted is not None:
+                yield quoted
+            elif not bare.startswith("["):  # skip [$WIN32]-style conditionals
+                yield bare
+
+
+def kv_map_groups(lines) -> dict[str, list[str]]:
+    """Collect mapgroups/<group>/maps/<map> keys from a KeyValues stream."""
+    groups: dict[str, list[str]] = {}
+    path: list[str] = []
+    key = None
+    for tok in kv_tokens(lines):
+        if tok == "{":
+            path.append(key or "")
+            key = None
+        elif tok == "}":
+            if path:
+                path.pop()
+            key = None
+        elif key is None:
+            key = tok
+        else:
+            if len(path) >= 3 and path[-3].lower() == "mapgroups" and path[-1].lower() == "maps":
+                groups.setdefault(path[-2], []).append(key)
+            key = None
+    return groups
+
+
+# ── Info markdown ───────────────────────────────────────────────────
+
+_MD_GROUP = re.compile(r"^#{2,4}\s+(mg_\w+)")
+_MD_CELL = re.compile(
+    r'<td>(?:<a href="[^"]*">)?([^<]+?)(?:</a>)?<br><sup><sub>\s*(changelevel|host_workshop_map)\s+(\S+?)\s*</sub></sup>'
+)
+
+
+def md_map_groups(lines) -> dict[str, list[str]]:
+    """Collect per-group map codes from the info markdown tables."""
+    groups: dict[str, list[str]] = {}
+    group = None
+    for line in lines:
+        if line.startswith("#"):
+            m = _MD_GROUP.match(line)
+            group = m.group(1) if m else None
+            continue
+        if group is None or "<sub>" not in line:
+            continue
+        for name, cmd, arg in _MD_CELL.findall(line):
+            name = name.strip()
+            code = f"workshop/{arg}/{name}" if cmd == "host_workshop_map" else arg
+            groups.setdefault(group, []).append(code)
+    return groups
+
+
+# ── Merge / output ──────────────────────────────────────────────────
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def merge(groups: dict[str, list[str]]) -> tuple[dict[str, str], dict[str, list[str]]]:
+    maps = dict(config.MAPS)
+    mode_maps = {mode: list(names) for mode, names in config.MODE_MAPS.items()}
+    for group, codes in groups.items():
+        names = []
+        for code in codes:
+            name = code.rsplit("/", 1)[-1]
+            maps[name] = code
+            if name not in names:
+                names.append(name)
+        mode = GROUP_MODES.get(group)
+        if mode and names:
+            mode_maps[mode] = names
+    return dict(sorted(maps.items())), mode_maps
+
+
+def _dict_literal(var: str, d: dict) -> str:
+    lines = [f"{var} = {{"]
+    for k, v in d.items():
+        lines.append(f"    {json.dumps(k)}: {json.dumps(v, ensure_ascii=False)},")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def write_config(maps: dict[str, str], mode_maps: dict[str, list[str]], path: str):
+    with open(path, encoding="utf-8") as f:
+        src = f.read()
+    for var, value in (("MAPS", maps), ("MODE_MAPS", mode_maps)):
+        pattern = re.compile(rf"^{var} = \{{\n.*?^\}}", re.MULTILINE | re.DOTALL)
+        if not pattern.search(src):
+            raise ValueError(f"{var} literal not found in {path}")
+        src = pattern.sub(lambda _: _dict_literal(var, value), src, count=1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(src)
+
+
+def write_maps_txt(groups: dict[str, list[str]]) -> bool:
+    """Rewrite the tracked maps_by_mode.txt listing; only touches the file if the listing changed."""
+    lines = []
+    for group, codes in groups.items():
+        lines.append(f"Mode: {group}\n")
+        for code in codes:
+            parts = code.split("/")
+            cmd = f"host_workshop_map {parts[1]}" if len(parts) == 3 else f"changelevel {code}"
+            lines.append(f"  - {parts[-1]} ({cmd})\n")
+        lines.append("\n")
+    text = "".join(lines)
+    if os.path.exists(MAPS_TXT_PATH):
+        with open(MAPS_TXT_PATH, encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    with open(MAPS_TXT_PATH, "w", encoding="utf-8") as f:
+        f.write(text)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--gamemodes", help="path to gamemodes_server.txt")
+    parser.add_argument("--info", help="path to cs2Server_info.md")
+    parser.add_argument("--write-config", action="store_true", help="rewrite bot/config.py instead of the catalog file")
+    parser.add_argument("--force", action="store_true", help="rebuild even if inputs are unchanged")
+    args = parser.parse_args(argv)
+    if not args.gamemodes and not args.info:
+        parser.error("give --gamemodes and/or --info")
+
+    target = os.path.join(BOT_DIR, "config.py") if args.write_config else catalog.CATALOG_PATH
+    # merge() starts from config.py, so it is an input as much as the data files
+    config_path = os.path.join(BOT_DIR, "config.py")
+    inputs = {p: _hash_file(p) for p in (args.gamemodes, args.info, config_path) if p}
+    state_key = os.path.relpath(target, ROOT)
+    state = {}
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, encoding="utf-8") as f:
+            state = json.load(f)
+    if not args.force and state.get(state_key) == inputs and os.path.exists(target):
+        print("Inputs unchanged, nothing to do.")
+        return
+
+    groups: dict[str, list[str]] = {}
+    if args.gamemodes:
+        with open(args.gamemodes, encoding="utf-8", errors="replace") as f:
+            groups = kv_map_groups(f)
+    if args.info:
+        with open(args.info, encoding="utf-8", errors="replace") as f:
+            for group, codes in md_map_groups(f).items():
+                merged = groups.setdefault(group, [])
+                merged.extend(c for c in codes if c not in merged)
+
+    maps, mode_maps = merge(groups)
+    problems = catalog.validate(maps, config.GAME_MODES, mode_maps)
+    if problems:
+        sys.exit("Invalid map catalog:\n  " + "\n  ".join(problems))
+
+    if args.write_config:
+        write_config(maps, mode_maps, target)
+        inputs[config_path] = _hash_file(config_path)  # our own rewrite is not a change
+    else:
+        catalog.build(target, maps, config.GAME_MODES, mode_maps)
+    if write_maps_txt(groups):
+        print(f"Updated {MAPS_TXT_PATH}")
+
+    state[state_key] = inputs
+    with open(STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    print(f"Wrote {target}: {len(maps)} maps, {len(groups)} map groups")
 
-def parse_readme():
-    readme_path = 'README_cs2Server_info.md'
-    output_txt_path = 'maps_by_mode.txt'
-    
-    with open(readme_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Find all mode sections
-    # Modes are marked by #### mg_...
-    mode_sections = re.split(r'#### (mg_\w+)', content)
-    
-    maps_by_mode = {}
-    workshop_maps = {} # name -> id
-    
-    # Skip the first split part (before first mode)
-    # The split results in [preamble, mode_name, mode_content, mode_name, mode_content...]
-    for i in range(1, len(mode_sections), 2):
-        mode_name = mode_sections[i]
-        mode_content = mode_sections[i+1]
-        
-        maps_by_mode[mode_name] = []
-        
-        # Regex to find maps in the table structure
-        # We look for the map name and the command in the <sup><sub> tag
-        # Pattern for Workshop maps: <a href="...">map_name</a><br><sup><sub>host_workshop_map ID</sub></sup>
-        # Pattern for Standard maps: map_name<br><sup><sub>changelevel map_name</sub></sup>
-        
-        # Let's try a generic approach to capture the cell content
-        # Each map is in a <table align="left">...</table> block
-        cells = re.findall(r'<table align="left">.*?</table>', mode_content, re.DOTALL)
-        
-        for cell in cells:
-            # Extract map name
-            # It could be inside an <a> tag or just text
-            name_match = re.search(r'<tr><td>(?:<a href="[^"]+">)?([^<]+)(?:</a>)?<br>', cell)
-            if not name_match:
-                continue
-            map_name = name_match.group(1).strip()
-            
-            # Extract command
-            cmd_match = re.search(r'<sup><sub>(.*?)</sub></sup>', cell)
-            if not cmd_match:
-                continue
-            command = cmd_match.group(1).strip()
-            
-            maps_by_mode[mode_name].append({
-                'name': map_name,
-                'command': command
-            })
-            
-            # If it's a workshop map, store the ID
-            ws_match = re.search(r'host_workshop_map\s+(\d+)', command)
-            if ws_match:
-                workshop_id = ws_match.group(1)
-                workshop_maps[map_name] = workshop_id
-
-    # Write to maps_by_mode.txt
-    with open(output_txt_path, 'w', encoding='utf-8') as f:
-        for mode, maps in maps_by_mode.items():
-            f.write(f"Mode: {mode}\n")
-            for m in maps:
-                f.write(f"  - {m['name']} ({m['command']})\n")
-            f.write("\n")
-            
-    print(f"Updated {output_txt_path}")
-    
-    # Print WORKSHOP_MAPS dictionary for config.py
-    print("\nGenerated WORKSHOP_MAPS dictionary:")
-    print("WORKSHOP_MAPS = {")
-    for name, ws_id in workshop_maps.items():
-        print(f'    "{name}": "workshop/{ws_id}/{name}",')
-    print("}")
 
 if __name__ == "__main__":
-    parse_readme()
+    main()